@@ -2,6 +2,7 @@ import React, { useState } from 'react';
 import Card from '../common/Card';
 import Button from '../common/Button';
 import DataTable from '../common/DataTable';
+import { chatApi } from '../../services/api';
 import { FiCode, FiUser, FiCpu, FiExternalLink, FiAlertCircle, FiClipboard, FiCheck } from 'react-icons/fi';
 
 const ChatMessage = ({ message }) => {
@@ -80,8 +81,20 @@ const ChatMessage = ({ message }) => {
                 <DataTable 
                   columns={message.result_content.columns || []} 
                   data={message.result_content.data || []}
+                  totalRows={message.result_content.compacted ? undefined : message.result_content.row_count}
+                  downloadUrl={message.result_content.artifact ? chatApi.messageDownloadUrl(message.id) : undefined}
+                  loadRows={async (offset, limit, sort) => {
+                    const response = await chatApi.getMessageRows(message.id, { offset, limit, sort: sort || undefined });
+                    return response.data.data;
+                  }}
                 />
               </div>
+              {message.result_content.compacted && (
+                <p className="mt-2 text-xs text-gray-500">
+                  Showing the first {(message.result_content.data || []).length} of {message.result_content.row_count} rows;
+                  the full result of this older message is no longer stored.
+                </p>
+              )}
               
               {message.generated_code && (
                 <div className="mt-4">
@@ -25,7 +25,10 @@ export default function ChatSidebar({
   chats = [], 
   onChatSelect, 
   onNewChat,
-  loading = false 
+  loading = false,
+  hasMore = false,
+  onLoadMore,
+  loadingMore = false
 }) {
   const [searchQuery, setSearchQuery] = useState('');
 
@@ -33,6 +36,18 @@ export default function ChatSidebar({
     chat.title.toLowerCase().includes(searchQuery.toLowerCase())
   );
 
+  // Chats are listed a page at a time; the search only covers the pages loaded so far
+  const loadMoreButton = (
+    <Button
+      size="small"
+      onClick={onLoadMore}
+      disabled={loadingMore}
+      startIcon={loadingMore ? <CircularProgress size={14} /> : null}
+    >
+      Load more chats
+    </Button>
+  );
+
   return (
     <Box sx={{ display: 'flex', flexDirection: 'column', height: '100%', bgcolor: '#f8fafc' }}>
       {/* Header */}
@@ -141,7 +156,16 @@ export default function ChatSidebar({
                 </ListItemButton>
               </ListItem>
             ))}
+            {hasMore && (
+              <ListItem disablePadding sx={{ justifyContent: 'center' }}>
+                {loadMoreButton}
+              </ListItem>
+            )}
           </List>
+        ) : hasMore ? (
+          <Box sx={{ display: 'flex', justifyContent: 'center', p: 2 }}>
+            {loadMoreButton}
+          </Box>
         ) : (
           <Box 
             sx={{ 
@@ -1,13 +1,64 @@
-import React, { useState } from 'react';
-import { FiDatabase, FiFileText, FiChevronLeft, FiChevronRight, FiFilter, FiDownload, FiInfo } from 'react-icons/fi';
+import React, { useEffect, useState } from 'react';
+import {
+  FiDatabase, FiFileText, FiChevronLeft, FiChevronRight, FiFilter, FiDownload, FiInfo, FiArrowUp, FiArrowDown
+} from 'react-icons/fi';
 
-const DataTable = ({ data = [], columns = [] }) => {
+// Rows requested at a time when paging past the rows already loaded
+const LOAD_ROWS_LIMIT = 100;
+
+const DataTable = ({ data = [], columns = [], totalRows, loadRows, downloadUrl }) => {
   const [currentPage, setCurrentPage] = useState(1);
+  const [rows, setRows] = useState(data);
+  const [loading, setLoading] = useState(false);
+  // Server-side sort, e.g. "total" or "-total" for descending; only available with loadRows
+  const [sort, setSort] = useState(null);
   const rowsPerPage = 10;
-  const totalPages = Math.ceil(data.length / rowsPerPage);
+  const rowCount = Math.max(totalRows ?? data.length, rows.length);
+  const totalPages = Math.ceil(rowCount / rowsPerPage);
+
+  useEffect(() => {
+    setRows(data);
+    setSort(null);
+  }, [data]);
+
+  // Fetch the rows of a page that are not loaded yet, e.g. beyond the preview kept on the message
+  const ensureRows = async (page) => {
+    const needed = Math.min(page * rowsPerPage, rowCount);
+    if (!loadRows || needed <= rows.length) return;
+
+    setLoading(true);
+    try {
+      const limit = Math.max(needed - rows.length, LOAD_ROWS_LIMIT);
+      const more = await loadRows(rows.length, limit, sort);
+      setRows((current) => [...current, ...more]);
+    } catch (error) {
+      console.error('Error loading rows:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
 
-  const handleNextPage = () => {
-    if (currentPage < totalPages) {
+  // Cycle a column through ascending, descending and unsorted, reloading from the first page
+  const handleSort = async (column) => {
+    if (!loadRows || loading) return;
+    const nextSort = sort === column ? `-${column}` : sort === `-${column}` ? null : column;
+
+    setLoading(true);
+    try {
+      const firstRows = nextSort ? await loadRows(0, LOAD_ROWS_LIMIT, nextSort) : data;
+      setSort(nextSort);
+      setRows(firstRows);
+      setCurrentPage(1);
+    } catch (error) {
+      console.error('Error sorting rows:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const handleNextPage = async () => {
+    if (currentPage < totalPages && !loading) {
+      await ensureRows(currentPage + 1);
       setCurrentPage(currentPage + 1);
     }
   };
@@ -19,11 +70,17 @@ const DataTable = ({ data = [], columns = [] }) => {
   };
 
   const exportToCSV = () => {
-    if (!data.length) return;
+    if (!rows.length) return;
+
+    // The server streams every row of the result, not only the ones loaded here
+    if (downloadUrl) {
+      window.location.assign(downloadUrl);
+      return;
+    }
     
     const csvContent = [
       columns.join(','),
-      ...data.map(row => 
+      ...rows.map(row => 
         columns.map(col => {
           const value = row[col] !== undefined ? String(row[col]) : '';
           // Escape quotes and handle commas
@@ -42,12 +99,12 @@ const DataTable = ({ data = [], columns = [] }) => {
     document.body.removeChild(link);
   };
 
-  const paginatedData = data.slice(
+  const paginatedData = rows.slice(
     (currentPage - 1) * rowsPerPage,
     currentPage * rowsPerPage
   );
 
-  if (!data.length || !columns.length) {
+  if (!rows.length || !columns.length) {
     return (
       <div className="text-gray-600 text-center py-8 px-4 bg-gray-50 rounded-xl border border-gray-200 flex flex-col items-center">
         <FiFileText className="h-10 w-10 text-gray-400 mb-3" />
@@ -65,7 +122,7 @@ const DataTable = ({ data = [], columns = [] }) => {
             <FiDatabase className="h-4 w-4 text-blue-600" />
           </div>
           <span className="text-sm font-medium text-gray-700">
-            Query Result <span className="text-gray-500">•</span> <span className="text-blue-600 font-semibold">{data.length}</span> {data.length === 1 ? 'row' : 'rows'}
+            Query Result <span className="text-gray-500">•</span> <span className="text-blue-600 font-semibold">{rowCount}</span> {rowCount === 1 ? 'row' : 'rows'}
           </span>
         </div>
         <div className="flex items-center gap-3">
@@ -92,10 +149,13 @@ const DataTable = ({ data = [], columns = [] }) => {
               {columns.map((column, index) => (
                 <th
                   key={index}
-                  className="sticky top-0"
+                  className={`sticky top-0 ${loadRows ? 'cursor-pointer select-none' : ''}`}
+                  onClick={() => handleSort(column)}
                 >
                   <div className="flex items-center gap-1">
                     <span>{column}</span>
+                    {sort === column && <FiArrowUp className="h-3 w-3 text-blue-600" />}
+                    {sort === `-${column}` && <FiArrowDown className="h-3 w-3 text-blue-600" />}
                     <div className="opacity-0 group-hover:opacity-100 transition-opacity">
                       <FiInfo className="h-3 w-3 text-gray-400" />
                     </div>
@@ -122,7 +182,7 @@ const DataTable = ({ data = [], columns = [] }) => {
         <div className="px-4 py-3 bg-gray-50 border-t border-gray-200 flex items-center justify-between">
           <div className="text-sm text-gray-600">
             Page <span className="font-medium">{currentPage}</span> of <span className="font-medium">{totalPages}</span> 
-            <span className="text-gray-500 ml-1">({data.length} total rows)</span>
+            <span className="text-gray-500 ml-1">({rowCount} total rows)</span>
           </div>
           <div className="flex">
             <button
@@ -138,7 +198,7 @@ const DataTable = ({ data = [], columns = [] }) => {
             </button>
             <button
               onClick={handleNextPage}
-              disabled={currentPage === totalPages}
+              disabled={currentPage === totalPages || loading}
               className={`p-1.5 rounded-r-md border-t border-r border-b border-gray-300 ${
                 currentPage === totalPages
                   ? 'text-gray-400 bg-gray-100 cursor-not-allowed'
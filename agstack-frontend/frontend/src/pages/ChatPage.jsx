@@ -34,6 +34,8 @@ const DRAWER_WIDTH = 280;
 const ChatPage = () => {
   const [chats, setChats] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMoreChats, setLoadingMoreChats] = useState(false);
   const [selectedChat, setSelectedChat] = useState(null);
   const [messages, setMessages] = useState([]);
   const [messagesLoading, setMessagesLoading] = useState(false);
@@ -75,12 +77,13 @@ const ChatPage = () => {
     }
   };
 
-  // Fetch all chats
+  // Fetch the first page of chats; the X-Next-Cursor header points to the next one
   const fetchChats = async () => {
     setLoading(true);
     try {
       const response = await chatApi.getAllChats();
       setChats(response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to fetch chats');
       console.error('Error fetching chats:', error);
@@ -89,6 +92,25 @@ const ChatPage = () => {
     }
   };
 
+  // Append the next page of chats
+  const fetchMoreChats = async () => {
+    if (!nextCursor || loadingMoreChats) return;
+    setLoadingMoreChats(true);
+    try {
+      const response = await chatApi.getAllChats({ cursor: nextCursor });
+      setChats(prev => {
+        const loaded = new Set(prev.map(chat => chat.id));
+        return [...prev, ...response.data.filter(chat => !loaded.has(chat.id))];
+      });
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      toast.error('Failed to fetch more chats');
+      console.error('Error fetching more chats:', error);
+    } finally {
+      setLoadingMoreChats(false);
+    }
+  };
+
   // Fetch messages for a specific chat
   const fetchMessages = async (chatId) => {
     setMessagesLoading(true);
@@ -143,6 +165,42 @@ const ChatPage = () => {
     }
   };
 
+  // Stream a queued message into its placeholder: progress first, then the answer and its rows
+  const streamMessage = (placeholderId, messageId) => new Promise((resolve) => {
+    const source = new EventSource(chatApi.messageEventsUrl(messageId));
+    const update = (changes) => setMessages(prev => prev.map(msg =>
+      msg.id === placeholderId ? { ...msg, ...changes(msg) } : msg
+    ));
+    const finish = () => {
+      source.close();
+      resolve();
+    };
+
+    source.addEventListener('status', (event) => {
+      const { status } = JSON.parse(event.data);
+      // The final status arrives with the message itself
+      if (['pending', 'processing'].includes(status)) {
+        update(() => ({ status }));
+      }
+    });
+    source.addEventListener('message', (event) => {
+      // Keep the placeholder ID so the rows that follow find it
+      const { id, ...message } = JSON.parse(event.data);
+      update(() => ({
+        ...message,
+        result_content: message.result_content ? { ...message.result_content, data: [] } : null,
+      }));
+    });
+    source.addEventListener('rows', (event) => {
+      const { rows } = JSON.parse(event.data);
+      update((msg) => ({
+        result_content: { ...msg.result_content, data: [...(msg.result_content?.data || []), ...rows] },
+      }));
+    });
+    source.addEventListener('done', finish);
+    source.onerror = finish;
+  });
+
   // Send a message
   const handleSendMessage = async () => {
     if (!messageInput.trim() || !selectedChat) return;
@@ -181,9 +239,12 @@ const ChatPage = () => {
         role: 'user',
       };
 
-      // Use the sendMessage endpoint
-      await chatApi.sendMessage(selectedChat, messageData);
+      // Use the sendMessage endpoint; it returns the pending assistant message
+      const response = await chatApi.sendMessage(selectedChat, messageData);
       
+      // Show the answer as a background worker produces it
+      await streamMessage(optimisticAssistantMsg.id, response.data.id);
+
       // Refresh messages
       fetchMessages(selectedChat);
 
@@ -240,6 +301,9 @@ const ChatPage = () => {
           onChatSelect={handleChatClick}
           onNewChat={() => setCreateChatOpen(true)}
           loading={loading}
+          hasMore={Boolean(nextCursor)}
+          onLoadMore={fetchMoreChats}
+          loadingMore={loadingMoreChats}
         />
       </Drawer>
 
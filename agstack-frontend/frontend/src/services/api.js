@@ -22,13 +22,21 @@ export const connectionApi = {
 
 // Chat endpoints
 export const chatApi = {
-  getAllChats: () => api.get('/chat/chats'),
+  // Most recently updated chats; the X-Next-Cursor response header is the cursor of the next page
+  getAllChats: (params) => api.get('/chat/chats', { params }),
   getChat: (chatId) => api.get(`/chat/chats/${chatId}`),
   createChat: (chatData) => api.post('/chat/chats', chatData),
   updateChat: (chatId, chatData) => api.put(`/chat/chats/${chatId}`, chatData),
   getChatMessages: (chatId) => api.get(`/chat/chats/${chatId}/messages`),
   sendMessage: (chatId, messageData) => api.post(`/chat/chats/${chatId}/messages`, messageData),
-  getMessage: (messageId) => api.get(`/chat/chats/messages/${messageId}`),
+  getMessage: (messageId, params) => api.get(`/chat/chats/messages/${messageId}`, { params }),
+  // A slice of a message's result rows ({ offset, limit, sort, columns }); the message only holds a preview
+  getMessageRows: (messageId, params) => api.get(`/chat/chats/messages/${messageId}/rows`, { params }),
+  // Download of all result rows as csv, parquet or jsonl
+  messageDownloadUrl: (messageId, format = 'csv') =>
+    `${BASE_URL}/chat/chats/messages/${messageId}/download?format=${format}`,
+  // Server-sent events of a message's progress followed by its result rows
+  messageEventsUrl: (messageId) => `${BASE_URL}/chat/chats/messages/${messageId}/events`,
 };
 
 export default {
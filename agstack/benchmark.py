@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+"""
+Pipeline benchmark script
+
+Usage:
+    python benchmark.py pipeline <chat_id> "<question>" [iterations]
+    python benchmark.py api <base_url> [path] [concurrency,...] [requests]
+    python benchmark.py chats [page_size] [connection_id,...]
+    python benchmark.py explain
+    python benchmark.py startup [runs] [history.jsonl]
+    python benchmark.py --help
+
+Run once with LLM_TRANSPORT=record against the live model to capture the prompts, then
+with LLM_TRANSPORT=replay to run the same messages offline. Model time (real or simulated
+through LLM_REPLAY_LATENCY_MS) is reported separately from the pipeline's own overhead, along
+with the statements and commits each message runs on the metadata database and the pool
+checkouts and new connections they needed.
+Set PIPELINE_MODE=sql or PIPELINE_MODE=python to compare the two answer pipelines, and
+SQL_CANDIDATES to measure speculative SQL generation.
+The question cache is disabled so every iteration runs the full pipeline.
+
+The api benchmark sends GET requests to a running server (e.g. python benchmark.py api
+http://localhost:8016 /api/chat/chats 1,4,16,64 400) at each concurrency level and reports
+throughput and latency, to check that throughput scales with the number of requests in flight.
+
+The chats benchmark pages through the chat listing of the metadata database and counts the
+SQL statements each page runs. It exits with status 1 if the count differs between pages,
+i.e. if loading a page's connections is no longer batched.
+
+The explain benchmark prints the metadata database's plan for the hot metadata lookups (tables
+of a connection, a table by name, columns of a table, a page of chats) and exits with status 1
+if any of them does not use its index. On PostgreSQL sequential scans are disabled for the
+check, since the planner prefers them on small tables.
+
+The startup benchmark imports the API (fastapi_server) in fresh interpreters under
+python -X importtime and reports the median import time with the slowest modules it pulls in,
+then counts the statements initialize_database runs against the metadata database. With a
+history file it appends the result as a JSON line with the git commit, to track cold start
+over time.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event, select, text
+
+from src.core.config import CHAT_LIST_MAX_PAGE_SIZE, LLM_TRANSPORT, PIPELINE_MODE, SQL_CANDIDATES
+from src.core.database import SessionLocal, engine, get_pool_status, pool_metrics
+from src.core.db_init import initialize_database
+from src.core.llm_transport import transport_stats
+from src.models.chat import Chat
+from src.models.column_details import ColumnDetails
+from src.models.table_details import TableDetails
+from src.schemas.chat import ChatWithConnectionsResponse
+from src.schemas.chat_message import ChatMessageCreate
+from src.services.chat_service import ChatService
+
+
+def print_help():
+    """Print help information"""
+    print(__doc__)
+
+
+class StatementCounter:
+    """Count the SQL statements and commits run on the metadata database while active"""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+    def on_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def on_commit(self, conn):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self.on_statement)
+        event.listen(engine, "commit", self.on_commit)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(engine, "before_cursor_execute", self.on_statement)
+        event.remove(engine, "commit", self.on_commit)
+
+
+def benchmark_pipeline(chat_id: int, question: str, iterations: int = 1):
+    """Run ChatService.process_message repeatedly and report where the time went"""
+    chat_service = ChatService()
+    chat_service.question_cache_service.enabled = False
+
+    db = SessionLocal()
+    counter = StatementCounter()
+    try:
+        chat = chat_service.get_chat_with_connections(db, chat_id)
+        if not chat:
+            print(f"Chat with ID {chat_id} not found")
+            return
+
+        message_data = ChatMessageCreate(
+            content=question,
+            role="user",
+            chat_id=chat_id,
+            connection_ids=[conn.id for conn in chat.connections]
+        )
+
+        print(f"LLM transport: {LLM_TRANSPORT}, pipeline: {PIPELINE_MODE}, SQL candidates: {SQL_CANDIDATES}")
+        overheads = []
+        for iteration in range(1, iterations + 1):
+            transport_stats.reset()
+            with counter:
+                counter.reset()
+                pool_metrics.reset()
+                started = time.perf_counter()
+                message = chat_service.process_message(db, message_data)
+                elapsed = time.perf_counter() - started
+
+            overhead = elapsed - transport_stats.llm_seconds
+            overheads.append(overhead)
+            print(f"[{iteration}/{iterations}] status={message.status} total={elapsed:.3f}s "
+                  f"llm={transport_stats.llm_seconds:.3f}s ({transport_stats.calls} calls) "
+                  f"overhead={overhead:.3f}s db={counter.statements} statements/{counter.commits} commits "
+                  f"pool={pool_metrics.checkouts} checkouts/{pool_metrics.connects} connects")
+
+        print(f"Metadata pool: {get_pool_status()}")
+        if len(overheads) > 1:
+            print(f"Overhead: median={statistics.median(overheads):.3f}s min={min(overheads):.3f}s "
+                  f"max={max(overheads):.3f}s")
+    finally:
+        db.close()
+
+
+def timed_request(url: str) -> float:
+    """Send a GET request and return its latency in seconds, raising on HTTP errors"""
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=60) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def benchmark_api(base_url: str, path: str = "/api/chat/chats", concurrency_levels=(1, 4, 16, 64),
+                  requests: int = 200):
+    """Send requests to a running server at increasing concurrency and report throughput"""
+    url = base_url.rstrip("/") + path
+    print(f"GET {url}, {requests} requests per level")
+
+    for concurrency in concurrency_levels:
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(timed_request, url) for _ in range(requests)]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except Exception:
+                    errors += 1
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            print(f"concurrency={concurrency}: all {errors} requests failed")
+            continue
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"concurrency={concurrency}: {len(latencies) / elapsed:.1f} req/s "
+              f"p50={statistics.median(latencies) * 1000:.1f}ms p95={p95 * 1000:.1f}ms errors={errors}")
+
+
+def benchmark_chats(page_size: int = 50, connection_ids: Optional[List[int]] = None) -> bool:
+    """Page through the chat listing, reporting statements and time per page"""
+    chat_service = ChatService()
+    # Capped like the endpoint; selectinload also splits more than 500 chats into several queries
+    page_size = min(page_size, CHAT_LIST_MAX_PAGE_SIZE)
+
+    db = SessionLocal()
+    try:
+        with StatementCounter() as counter:
+            cursor, page, counts, total = None, 0, set(), 0
+            while True:
+                counter.reset()
+                started = time.perf_counter()
+                chats, cursor = chat_service.list_chats(db, page_size, cursor, connection_ids)
+                # Serialize like the endpoint does, so lazy loads would be counted too
+                for chat in chats:
+                    ChatWithConnectionsResponse.model_validate(chat)
+                elapsed = time.perf_counter() - started
+
+                page += 1
+                total += len(chats)
+                counts.add(counter.statements)
+                print(f"page {page}: {len(chats)} chats, {counter.statements} queries, {elapsed * 1000:.1f}ms")
+                if not cursor:
+                    break
+
+        print(f"{total} chats in {page} pages, queries per page: {sorted(counts)}")
+        return len(counts) <= 1
+    finally:
+        db.close()
+
+
+# Hot metadata lookups and the index each one should use
+EXPLAIN_LOOKUPS = [
+    ("tables of a connection", select(TableDetails).where(TableDetails.connection_id == 1),
+     "ix_table_details_connection_id_table_name"),
+    ("table by name", select(TableDetails).where(TableDetails.connection_id == 1, TableDetails.table_name == "sales"),
+     "ix_table_details_connection_id_table_name"),
+    ("columns of a table", select(ColumnDetails).where(ColumnDetails.table_id == 1), "ix_column_details_table_id"),
+    ("page of chats",
+     select(Chat.id, Chat.title, Chat.updated_at).order_by(Chat.updated_at.desc(), Chat.id.desc()).limit(50),
+     "ix_chats_updated_at_id"),
+]
+
+
+def benchmark_explain() -> bool:
+    """Print the plans of the hot metadata lookups, returning whether all of them use their index"""
+    all_indexed = True
+    with engine.connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        explain = "EXPLAIN" if postgres else "EXPLAIN QUERY PLAN"
+
+        for name, statement, index in EXPLAIN_LOOKUPS:
+            sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+            plan = "\n".join(str(row[-1]) for row in conn.execute(text(f"{explain} {sql}")))
+            indexed = index in plan
+            all_indexed = all_indexed and indexed
+            print(f"{name}: {'uses' if indexed else 'DOES NOT USE'} {index}")
+            for line in plan.splitlines():
+                print(f"    {line}")
+        conn.rollback()
+
+    return all_indexed
+
+
+def measure_import(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Import a module in a fresh interpreter under -X importtime.
+
+    Returns:
+        Seconds the import took and the (module, cumulative seconds) of every module imported
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules.append((name.rstrip(), int(cumulative) / 1_000_000))
+
+    total = next((seconds for name, seconds in modules if name.strip() == module), 0.0)
+    return total, modules
+
+
+def benchmark_startup(runs: int = 5, history_file: Optional[str] = None, top: int = 10):
+    """Report the API's import time and the statements initialize_database runs"""
+    totals, modules = [], []
+    for _ in range(runs):
+        total, modules = measure_import("fastapi_server")
+        totals.append(total)
+    import_seconds = statistics.median(totals)
+    print(f"import fastapi_server: median={import_seconds:.3f}s min={min(totals):.3f}s "
+          f"max={max(totals):.3f}s ({runs} runs)")
+
+    # Direct imports of fastapi_server, which include everything they pull in
+    direct = [(name.strip(), seconds) for name, seconds in modules if len(name) - len(name.lstrip()) == 3]
+    for name, seconds in sorted(direct, key=lambda entry: entry[1], reverse=True)[:top]:
+        print(f"    {seconds:.3f}s  {name}")
+
+    with StatementCounter() as counter:
+        started = time.perf_counter()
+        initialize_database()
+        init_seconds = time.perf_counter() - started
+    print(f"initialize_database: {init_seconds * 1000:.1f}ms, {counter.statements} statements")
+
+    if history_file:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                    text=True).stdout.strip() or None
+        except OSError:
+            commit = None
+        entry = {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": commit,
+            "import_seconds": round(import_seconds, 4),
+            "init_database_statements": counter.statements,
+            "runs": runs
+        }
+        with open(history_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Appended to {history_file}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] in ("--help", "-h"):
+        print_help()
+    elif sys.argv[1] == "pipeline" and len(sys.argv) >= 4:
+        benchmark_pipeline(int(sys.argv[2]), sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else 1)
+    elif sys.argv[1] == "api" and len(sys.argv) >= 3:
+        benchmark_api(
+            sys.argv[2],
+            sys.argv[3] if len(sys.argv) > 3 else "/api/chat/chats",
+            tuple(int(level) for level in sys.argv[4].split(",")) if len(sys.argv) > 4 else (1, 4, 16, 64),
+            int(sys.argv[5]) if len(sys.argv) > 5 else 200
+        )
+    elif sys.argv[1] == "chats":
+        constant = benchmark_chats(
+            int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+            [int(connection_id) for connection_id in sys.argv[3].split(",")] if len(sys.argv) > 3 else None
+        )
+        sys.exit(0 if constant else 1)
+    elif sys.argv[1] == "explain":
+        sys.exit(0 if benchmark_explain() else 1)
+    elif sys.argv[1] == "startup":
+        benchmark_startup(int(sys.argv[2]) if len(sys.argv) > 2 else 5, sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print(f"Unknown option: {' '.join(sys.argv[1:])}")
+        print_help()
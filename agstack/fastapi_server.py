@@ -1,21 +1,19 @@
 #!/usr/bin/env python
 
-import agentops
-import agentstack
+import anyio.to_thread
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.core.database import Base, engine
+from src.core.config import API_THREADPOOL_SIZE
+from src.core.database import get_pool_status
 from src.core.db_init import initialize_database
-from src.endpoints.chat import router as chat_router
+from src.endpoints.chat import message_queue_service, retention_sweeper, router as chat_router
 from src.endpoints.connection import router as connection_router
 
-# Initialize AgentOps without starting a session
-agentops.init(auto_start_session=False)
-
-# Initialize database (creates tables if they don't exist)
-initialize_database()
+# Heavy dependencies (crewai, litellm, AgentOps, tiktoken) are imported with the first message
+# instead of here, and the database is initialized on startup rather than on import, so importing
+# the app stays fast; track it with python benchmark.py startup
 
 app = FastAPI(title="AgStack API", description="API for running AgStack Crew")
 
@@ -26,6 +24,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Cursor of the next page of GET /api/chat/chats
 )
 
 # Include routers
@@ -33,11 +32,59 @@ app.include_router(connection_router, prefix="/api/connection", tags=["connectio
 app.include_router(chat_router, prefix="/api/chat", tags=["chat"])
 
 
+@app.on_event("startup")
+def init_database():
+    """Create missing tables and apply pending migrations before serving requests"""
+    initialize_database()
+
+
+@app.on_event("startup")
+async def size_threadpool():
+    """
+    Size the threadpool that runs the blocking endpoints, which do their database work
+    off the event loop
+    """
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
+
+
+@app.on_event("startup")
+def start_message_heartbeat():
+    """
+    Keep the messages queued by this process alive and fail the ones whose process stopped,
+    such as messages queued by a previous run, which are lost with its worker pool
+    """
+    message_queue_service.start()
+
+
+@app.on_event("startup")
+def start_retention_sweeper():
+    """Keep result files and stored result rows within the retention policies"""
+    retention_sweeper.start()
+
+
+@app.on_event("shutdown")
+def stop_message_workers():
+    """Stop the background workers answering chat messages"""
+    message_queue_service.shutdown()
+
+
+@app.on_event("shutdown")
+def stop_retention_sweeper():
+    """Stop the background retention sweep"""
+    retention_sweeper.stop()
+
+
 @app.get("/")
 async def root():
     """Root endpoint to check if the API is running"""
     return {"message": "AgStack API is running"}
 
 
+@app.get("/metrics/db-pool")
+async def db_pool_metrics():
+    """Checkout metrics and current state of the metadata database connection pool"""
+    return get_pool_status()
+
+
 if __name__ == "__main__":
     uvicorn.run("fastapi_server:app", host="0.0.0.0", port=8016, reload=False)
@@ -0,0 +1,159 @@
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def get_int_setting(name: str, default: int) -> int:
+    """
+    Read an integer setting from the environment, falling back to the default
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def get_float_setting(name: str, default: float) -> float:
+    """
+    Read a float setting from the environment, falling back to the default
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+def get_bool_setting(name: str, default: bool) -> bool:
+    """
+    Read a boolean setting ("1", "true", "yes", "on") from the environment, falling back to the default
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Metadata database connection pool of the API process: connections kept open, extra ones
+# opened under load and how long a checkout waits for one. Connections are replaced after
+# METADATA_POOL_RECYCLE_SECONDS and checked with a ping before use; statements running longer
+# than METADATA_STATEMENT_TIMEOUT_MS are cancelled (0 disables the timeout)
+METADATA_POOL_SIZE = get_int_setting("METADATA_POOL_SIZE", 10)
+METADATA_POOL_MAX_OVERFLOW = get_int_setting("METADATA_POOL_MAX_OVERFLOW", 20)
+METADATA_POOL_TIMEOUT_SECONDS = get_float_setting("METADATA_POOL_TIMEOUT_SECONDS", 30.0)
+METADATA_POOL_RECYCLE_SECONDS = get_int_setting("METADATA_POOL_RECYCLE_SECONDS", 1800)
+METADATA_POOL_PRE_PING = get_bool_setting("METADATA_POOL_PRE_PING", True)
+METADATA_STATEMENT_TIMEOUT_MS = get_int_setting("METADATA_STATEMENT_TIMEOUT_MS", 0)
+
+# URL of a local PgBouncer (transaction pooling) in front of the metadata database. When set,
+# the code executor's subprocesses connect through it instead of each opening a connection to
+# the database; set METADATA_PGBOUNCER_FOR_API to route the API process through it as well
+METADATA_PGBOUNCER_URL = os.getenv("METADATA_PGBOUNCER_URL", "").strip()
+METADATA_PGBOUNCER_FOR_API = get_bool_setting("METADATA_PGBOUNCER_FOR_API", False)
+
+# Environment variable the code executor sets for the subprocesses running generated code
+EXECUTOR_PROCESS_ENV = "AGSTACK_EXECUTOR_PROCESS"
+
+# Table retrieval: only shrink the schema handed to the table inference agent once a
+# connection has more than TABLE_INDEX_MIN_TABLES tables (0 disables the index)
+TABLE_INDEX_MIN_TABLES = get_int_setting("TABLE_INDEX_MIN_TABLES", 15)
+TABLE_INDEX_TOP_K = get_int_setting("TABLE_INDEX_TOP_K", 8)
+
+# Schema prompt serialization: hard token budget for available_tables_json and
+# per-column sample limits (count and UTF-8 byte length of each value)
+SCHEMA_TOKEN_BUDGET = get_int_setting("SCHEMA_TOKEN_BUDGET", 6000)
+SCHEMA_MAX_SAMPLES = get_int_setting("SCHEMA_MAX_SAMPLES", 3)
+SCHEMA_SAMPLE_MAX_BYTES = get_int_setting("SCHEMA_SAMPLE_MAX_BYTES", 40)
+
+# Question cache: reuse generated code for repeated questions on the same connection.
+# Entries expire after QUESTION_CACHE_TTL_SECONDS (0 never expires) unless the connection
+# overrides it; QUESTION_CACHE_SIMILARITY > 0 also matches near-identical questions
+QUESTION_CACHE_ENABLED = get_bool_setting("QUESTION_CACHE_ENABLED", True)
+QUESTION_CACHE_TTL_SECONDS = get_int_setting("QUESTION_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+QUESTION_CACHE_SIMILARITY = get_float_setting("QUESTION_CACHE_SIMILARITY", 0.0)
+QUESTION_CACHE_MAX_CANDIDATES = get_int_setting("QUESTION_CACHE_MAX_CANDIDATES", 500)
+
+# LLM transport used by the crew agents: "live" calls the model directly, "record" also
+# saves every prompt/response pair under LLM_CASSETTE_DIR and "replay" serves them from disk.
+# LLM_REPLAY_LATENCY_MS simulates model latency on replay ("recorded" replays the measured one)
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT", "live").strip().lower()
+LLM_CASSETTE_DIR = os.getenv(
+    "LLM_CASSETTE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cassettes")
+)
+LLM_REPLAY_LATENCY_MS = os.getenv("LLM_REPLAY_LATENCY_MS", "0").strip().lower()
+
+# Maximum number of connections of a chat answered concurrently for one message
+CHAT_MAX_PARALLEL_CONNECTIONS = get_int_setting("CHAT_MAX_PARALLEL_CONNECTIONS", 4)
+
+# Answer pipeline: "sql" asks the agent for a single SELECT that is run in-process, "python"
+# generates and executes a pandas script, "auto" picks "python" only for questions that need
+# post-processing. Messages can override it per request
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "auto").strip().lower()
+
+# Connections kept open per external database for queries run in-process; a query waits up to
+# EXTERNAL_POOL_TIMEOUT_SECONDS for one when all of them are in use
+EXTERNAL_POOL_MAX_CONNECTIONS = get_int_setting("EXTERNAL_POOL_MAX_CONNECTIONS", 4)
+EXTERNAL_POOL_TIMEOUT_SECONDS = get_float_setting("EXTERNAL_POOL_TIMEOUT_SECONDS", 30.0)
+
+# Speculative SQL generation: with SQL_CANDIDATES > 1 the SQL pipeline asks for that many
+# candidate queries concurrently, checks each with EXPLAIN and runs the first valid one
+SQL_CANDIDATES = get_int_setting("SQL_CANDIDATES", 1)
+
+# Background workers answering chat messages; POST /chats/{id}/messages returns immediately
+# and GET /chats/messages/{id}?wait=N long-polls for at most CHAT_MESSAGE_MAX_WAIT_SECONDS
+CHAT_WORKERS = get_int_setting("CHAT_WORKERS", 4)
+CHAT_MESSAGE_MAX_WAIT_SECONDS = get_float_setting("CHAT_MESSAGE_MAX_WAIT_SECONDS", 30.0)
+
+# Every server process stamps the messages it queues with its worker ID and refreshes their
+# heartbeat every MESSAGE_HEARTBEAT_SECONDS while it answers them. Pending or processing messages
+# whose heartbeat is older than MESSAGE_STALE_SECONDS lost their process (e.g. a restart or a
+# crashed replica) and are marked as failed by any running process
+MESSAGE_HEARTBEAT_SECONDS = get_float_setting("MESSAGE_HEARTBEAT_SECONDS", 15.0)
+MESSAGE_STALE_SECONDS = get_float_setting("MESSAGE_STALE_SECONDS", 120.0)
+
+# GET /chats/messages/{id}/events: result rows per "rows" event and seconds between
+# keep-alive comments while a message is being answered
+MESSAGE_EVENTS_ROW_CHUNK_SIZE = get_int_setting("MESSAGE_EVENTS_ROW_CHUNK_SIZE", 500)
+MESSAGE_EVENTS_KEEPALIVE_SECONDS = get_float_setting("MESSAGE_EVENTS_KEEPALIVE_SECONDS", 15.0)
+
+# Threads serving the API's blocking (def) endpoints; each one may hold a metadata
+# database connection, so keep it in line with the engine's pool size
+API_THREADPOOL_SIZE = get_int_setting("API_THREADPOOL_SIZE", 40)
+
+# Result storage: all rows of an answer are written to a compressed Parquet artifact and only
+# the first RESULT_PREVIEW_ROWS rows are kept inline on the message; GET
+# /chats/messages/{id}/rows serves the rest, at most RESULT_ROWS_MAX_LIMIT per request.
+# Artifacts are written in row groups of RESULT_ARTIFACT_ROW_GROUP_SIZE rows so a page only
+# decodes the groups it touches, and the orderings of the RESULT_SORT_CACHE_SIZE most
+# recently sorted artifacts are kept in memory
+RESULT_PREVIEW_ROWS = get_int_setting("RESULT_PREVIEW_ROWS", 20)
+RESULT_ROWS_MAX_LIMIT = get_int_setting("RESULT_ROWS_MAX_LIMIT", 5000)
+RESULT_ARTIFACT_COMPRESSION = os.getenv("RESULT_ARTIFACT_COMPRESSION", "zstd").strip().lower()
+RESULT_ARTIFACT_ROW_GROUP_SIZE = get_int_setting("RESULT_ARTIFACT_ROW_GROUP_SIZE", 65536)
+RESULT_SORT_CACHE_SIZE = get_int_setting("RESULT_SORT_CACHE_SIZE", 8)
+
+# Format write_df writes the output of generated code and SQL queries in: csv, parquet or feather.
+# Names ending in .parquet or .feather are always written in that format; other names (including
+# the .csv names the prompts ask for) use this setting. Parquet and Feather keep column dtypes
+RESULT_OUTPUT_FORMAT = os.getenv("RESULT_OUTPUT_FORMAT", "csv").strip().lower()
+
+# Retention of result files and rows, applied by a background sweep every
+# RETENTION_SWEEP_INTERVAL_SECONDS (0 disables the background sweep). CSV outputs and downloaded
+# exports are intermediate files and are removed after their max age. Results older than
+# RETENTION_RESULT_MAX_AGE_DAYS, beyond the newest RETENTION_RESULTS_PER_CHAT of a chat or, oldest
+# first, beyond RETENTION_MAX_BYTES of result files are compacted to their inline preview; their
+# artifact is moved to RETENTION_ARCHIVE_DIR when set and deleted otherwise. 0 disables a policy
+RETENTION_SWEEP_INTERVAL_SECONDS = get_int_setting("RETENTION_SWEEP_INTERVAL_SECONDS", 3600)
+RETENTION_CSV_MAX_AGE_HOURS = get_float_setting("RETENTION_CSV_MAX_AGE_HOURS", 24.0)
+RETENTION_EXPORT_MAX_AGE_HOURS = get_float_setting("RETENTION_EXPORT_MAX_AGE_HOURS", 24.0)
+RETENTION_RESULT_MAX_AGE_DAYS = get_float_setting("RETENTION_RESULT_MAX_AGE_DAYS", 0.0)
+RETENTION_RESULTS_PER_CHAT = get_int_setting("RETENTION_RESULTS_PER_CHAT", 0)
+RETENTION_MAX_BYTES = get_int_setting("RETENTION_MAX_BYTES", 0)
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "").strip()
+
+# GET /chats: chats per page by default and at most
+CHAT_LIST_PAGE_SIZE = get_int_setting("CHAT_LIST_PAGE_SIZE", 50)
+CHAT_LIST_MAX_PAGE_SIZE = get_int_setting("CHAT_LIST_MAX_PAGE_SIZE", 200)
@@ -1,11 +1,21 @@
 from sqlalchemy import inspect, Table, MetaData
 
 from src.core.database import engine, Base, get_db
+from src.core.migrations import run_migrations
 from src.models.database_connection import DatabaseConnection
 from src.models.chat import Chat, chat_connections
 from src.models.chat_message import ChatMessage
 from src.models.table_details import TableDetails
 from src.models.column_details import ColumnDetails
+from src.models.connection_schema import ConnectionSchema
+from src.models.question_cache import QuestionCacheEntry
+from src.models.schema_migration import SchemaMigration
+
+# Tables the application needs; schema_migrations is created by run_migrations
+REQUIRED_TABLES = {
+    "database_connections", "table_details", "column_details", "chats", "chat_connections",
+    "chat_messages", "connection_schemas", "question_cache"
+}
 
 
 def reset_database():
@@ -14,7 +24,16 @@ def reset_database():
     
     # Drop tables in the correct order based on dependencies
     
+    # 0. The recorded schema version no longer applies
+    if inspector.has_table("schema_migrations"):
+        print("Dropping schema_migrations table...")
+        SchemaMigration.__table__.drop(engine)
+
     # 1. First drop tables with no dependencies
+    if inspector.has_table("question_cache"):
+        print("Dropping question_cache table...")
+        QuestionCacheEntry.__table__.drop(engine)
+    
     if inspector.has_table("chat_messages"):
         print("Dropping chat_messages table...")
         ChatMessage.__table__.drop(engine)
@@ -37,7 +56,12 @@ def reset_database():
         print("Dropping table_details table...")
         TableDetails.__table__.drop(engine)
     
-    # 4. Finally drop database_connections
+    # 4. Drop connection_schemas which depends on database_connections
+    if inspector.has_table("connection_schemas"):
+        print("Dropping connection_schemas table...")
+        ConnectionSchema.__table__.drop(engine)
+    
+    # 5. Finally drop database_connections
     if inspector.has_table("database_connections"):
         print("Dropping database_connections table...")
         DatabaseConnection.__table__.drop(engine)
@@ -45,22 +69,16 @@ def reset_database():
     # Create all tables
     print("Creating all tables...")
     Base.metadata.create_all(bind=engine)
+    # Record the migrations the new tables already include
+    run_migrations(engine)
     print("Database reset complete!")
 
 
 def initialize_database():
     """Initialize the database if tables don't exist"""
-    inspector = inspect(engine)
-    
-    # Check if all required tables exist
-    tables_exist = (
-        inspector.has_table("database_connections") and
-        inspector.has_table("table_details") and
-        inspector.has_table("column_details") and
-        inspector.has_table("chats") and
-        inspector.has_table("chat_connections") and
-        inspector.has_table("chat_messages")
-    )
+    # One catalog query for all table names instead of a round trip per table
+    existing_tables = set(inspect(engine).get_table_names())
+    tables_exist = REQUIRED_TABLES <= existing_tables
     
     if not tables_exist:
         print("Some tables are missing. Creating all tables...")
@@ -69,6 +87,11 @@ def initialize_database():
     else:
         print("All tables already exist.")
 
+    # Upgrade tables created by an older version in place
+    applied = run_migrations(engine, existing_tables)
+    if applied:
+        print(f"Applied schema migrations: {', '.join(str(version) for version in applied)}")
+
 
 if __name__ == "__main__":
     # When run directly, reset the database
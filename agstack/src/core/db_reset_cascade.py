@@ -6,6 +6,7 @@ This is simpler but more dangerous as it will forcefully drop all dependent obje
 from sqlalchemy import MetaData
 
 from src.core.database import engine, Base
+from src.core.migrations import run_migrations
 
 
 def reset_database_cascade():
@@ -31,6 +32,8 @@ def reset_database_cascade():
     # Recreate all tables
     print("\nCreating all tables...")
     Base.metadata.create_all(bind=engine)
+    # Record the migrations the new tables already include
+    run_migrations(engine)
 
     print("Database reset complete!")
 
@@ -0,0 +1,164 @@
+"""
+Pluggable LLM transport for the crew agents.
+
+In "record" mode every prompt/response pair is saved to a cassette directory; in "replay"
+mode responses are served from those files so the whole pipeline runs offline and
+deterministically, with optional simulated latency.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+from crewai import LLM
+
+from src.core.config import LLM_CASSETTE_DIR, LLM_REPLAY_LATENCY_MS, LLM_TRANSPORT
+from src.utils.schema_formatter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_MODES = ("live", "record", "replay")
+
+
+class TransportStats:
+    """
+    Process-wide counters for LLM calls, used to separate model time from pipeline overhead
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.llm_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.llm_seconds += seconds
+
+
+transport_stats = TransportStats()
+
+
+class TransportLLM(LLM):
+    """
+    crewai LLM that records completions to, or replays them from, a cassette directory
+    """
+
+    def __init__(self, model: str, mode: str = LLM_TRANSPORT, cassette_dir: str = LLM_CASSETTE_DIR,
+                 replay_latency_ms: str = LLM_REPLAY_LATENCY_MS, **kwargs):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"Unknown LLM transport '{mode}', expected one of {TRANSPORT_MODES}")
+
+        super().__init__(model=model, **kwargs)
+        self.mode = mode
+        self.cassette_dir = cassette_dir
+        self.replay_latency_ms = replay_latency_ms
+
+        if mode == "record":
+            os.makedirs(cassette_dir, exist_ok=True)
+
+    def request_key(self, messages: List[Dict[str, str]], tools: Optional[List[dict]] = None) -> str:
+        """Stable hash identifying a request by model, messages and tool schemas"""
+        request = {"model": self.model, "messages": messages, "tools": tools or []}
+        encoded = json.dumps(request, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def cassette_path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    def call(self, messages: Union[str, List[Dict[str, str]]], tools: Optional[List[dict]] = None,
+             callbacks: Optional[List[Any]] = None, available_functions: Optional[Dict[str, Any]] = None) -> str:
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+
+        if self.mode == "replay":
+            return self.replay(messages, tools, callbacks)
+
+        started = time.perf_counter()
+        response = super().call(messages, tools=tools, callbacks=callbacks, available_functions=available_functions)
+        elapsed = time.perf_counter() - started
+        transport_stats.add(elapsed)
+
+        if self.mode == "record":
+            self.record(messages, tools, response, elapsed)
+
+        return response
+
+    def record(self, messages: List[Dict[str, str]], tools: Optional[List[dict]], response: str,
+               elapsed: float) -> None:
+        """Save a prompt/response pair to the cassette directory"""
+        key = self.request_key(messages, tools)
+        cassette = {
+            "model": self.model,
+            "messages": messages,
+            "tools": tools or [],
+            "response": response,
+            "latency_ms": round(elapsed * 1000, 1),
+            "recorded_at": datetime.utcnow().isoformat(),
+        }
+
+        # Write to a temporary file first so a concurrent replay never reads a partial cassette
+        path = self.cassette_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(cassette, f, indent=2, default=str)
+        os.replace(temp_path, path)
+        logger.info(f"Recorded LLM response for {self.model} to {path}")
+
+    def replay(self, messages: List[Dict[str, str]], tools: Optional[List[dict]],
+               callbacks: Optional[List[Any]] = None) -> str:
+        """Serve a recorded response, sleeping for the configured latency"""
+        key = self.request_key(messages, tools)
+        path = self.cassette_path(key)
+        if not os.path.exists(path):
+            raise LookupError(
+                f"No recorded LLM response for {self.model} (key {key[:12]}) in {self.cassette_dir}. "
+                f"Run once with LLM_TRANSPORT=record to capture it."
+            )
+
+        with open(path) as f:
+            cassette = json.load(f)
+
+        if self.replay_latency_ms == "recorded":
+            latency = cassette.get("latency_ms", 0) / 1000
+        else:
+            latency = float(self.replay_latency_ms or 0) / 1000
+
+        if latency > 0:
+            time.sleep(latency)
+        transport_stats.add(latency)
+
+        self.report_usage(callbacks, messages, cassette["response"])
+        return cassette["response"]
+
+    def report_usage(self, callbacks: Optional[List[Any]], messages: List[Dict[str, str]], response: str) -> None:
+        """
+        Report estimated token usage of a replayed call to the agent's token counter.
+
+        Live calls are counted by crewai from the provider's usage; replayed calls never reach
+        the provider, so prompt and completion tokens are estimated from the text instead.
+        """
+        prompt_tokens = sum(count_tokens(str(message.get("content") or "")) for message in messages)
+        completion_tokens = count_tokens(str(response))
+
+        for callback in callbacks or []:
+            token_process = getattr(callback, "token_cost_process", None)
+            if token_process is not None:
+                token_process.sum_successful_requests(1)
+                token_process.sum_prompt_tokens(prompt_tokens)
+                token_process.sum_completion_tokens(completion_tokens)
+
+
+def build_llm(model: str) -> TransportLLM:
+    """
+    Build the LLM for an agent using the transport selected by LLM_TRANSPORT
+    """
+    return TransportLLM(model=model)
@@ -0,0 +1,258 @@
+"""
+Versioned, in-place migrations of the metadata database.
+
+Tables that do not exist yet are created by Base.metadata.create_all with the current models;
+the migrations bring tables created by an older version up to date. Every step checks the
+catalog before changing anything, so running a migration against a schema that already has
+its columns and indexes (e.g. a fresh install) only records its version.
+"""
+import logging
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy import Column, Index, UniqueConstraint, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import AddConstraint
+
+from src.models.chat import Chat
+from src.models.chat_message import ChatMessage
+from src.models.column_details import ColumnDetails
+from src.models.database_connection import DatabaseConnection
+from src.models.question_cache import QuestionCacheEntry
+from src.models.schema_migration import SchemaMigration
+from src.models.table_details import TableDetails
+
+# Key of the PostgreSQL advisory lock held while migrating, so concurrent starts migrate once
+MIGRATION_LOCK_KEY = 72_410_045
+
+# Registered migrations: (version, description, upgrade function), in version order
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, description: str):
+    """Register an upgrade function as the migration to the given schema version"""
+    def register(upgrade: Callable[[Connection], None]) -> Callable[[Connection], None]:
+        MIGRATIONS.append((version, description, upgrade))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return upgrade
+    return register
+
+
+def add_column(conn: Connection, column: Column, server_default: Optional[str] = None) -> bool:
+    """
+    Add a model column to its table unless the table already has it.
+
+    Args:
+        conn: Connection inside the migration's transaction
+        column: Column of a model's __table__, whose type is rendered for the dialect
+        server_default: SQL default that also fills the column in existing rows
+
+    Returns:
+        Whether the column was added
+    """
+    table = column.table.name
+    if column.name in {existing["name"] for existing in inspect(conn).get_columns(table)}:
+        return False
+
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if server_default is not None:
+        ddl += f" DEFAULT {server_default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    conn.execute(text(ddl))
+    logging.info(f"Added column {table}.{column.name}")
+    return True
+
+
+def create_index(conn: Connection, index: Index) -> bool:
+    """Create a model index unless an index with its name exists; returns whether it was created"""
+    table = index.table.name
+    if index.name in {existing["name"] for existing in inspect(conn).get_indexes(table)}:
+        return False
+
+    index.create(conn)
+    logging.info(f"Created index {index.name} on {table}")
+    return True
+
+
+def add_unique_constraint(conn: Connection, constraint: UniqueConstraint) -> bool:
+    """
+    Add a model unique constraint unless it exists; returns whether it was added.
+
+    SQLite cannot add constraints to an existing table, so it gets a unique index of the
+    same name, which enforces the same rule.
+    """
+    inspector = inspect(conn)
+    table = constraint.table.name
+    existing = {unique["name"] for unique in inspector.get_unique_constraints(table)}
+    existing |= {index["name"] for index in inspector.get_indexes(table)}
+    if constraint.name in existing:
+        return False
+
+    if conn.dialect.name == "sqlite":
+        columns = ", ".join(column.name for column in constraint.columns)
+        conn.execute(text(f"CREATE UNIQUE INDEX {constraint.name} ON {table} ({columns})"))
+    else:
+        conn.execute(AddConstraint(constraint))
+    logging.info(f"Added unique constraint {constraint.name} on {table}")
+    return True
+
+
+def model_index(table, name: str) -> Index:
+    """Get an index of a model's table by name"""
+    return next(index for index in table.indexes if index.name == name)
+
+
+def model_unique_constraint(table, name: str) -> UniqueConstraint:
+    """Get a unique constraint of a model's table by name"""
+    return next(constraint for constraint in table.constraints if constraint.name == name)
+
+
+@migration(1, "Question cache settings on connections")
+def add_question_cache_settings(conn: Connection) -> None:
+    columns = DatabaseConnection.__table__.c
+    add_column(conn, columns.question_cache_enabled, server_default="true")
+    add_column(conn, columns.question_cache_ttl_seconds)
+
+
+@migration(2, "Cache flag, stage timings, token usage and result artifact on messages")
+def add_message_observability(conn: Connection) -> None:
+    columns = ChatMessage.__table__.c
+    add_column(conn, columns.from_cache, server_default="false")
+    add_column(conn, columns.stage_timings)
+    add_column(conn, columns.token_usage)
+    add_column(conn, columns.result_artifact)
+
+
+def renumber_duplicate_message_indexes(conn: Connection) -> int:
+    """
+    Renumber the messages of chats in which a message_index repeats.
+
+    Indexes used to be computed as MAX(message_index) + 1 on insert, so concurrent inserts
+    could repeat one. Messages of the affected chats are numbered 0..n-1 in their current
+    order, ties broken by ID. Returns the number of chats renumbered.
+    """
+    duplicated = [row.chat_id for row in conn.execute(text(
+        "SELECT DISTINCT chat_id FROM chat_messages WHERE chat_id IS NOT NULL "
+        "GROUP BY chat_id, message_index HAVING COUNT(*) > 1"
+    ))]
+    if not duplicated:
+        return 0
+
+    messages = ChatMessage.__table__
+    rows = conn.execute(
+        select(messages.c.id, messages.c.chat_id)
+        .where(messages.c.chat_id.in_(duplicated))
+        .order_by(messages.c.chat_id, messages.c.message_index, messages.c.id)
+    ).all()
+
+    updates, chat_id, position = [], None, 0
+    for row in rows:
+        position = position + 1 if row.chat_id == chat_id else 0
+        chat_id = row.chat_id
+        updates.append({"message_id": row.id, "position": position})
+    conn.execute(text("UPDATE chat_messages SET message_index = :position WHERE id = :message_id"), updates)
+
+    logging.info(f"Renumbered the messages of {len(duplicated)} chats with repeated message indexes")
+    return len(duplicated)
+
+
+@migration(3, "Per-chat message index counter and unique message indexes")
+def add_message_index_counter(conn: Connection) -> None:
+    added = add_column(conn, Chat.__table__.c.next_message_index, server_default="0")
+
+    renumber_duplicate_message_indexes(conn)
+    add_unique_constraint(conn, model_unique_constraint(ChatMessage.__table__,
+                                                        "uq_chat_messages_chat_id_message_index"))
+
+    # Existing chats continue after their last message; a counter that already existed is kept
+    if added:
+        conn.execute(text(
+            "UPDATE chats SET next_message_index = COALESCE("
+            "(SELECT MAX(message_index) + 1 FROM chat_messages WHERE chat_messages.chat_id = chats.id), 0)"
+        ))
+
+
+@migration(4, "Chat listing index")
+def add_chat_listing_index(conn: Connection) -> None:
+    create_index(conn, model_index(Chat.__table__, "ix_chats_updated_at_id"))
+
+
+@migration(5, "Indexes for table and column metadata lookups")
+def add_metadata_lookup_indexes(conn: Connection) -> None:
+    create_index(conn, model_index(TableDetails.__table__, "ix_table_details_connection_id_table_name"))
+    create_index(conn, model_index(ColumnDetails.__table__, "ix_column_details_table_id"))
+
+
+@migration(6, "Result compaction time on messages")
+def add_result_compacted_at(conn: Connection) -> None:
+    add_column(conn, ChatMessage.__table__.c.result_compacted_at)
+
+
+@migration(7, "Question cache keys that keep intent words, negations and operators")
+def clear_question_cache_keys(conn: Connection) -> None:
+    # Keys used to drop stop words and operators, so entries could answer a different question;
+    # the cache is rebuilt as questions are asked again
+    cleared = conn.execute(QuestionCacheEntry.__table__.delete()).rowcount
+    logging.info(f"Cleared {cleared} question cache entries keyed by the old normalization")
+
+
+@migration(8, "Worker ID and heartbeat on messages")
+def add_message_heartbeat(conn: Connection) -> None:
+    columns = ChatMessage.__table__.c
+    add_column(conn, columns.worker_id)
+    add_column(conn, columns.heartbeat_at)
+
+
+@migration(9, "Pipeline of question cache entries")
+def add_question_cache_pipeline(conn: Connection) -> None:
+    add_column(conn, QuestionCacheEntry.__table__.c.pipeline, server_default="'python'")
+    # The pipeline of existing entries is unknown; the cache is rebuilt as questions are asked again
+    cleared = conn.execute(QuestionCacheEntry.__table__.delete()).rowcount
+    logging.info(f"Cleared {cleared} question cache entries stored without their pipeline")
+
+
+def get_schema_version(conn: Connection) -> int:
+    """Latest migration version applied to the database, 0 when none is recorded"""
+    version = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+
+def run_migrations(engine: Engine, existing_tables: Optional[Set[str]] = None) -> List[int]:
+    """
+    Apply the migrations newer than the database's schema version, each in its own transaction.
+
+    Args:
+        engine: Engine of the metadata database, whose tables already exist
+        existing_tables: Table names already read from the catalog, to skip checking for
+            schema_migrations again
+
+    Returns:
+        Versions of the migrations applied
+    """
+    applied = []
+    with engine.connect() as lock_conn:
+        postgres = lock_conn.dialect.name == "postgresql"
+        if postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            if existing_tables is None or SchemaMigration.__tablename__ not in existing_tables:
+                SchemaMigration.__table__.create(lock_conn, checkfirst=True)
+            current_version = get_schema_version(lock_conn)
+            lock_conn.commit()
+
+            for version, description, upgrade in MIGRATIONS:
+                if version <= current_version:
+                    continue
+
+                with engine.begin() as conn:
+                    logging.info(f"Applying migration {version}: {description}")
+                    upgrade(conn)
+                    conn.execute(SchemaMigration.__table__.insert().values(version=version,
+                                                                          description=description))
+                applied.append(version)
+        finally:
+            if postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                lock_conn.commit()
+
+    return applied
@@ -1,10 +1,12 @@
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List, Callable
 
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.tools import BaseTool
 from pydantic import BaseModel
 
+from src.core.llm_transport import build_llm
 from src.tools import execute_code_tool
 
 
@@ -17,13 +19,35 @@ class FinalOutput(BaseModel):
 class CodeExecutorTool(BaseTool):
     name: str = "execute_code_tool"
     description: str = "Execute the generated Python code and report results. Provides information for generating new code if execution fails."
+    # Start/end time and stage timings of every execution attempt, read back after kickoff
+    attempts: List[Dict[str, Any]] = []
+    # Optional callback(event, **data) told when an attempt starts and finishes
+    progress: Optional[Callable[..., None]] = None
+    # Run directory the executed code writes its CSV output to
+    result_namespace: Optional[str] = None
 
     def __init__(self):
         super().__init__()
 
     def _run(self, code: str, prompt: Optional[str] = None, previous_error: Optional[str] = None,
              retry_count: int = 0) -> Dict[str, Any]:
-        return execute_code_tool(code, prompt, previous_error, retry_count)
+        attempt = len(self.attempts) + 1
+        if self.progress:
+            self.progress("code_attempt", attempt=attempt)
+
+        started = time.time()
+        stage_timings = []
+        result = execute_code_tool(code, prompt, previous_error, retry_count, stage_timings=stage_timings,
+                                   result_namespace=self.result_namespace)
+        if self.progress:
+            self.progress("code_executed", attempt=attempt, success=result.get("success"))
+        self.attempts.append({
+            "started": started,
+            "ended": time.time(),
+            "success": result.get("success"),
+            "stages": stage_timings
+        })
+        return result
 
 
 @CrewBase
@@ -34,6 +58,7 @@ class AgstackCrew():
     def table_inference_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['table_inference_agent'],
+            llm=build_llm(self.agents_config['table_inference_agent']['llm']),
             tools=[],
             verbose=True,
         )
@@ -42,10 +67,28 @@ class AgstackCrew():
     def code_generator_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['code_generator_agent'],
-            tools=[CodeExecutorTool()],
+            llm=build_llm(self.agents_config['code_generator_agent']['llm']),
+            tools=[self.code_executor_tool()],
             verbose=True,
         )
 
+    def sql_generator_agent(self) -> Agent:
+        """Not an @agent so the Python pipeline's crew does not include it; one instance per crew"""
+        if getattr(self, "_sql_generator_agent", None) is None:
+            self._sql_generator_agent = Agent(
+                config=self.agents_config['sql_generator_agent'],
+                llm=build_llm(self.agents_config['sql_generator_agent']['llm']),
+                tools=[],
+                verbose=True,
+            )
+        return self._sql_generator_agent
+
+    def code_executor_tool(self) -> CodeExecutorTool:
+        """Single tool instance per crew so its execution attempts can be read after kickoff"""
+        if getattr(self, "_code_executor_tool", None) is None:
+            self._code_executor_tool = CodeExecutorTool()
+        return self._code_executor_tool
+
     @task
     def infer_tables_task(self) -> Task:
         return Task(
@@ -60,6 +103,21 @@ class AgstackCrew():
             agent=self.code_generator_agent(),
         )
 
+    def generate_sql_task(self) -> Task:
+        return Task(
+            config=self.tasks_config['generate_sql_task'],
+            name="generate_sql_task",
+            agent=self.sql_generator_agent(),
+            context=[self.infer_tables_task()],
+        )
+
+    def generate_sql_candidate_task(self) -> Task:
+        return Task(
+            config=self.tasks_config['generate_sql_candidate_task'],
+            name="generate_sql_candidate_task",
+            agent=self.sql_generator_agent(),
+        )
+
     @crew
     def crew(self) -> Crew:
         """Creates the Test crew"""
@@ -69,3 +127,30 @@ class AgstackCrew():
             process=Process.sequential,
             verbose=True,
         )
+
+    def sql_crew(self) -> Crew:
+        """Creates the crew of the SQL pipeline, which only returns a SQL query"""
+        return Crew(
+            agents=[self.table_inference_agent(), self.sql_generator_agent()],
+            tasks=[self.infer_tables_task(), self.generate_sql_task()],
+            process=Process.sequential,
+            verbose=True,
+        )
+
+    def table_inference_crew(self) -> Crew:
+        """Creates a crew that only infers the tables required for the question"""
+        return Crew(
+            agents=[self.table_inference_agent()],
+            tasks=[self.infer_tables_task()],
+            process=Process.sequential,
+            verbose=True,
+        )
+
+    def sql_candidate_crew(self) -> Crew:
+        """Creates a crew that writes one candidate SQL query for already inferred tables"""
+        return Crew(
+            agents=[self.sql_generator_agent()],
+            tasks=[self.generate_sql_candidate_task()],
+            process=Process.sequential,
+            verbose=True,
+        )
@@ -1,21 +1,44 @@
+import json
 import logging
-from typing import List
+import zlib
+from typing import Any, AsyncIterator, Iterator, List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from src.core.database import get_db
+from src.core.config import (
+    CHAT_LIST_MAX_PAGE_SIZE,
+    CHAT_LIST_PAGE_SIZE,
+    CHAT_MESSAGE_MAX_WAIT_SECONDS,
+    MESSAGE_EVENTS_KEEPALIVE_SECONDS,
+    MESSAGE_EVENTS_ROW_CHUNK_SIZE,
+    RESULT_ROWS_MAX_LIMIT,
+)
+from src.core.database import get_db, SessionLocal
 from src.models.chat_message import ChatMessage
+from src.modules.file_utils import EXPORT_FORMATS, get_result_export
 from src.schemas.chat import ChatCreate, ChatResponse, ChatWithConnectionsResponse
 from src.schemas.chat_message import ChatMessageCreate, ChatMessageResponse, ChatMessageSend
 from src.services.chat_service import ChatService
+from src.services.db_utils import CustomJSONEncoder, get_message_by_id
+from src.services.message_queue_service import MessageQueueService
+from src.services.retention_service import RetentionService, RetentionSweeper
 
 router = APIRouter()
 chat_service = ChatService()
+message_queue_service = MessageQueueService(chat_service)
+retention_service = RetentionService()
+retention_sweeper = RetentionSweeper(retention_service)
+
+# Result downloads: media type per format and bytes read per chunk when compressing on the fly
+DOWNLOAD_MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet", "jsonl": "application/x-ndjson"}
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
 
 @router.post("/chats", response_model=ChatResponse)
-async def create_chat(chat_data: ChatCreate, db: Session = Depends(get_db)):
+def create_chat(chat_data: ChatCreate, db: Session = Depends(get_db)):
     """
     Create a new chat with connections.
     Requires:
@@ -29,15 +52,29 @@ async def create_chat(chat_data: ChatCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/chats", response_model=List[ChatWithConnectionsResponse])
-async def get_all_chats(db: Session = Depends(get_db)):
+def get_all_chats(
+    response: Response,
+    limit: int = Query(CHAT_LIST_PAGE_SIZE, ge=1, description="Chats per page, capped by CHAT_LIST_MAX_PAGE_SIZE"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    connection_id: Optional[List[int]] = Query(None, description="Only chats using any of these connections"),
+    db: Session = Depends(get_db)
+):
     """
-    Get all chats with their associated connections
+    Get a page of chats with their associated connections, most recently updated first.
+    When there are more chats, the X-Next-Cursor response header holds the cursor of the next page.
     """
-    return chat_service.get_all_chats_with_connections(db)
+    try:
+        chats, next_cursor = chat_service.list_chats(db, min(limit, CHAT_LIST_MAX_PAGE_SIZE), cursor, connection_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return chats
 
 
 @router.get("/chats/{chat_id}", response_model=ChatWithConnectionsResponse)
-async def get_chat(chat_id: int, db: Session = Depends(get_db)):
+def get_chat(chat_id: int, db: Session = Depends(get_db)):
     """
     Get chat details by ID, including associated connections
     """
@@ -48,7 +85,7 @@ async def get_chat(chat_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/chats/{chat_id}/messages", response_model=List[ChatMessageResponse])
-async def get_chat_messages(chat_id: int, db: Session = Depends(get_db)):
+def get_chat_messages(chat_id: int, db: Session = Depends(get_db)):
     """
     Get all messages for a chat, sorted by message_index
     """
@@ -59,21 +96,24 @@ async def get_chat_messages(chat_id: int, db: Session = Depends(get_db)):
     return chat_service.get_chat_messages(db, chat_id)
 
 
-@router.post("/chats/{chat_id}/messages", response_model=ChatMessageResponse)
-async def send_message(
+@router.post("/chats/{chat_id}/messages", response_model=ChatMessageResponse, status_code=202)
+def send_message(
     chat_id: int,
     message_data: ChatMessageSend,
     db: Session = Depends(get_db)
 ):
     """
-    Send a message to a chat and get the AI response.
+    Send a message to a chat and queue it for the AI.
     
     This endpoint:
     1. Verifies the chat exists
-    2. Creates a message record
-    3. Gets connections associated with the chat
-    4. Processes the message with the AI
-    5. Returns the complete message with results
+    2. Gets connections associated with the chat
+    3. Creates the user message and a pending assistant message
+    4. Queues the message for a background worker
+    5. Returns the pending assistant message immediately
+
+    Poll GET /chats/messages/{message_id} (optionally with ?wait=seconds) until its
+    status is "completed" or "failed".
     """
     # Check if the chat exists
     chat = chat_service.get_chat_with_connections(db, chat_id)
@@ -95,24 +135,243 @@ async def send_message(
         content=message_data.content,
         role=message_data.role,
         chat_id=chat_id,
-        connection_ids=connection_ids
+        connection_ids=connection_ids,
+        pipeline_mode=message_data.pipeline_mode
     )
     
-    # Process message
+    # Queue message
     try:
-        return chat_service.process_message(db, chat_message)
+        return message_queue_service.submit(db, chat_message)
     except Exception as e:
-        logging.error(f"Error processing message: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
+        logging.error(f"Error queueing message: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error queueing message: {str(e)}")
 
 
 @router.get("/chats/messages/{message_id}", response_model=ChatMessageResponse)
-async def get_message(message_id: int, db: Session = Depends(get_db)):
+async def get_message(
+    message_id: int,
+    wait: float = Query(0, ge=0, description="Seconds to wait for a queued message to be answered"),
+    db: Session = Depends(get_db)
+):
     """
-    Get a specific chat message
+    Get a specific chat message.
+    With wait > 0, a message still being answered is returned once it completes or fails,
+    or after wait seconds (capped by CHAT_MESSAGE_MAX_WAIT_SECONDS) with its current status.
     """
-    message = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
+    # Async so a long poll does not hold a threadpool thread; database calls are offloaded
+    message = await run_in_threadpool(get_message_by_id, db, message_id)
     if not message:
         raise HTTPException(status_code=404, detail=f"Message with ID {message_id} not found")
-    
+
+    if wait > 0 and message.status in ("pending", "processing") and message_queue_service.is_queued(message_id):
+        await message_queue_service.wait_async(message_id, min(wait, CHAT_MESSAGE_MAX_WAIT_SECONDS))
+        await run_in_threadpool(db.refresh, message)
+
     return message
+
+
+@router.get("/chats/messages/{message_id}/rows")
+def get_message_rows(
+    message_id: int,
+    offset: int = Query(0, ge=0, description="Index of the first row"),
+    limit: int = Query(100, ge=1, description="Maximum number of rows, capped by RESULT_ROWS_MAX_LIMIT"),
+    sort: Optional[str] = Query(None, description="Comma-separated columns to sort by, prefix with - for descending"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a slice of a message's result rows, sorted and projected on the server.
+    The message itself only holds a preview; the full result is read from its artifact.
+    Returns columns, data (the rows of the slice), row_count (of the whole result) and offset.
+    """
+    message = get_message_by_id(db, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail=f"Message with ID {message_id} not found")
+
+    column_names = [name.strip() for name in columns.split(",") if name.strip()] if columns else None
+    try:
+        return chat_service.get_message_rows(message, offset, min(limit, RESULT_ROWS_MAX_LIMIT),
+                                             columns=column_names, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Result rows of message {message_id} are no longer available")
+
+
+@router.get("/chats/messages/{message_id}/summary")
+def get_message_summary(message_id: int, db: Session = Depends(get_db)):
+    """
+    Get the summary of a message's result, served from the manifest written with it.
+    Returns row_count, the Arrow schema, per-column statistics (nulls, min, max, distinct and
+    distinct_estimated) and preview (the first rows).
+    """
+    message = get_message_by_id(db, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail=f"Message with ID {message_id} not found")
+
+    try:
+        return chat_service.get_message_summary(message)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Result rows of message {message_id} are no longer available")
+
+
+def gzip_file_chunks(path: str) -> Iterator[bytes]:
+    """Read a file in chunks and gzip it as it is sent, keeping memory use constant"""
+    # wbits 31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    with open(path, "rb") as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    yield compressor.flush()
+
+
+@router.get("/chats/messages/{message_id}/download")
+def download_message_result(
+    request: Request,
+    message_id: int,
+    format: str = Query("csv", description="csv, parquet or jsonl"),
+    db: Session = Depends(get_db)
+):
+    """
+    Download all rows of a message's result as a file.
+
+    The stored Parquet artifact is served as is; CSV and JSON Lines exports are written from it
+    once and then served from disk. Range requests are supported. CSV and JSON Lines are gzipped
+    on the fly for clients that accept it, unless a range is requested.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}', "
+                                                    f"expected one of {', '.join(EXPORT_FORMATS)}")
+
+    message = get_message_by_id(db, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail=f"Message with ID {message_id} not found")
+    if not message.result_artifact:
+        raise HTTPException(status_code=404, detail=f"Message {message_id} has no stored result to download")
+
+    try:
+        path = get_result_export(message.result_artifact, format)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Result rows of message {message_id} are no longer available")
+
+    filename = f"message_{message_id}.{format}"
+    media_type = DOWNLOAD_MEDIA_TYPES[format]
+    accepts_gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+
+    # Parquet is already compressed, and ranges address the uncompressed file: the gzip stream
+    # can't serve them, so only the FileResponse (which handles Range) advertises byte ranges
+    if format != "parquet" and accepts_gzip and "range" not in request.headers:
+        return StreamingResponse(
+            gzip_file_chunks(path),
+            media_type=media_type,
+            headers={"Content-Encoding": "gzip", "Content-Disposition": f'attachment; filename="{filename}"',
+                     "Vary": "Accept-Encoding", "Accept-Ranges": "none"}
+        )
+
+    return FileResponse(path, media_type=media_type, filename=filename, headers={"Vary": "Accept-Encoding"})
+
+
+def format_event(event: str, data: Any) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, cls=CustomJSONEncoder)}\n\n"
+
+
+def load_message(message_id: int) -> Optional[ChatMessage]:
+    """Load a message with a short-lived session of its own"""
+    db = SessionLocal()
+    try:
+        return get_message_by_id(db, message_id)
+    finally:
+        db.close()
+
+
+async def stream_message_events(message_id: int) -> AsyncIterator[str]:
+    """
+    Progress events of a queued message as they happen, then the answered message and all rows
+    of its result in chunks, read from its artifact (or the inline rows of messages without one)
+    """
+    stream = message_queue_service.get_stream(message_id)
+    if stream:
+        cursor = 0
+        while True:
+            events, closed = await stream.read_async(cursor, MESSAGE_EVENTS_KEEPALIVE_SECONDS)
+            cursor += len(events)
+            for event in events:
+                yield format_event(event["event"], event["data"])
+            if closed:
+                break
+            if not events:
+                yield ": keep-alive\n\n"
+
+    message = await run_in_threadpool(load_message, message_id)
+    if not message:
+        yield format_event("done", {"status": "deleted"})
+        return
+
+    result_content = message.result_content or {}
+    yield format_event("message", {
+        "id": message.id,
+        "status": message.status,
+        "content": message.content,
+        "generated_code": message.generated_code,
+        "from_cache": message.from_cache,
+        "stage_timings": message.stage_timings,
+        "token_usage": message.token_usage,
+        "result_content": {key: value for key, value in result_content.items() if key != "data"}
+    })
+
+    chunk_size = max(1, MESSAGE_EVENTS_ROW_CHUNK_SIZE)
+    offset, row_count = 0, None
+    while row_count is None or offset < row_count:
+        try:
+            chunk = await run_in_threadpool(chat_service.get_message_rows, message, offset, chunk_size)
+        except FileNotFoundError:
+            # The artifact was removed by retention while the rows were streamed
+            logging.warning(f"Result rows of message {message_id} are no longer available")
+            break
+        row_count = chunk["row_count"]
+        if not chunk["data"]:
+            break
+        yield format_event("rows", {"offset": offset, "rows": chunk["data"]})
+        offset += len(chunk["data"])
+
+    yield format_event("done", {"status": message.status, "row_count": result_content.get("row_count", offset)})
+
+
+@router.get("/chats/messages/{message_id}/events")
+async def get_message_events(message_id: int):
+    """
+    Stream a message as server-sent events.
+
+    While the message is being answered:
+    - status: pending, processing, completed or failed
+    - connections_selected, tables_inferred, code_attempt, code_executed, executing, rows_fetched
+    - stage: every recorded stage timing as it finishes
+    Then:
+    - message: the answered message without its rows
+    - rows: all rows of the result in chunks of MESSAGE_EVENTS_ROW_CHUNK_SIZE, with their offset
+    - done: end of the stream, with the row count of the whole result
+    """
+    message = await run_in_threadpool(load_message, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail=f"Message with ID {message_id} not found")
+
+    return StreamingResponse(
+        stream_message_events(message_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/retention/sweep")
+def sweep_results(
+    dry_run: bool = Query(False, description="Only report what would be removed and compacted"),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply the retention policies now instead of waiting for the background sweep.
+    Returns the files removed, the results compacted to their preview and the bytes reclaimed.
+    """
+    return retention_service.sweep(db, dry_run=dry_run)
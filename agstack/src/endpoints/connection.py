@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 
 from src.core.database import get_db
 from src.schemas.database_connection import DatabaseConnectionCreate, ConnectionResultResponse, \
-    DatabaseConnectionResponse
+    DatabaseConnectionResponse, QuestionCacheSettings
 from src.services.connection_service import ConnectionService
 
 router = APIRouter()
@@ -14,7 +14,7 @@ connection_service = ConnectionService()
 
 
 @router.post("/connect", response_model=ConnectionResultResponse)
-async def create_connection(request: DatabaseConnectionCreate, db: Session = Depends(get_db)):
+def create_connection(request: DatabaseConnectionCreate, db: Session = Depends(get_db)):
     """
     Create a new database connection and fetch table/column information
     """
@@ -28,7 +28,7 @@ async def create_connection(request: DatabaseConnectionCreate, db: Session = Dep
 
 
 @router.get("/all", response_model=List[DatabaseConnectionResponse])
-async def get_all_connections(db: Session = Depends(get_db)):
+def get_all_connections(db: Session = Depends(get_db)):
     """
     Get all database connections
     """
@@ -36,7 +36,7 @@ async def get_all_connections(db: Session = Depends(get_db)):
 
 
 @router.delete("/{connection_id}", response_model=ConnectionResultResponse)
-async def delete_connection(connection_id: int, db: Session = Depends(get_db)):
+def delete_connection(connection_id: int, db: Session = Depends(get_db)):
     """
     Delete a database connection by ID
     """
@@ -50,7 +50,7 @@ async def delete_connection(connection_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/{connection_id}/tables", response_model=ConnectionResultResponse)
-async def get_connection_tables(connection_id: int, db: Session = Depends(get_db)):
+def get_connection_tables(connection_id: int, db: Session = Depends(get_db)):
     """
     Get tables for a specific connection
     """
@@ -64,8 +64,37 @@ async def get_connection_tables(connection_id: int, db: Session = Depends(get_db
 
 
 @router.get("/{connection_id}/tables/{table_name}/columns", response_model=List[str])
-async def get_table_columns(connection_id: int, table_name: str, db: Session = Depends(get_db)):
+def get_table_columns(connection_id: int, table_name: str, db: Session = Depends(get_db)):
     """
     Get columns for a specific table in a connection
     """
     return connection_service.get_columns_for_table(db, connection_id, table_name)
+
+
+@router.put("/{connection_id}/question-cache", response_model=ConnectionResultResponse)
+def update_question_cache_settings(connection_id: int, settings: QuestionCacheSettings,
+                                         db: Session = Depends(get_db)):
+    """
+    Enable or disable the question cache for a connection and set how long entries stay fresh
+    """
+    success, message = connection_service.update_question_cache_settings(db, connection_id, settings)
+
+    return ConnectionResultResponse(
+        success=success,
+        message=message,
+        tables=None
+    )
+
+
+@router.delete("/{connection_id}/question-cache", response_model=ConnectionResultResponse)
+def clear_question_cache(connection_id: int, db: Session = Depends(get_db)):
+    """
+    Remove all cached questions for a connection
+    """
+    success, message = connection_service.clear_question_cache(db, connection_id)
+
+    return ConnectionResultResponse(
+        success=success,
+        message=message,
+        tables=None
+    )
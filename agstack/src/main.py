@@ -32,6 +32,7 @@ def train():
 def replay():
     """
     Replay the crew execution from a specific task.
+    With LLM_TRANSPORT=replay the agents answer from recorded cassettes instead of the live model.
     """
     try:
         instance.replay(task_id=sys.argv[1])
@@ -42,6 +43,7 @@ def replay():
 def test():
     """
     Test the crew execution and returns the results.
+    The agents honour LLM_TRANSPORT (record/replay); the evaluator model is always called live.
     """
     try:
         instance.test(
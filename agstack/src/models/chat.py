@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, ARRAY, event, Table
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, ARRAY, event, Table, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -20,12 +20,18 @@ class Chat(Base):
     Model for storing chat sessions
     """
     __tablename__ = "chats"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Keyset pagination of the chat listing, most recently updated first
+        Index("ix_chats_updated_at_id", "updated_at", "id"),
+        {'extend_existing': True}
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, default="New Chat")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Next free message_index of the chat, reserved atomically by allocate_message_indexes
+    next_message_index = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships
     messages = relationship("ChatMessage", back_populates="chat", cascade="all, delete-orphan")
@@ -1,8 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, event
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import text
 
 from src.core.database import Base
 
@@ -12,7 +11,11 @@ class ChatMessage(Base):
     Model for storing chat messages
     """
     __tablename__ = "chat_messages"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Indexes are reserved from chats.next_message_index, so they never repeat within a chat
+        UniqueConstraint("chat_id", "message_index", name="uq_chat_messages_chat_id_message_index"),
+        {'extend_existing': True}
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), index=True)
@@ -24,19 +27,18 @@ class ChatMessage(Base):
     # Fields for storing crew execution results
     status = Column(String, default="pending")  # pending, processing, completed, failed
     generated_code = Column(Text, nullable=True)
-    result_content = Column(JSON, nullable=True)  # Actual content of the result for direct API responses
+    result_content = Column(JSON, nullable=True)  # Row count, schema and a preview of the result for API responses
+    result_artifact = Column(String, nullable=True)  # Parquet file in file_utils.ARTIFACTS_DIR with all result rows
+    result_compacted_at = Column(DateTime, nullable=True)  # When retention reduced the result to its preview
+    from_cache = Column(Boolean, default=False)  # True when the result reused cached generated code
 
-    # Relationship
-    chat = relationship("Chat", back_populates="messages")
+    # Server process answering the message and when it last reported the message alive
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
 
+    # Observability for assistant messages
+    stage_timings = Column(JSON, nullable=True)  # Seconds spent per pipeline stage
+    token_usage = Column(JSON, nullable=True)  # Prompt/completion tokens per agent
 
-@event.listens_for(ChatMessage, "before_insert")
-def set_message_index(mapper, connection, target):
-    """
-    Automatically set message_index to the next available index for this chat
-    """
-    if target.chat_id is not None:
-        # Get the current max index for this chat
-        stmt = text(f"SELECT COALESCE(MAX(message_index) + 1, 0) FROM chat_messages WHERE chat_id = {target.chat_id}")
-        next_index = connection.execute(stmt).scalar()
-        target.message_index = next_index
+    # Relationship
+    chat = relationship("Chat", back_populates="messages")
@@ -13,7 +13,7 @@ class ColumnDetails(Base):
     __tablename__ = "column_details"
 
     id = Column(Integer, primary_key=True, index=True)
-    table_id = Column(Integer, ForeignKey("table_details.id"))
+    table_id = Column(Integer, ForeignKey("table_details.id"), index=True)
     column_name = Column(String)
     data_type = Column(String)
     is_nullable = Column(String)  # "YES" or "NO" as returned by information_schema
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, JSON
+
+from src.core.database import Base
+
+
+class ConnectionSchema(Base):
+    """
+    Model for storing the precomputed schema payload of a connection
+    """
+    __tablename__ = "connection_schemas"
+
+    connection_id = Column(Integer, ForeignKey("database_connections.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)  # Bumped every time the payload is rebuilt
+    format_version = Column(Integer, nullable=False)  # Layout of the payload, see SchemaCacheService
+    payload = Column(JSON, nullable=False)  # Table metadata keyed by table name
+    built_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Boolean
 from sqlalchemy.orm import relationship
 
 from src.core.database import Base
@@ -19,5 +19,9 @@ class DatabaseConnection(Base):
     database_name = Column(String)
     schema_name = Column(String, default="public")  # Default to public schema
 
+    # Question cache controls
+    question_cache_enabled = Column(Boolean, default=True)
+    question_cache_ttl_seconds = Column(Integer, nullable=True)  # Overrides QUESTION_CACHE_TTL_SECONDS when set
+
     # Add relationship with cascade delete - use table_details instead of tables
     table_details = relationship("TableDetails", back_populates="connection", cascade="all, delete-orphan")
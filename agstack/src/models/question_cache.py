@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, UniqueConstraint
+
+from src.core.database import Base
+
+
+class QuestionCacheEntry(Base):
+    """
+    Model for storing generated code for previously answered questions
+    """
+    __tablename__ = "question_cache"
+    __table_args__ = (
+        UniqueConstraint("connection_id", "normalized_question", name="uq_question_cache_connection_question"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    connection_id = Column(Integer, ForeignKey("database_connections.id", ondelete="CASCADE"), index=True)
+    normalized_question = Column(String, nullable=False)
+    question = Column(Text, nullable=False)
+    generated_code = Column(Text, nullable=False)
+    csv_file_name = Column(String, nullable=False)
+    pipeline = Column(String, nullable=False, default="python")  # "sql" or "python", how generated_code runs
+    message_id = Column(Integer, ForeignKey("chat_messages.id", ondelete="SET NULL"), nullable=True)
+    schema_version = Column(Integer, nullable=True)  # ConnectionSchema.version the code was generated against
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
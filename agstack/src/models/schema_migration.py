@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime
+
+from src.core.database import Base
+
+
+class SchemaMigration(Base):
+    """
+    Model for recording the schema migrations applied to the metadata database
+    """
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
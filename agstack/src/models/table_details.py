@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 
 from src.core.database import Base
@@ -7,6 +7,10 @@ class TableDetails(Base):
     Model for storing details about tables synced from user databases
     """
     __tablename__ = "table_details"
+    __table_args__ = (
+        # Tables of a connection and a table by name; also serves lookups on connection_id alone
+        Index("ix_table_details_connection_id_table_name", "connection_id", "table_name"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     connection_id = Column(Integer, ForeignKey("database_connections.id", ondelete="CASCADE"))
@@ -1,15 +1,18 @@
 import logging
-from typing import Optional, Dict, Any
+import threading
+from typing import Optional, Dict, Any, Tuple
 
 import pandas as pd
-import psycopg2
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from sqlalchemy import text
 
+from src.core.config import EXTERNAL_POOL_MAX_CONNECTIONS, EXTERNAL_POOL_TIMEOUT_SECONDS
 from src.core.database import SessionLocal
 from src.models.database_connection import DatabaseConnection
 # Import related models to ensure relationships are properly resolved
 from src.models.table_details import TableDetails
 from src.models.column_details import ColumnDetails
+from src.utils.stage_timer import record_subprocess_stage
 
 
 def get_db_connection_details(connection_name: str) -> Optional[Dict[str, Any]]:
@@ -37,19 +40,106 @@ def get_db_connection_details(connection_name: str) -> Optional[Dict[str, Any]]:
         db.close()
 
 
-def execute_query(query: str, connection_name: str) -> pd.DataFrame:
+class ExternalConnectionPool:
+    """
+    Connection pool to an external database that waits for a free connection when all of them
+    are borrowed, instead of failing right away like ThreadedConnectionPool does.
+
+    A retired pool (replaced or deleted connection) closes its connections once every borrowed
+    one has been returned, so queries still running on it finish normally.
+    """
+
+    def __init__(self, max_connections: int, **conn_details: Any):
+        self._pool = ThreadedConnectionPool(1, max_connections, **conn_details)
+        self._available = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._borrowed = 0
+        self._retired = False
+
+    def getconn(self, timeout: float = EXTERNAL_POOL_TIMEOUT_SECONDS):
+        """Borrow a connection, waiting up to timeout seconds for one to be returned"""
+        if not self._available.acquire(timeout=max(0.0, timeout)):
+            raise PoolError(f"No pooled connection became available within {timeout}s")
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._available.release()
+            raise
+        with self._lock:
+            self._borrowed += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """Return a borrowed connection, closing it if it is broken or the pool was retired"""
+        with self._lock:
+            self._pool.putconn(conn, close=close)
+            self._borrowed -= 1
+            if self._retired and self._borrowed == 0:
+                self._pool.closeall()
+        self._available.release()
+
+    def retire(self) -> None:
+        """Close the pool now if no connection is borrowed, and otherwise when the last one is returned"""
+        with self._lock:
+            self._retired = True
+            if self._borrowed == 0:
+                self._pool.closeall()
+
+
+# Connection pools to the external databases, keyed by connection name
+_pools: Dict[str, Tuple[Tuple, ExternalConnectionPool]] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(connection_name: str, conn_details: Dict[str, Any]) -> ExternalConnectionPool:
+    """
+    Get the connection pool for an external database, creating it on first use.
+
+    The pool is replaced when the connection's details change; the old one is retired, so
+    queries still holding its connections are not interrupted.
+    """
+    key = tuple(sorted(conn_details.items()))
+    with _pools_lock:
+        existing = _pools.get(connection_name)
+        if existing and existing[0] == key:
+            return existing[1]
+
+        if existing:
+            existing[1].retire()
+
+        logging.info(
+            f"Opening connection pool to external database: {conn_details['dbname']} on "
+            f"{conn_details['host']}:{conn_details['port']}")
+        pool = ExternalConnectionPool(max(1, EXTERNAL_POOL_MAX_CONNECTIONS), **conn_details)
+        _pools[connection_name] = (key, pool)
+        return pool
+
+
+def close_connection_pool(connection_name: str) -> None:
+    """
+    Close the pooled connections to an external database, e.g. after the connection is deleted.
+    Connections still borrowed are closed when they are returned
+    """
+    with _pools_lock:
+        existing = _pools.pop(connection_name, None)
+    if existing:
+        existing[1].retire()
+
+
+def execute_query(query: str, connection_name: str, read_only: bool = False) -> pd.DataFrame:
     """
     Execute a SQL query against the EXTERNAL database specified by connection_name.
     
     This function:
     1. Gets connection details from our application database
-    2. Connects to the EXTERNAL database using those details
+    2. Borrows a pooled connection to the EXTERNAL database using those details
     3. Executes the provided query on that EXTERNAL database
     4. Returns the results as a DataFrame
     
     Args:
         query: SQL query to execute
         connection_name: Name of the connection in our application database
+        read_only: Run the query in a read-only transaction
         
     Returns:
         DataFrame containing query results
@@ -62,20 +152,47 @@ def execute_query(query: str, connection_name: str) -> pd.DataFrame:
         raise ValueError(f"Connection '{connection_name}' not found")
 
     try:
-        # Connect to the EXTERNAL database
-        logging.info(
-            f"Connecting to external database: {conn_details['dbname']} on {conn_details['host']}:{conn_details['port']}")
-        conn = psycopg2.connect(**conn_details)
-
-        # Execute the query on the EXTERNAL database
-        logging.info(f"Executing query on external database: {query}")
-        df = pd.read_sql_query(query, conn)
+        with record_subprocess_stage("external_query"):
+            pool = get_connection_pool(connection_name, conn_details)
+            conn = pool.getconn()
+            broken = False
+            try:
+                if read_only:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SET TRANSACTION READ ONLY")
 
-        # Close the connection
-        conn.close()
+                # Execute the query on the EXTERNAL database
+                logging.info(f"Executing query on external database: {query}")
+                df = pd.read_sql_query(query, conn)
+            except Exception:
+                broken = bool(conn.closed)
+                raise
+            finally:
+                # End the transaction so the connection goes back to the pool idle
+                if not conn.closed:
+                    conn.rollback()
+                pool.putconn(conn, close=broken)
 
         logging.info(f"Query returned {len(df)} rows from external database")
         return df
     except Exception as e:
         logging.error(f"Error executing query on external database: {str(e)}")
         raise
+
+
+def explain_query(query: str, connection_name: str) -> str:
+    """
+    Check a SQL query against the EXTERNAL database with EXPLAIN, without running it.
+    
+    Args:
+        query: SQL query to check
+        connection_name: Name of the connection in our application database
+        
+    Returns:
+        The query plan as text
+
+    Raises:
+        Exception: The database error if the query is invalid (unknown table, column, syntax)
+    """
+    df = execute_query(f"EXPLAIN {query}", connection_name, read_only=True)
+    return "\n".join(str(line) for line in df.iloc[:, 0].tolist())
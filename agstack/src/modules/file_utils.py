@@ -1,10 +1,20 @@
+import hashlib
+import json
 import logging
+import math
 import os
+import threading
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, Tuple
 
 import pandas as pd
 
+from src.core.config import RESULT_ARTIFACT_COMPRESSION, RESULT_ARTIFACT_ROW_GROUP_SIZE, RESULT_OUTPUT_FORMAT, \
+    RESULT_PREVIEW_ROWS, RESULT_SORT_CACHE_SIZE
+from src.utils.stage_timer import record_subprocess_stage
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,81 +27,648 @@ os.makedirs(CSV_DIR, exist_ok=True)
 RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "results")
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
+# Environment variable naming the run directory under CSV_DIR that executed code writes its output to
+RESULT_NAMESPACE_ENV = "AGSTACK_RESULT_NAMESPACE"
+
+# Formats write_df can write, by file extension
+OUTPUT_FORMATS = {".csv": "csv", ".parquet": "parquet", ".feather": "feather"}
+
+# Parquet artifacts holding the full result rows of assistant messages
+ARTIFACTS_DIR = os.path.join(RESULTS_DIR, "artifacts")
+os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+
+# CSV and JSON Lines exports of artifacts, written on their first download
+EXPORTS_DIR = os.path.join(ARTIFACTS_DIR, "exports")
+os.makedirs(EXPORTS_DIR, exist_ok=True)
+EXPORT_FORMATS = ("csv", "parquet", "jsonl")
+
+# Manifests of artifacts (row count, schema, column statistics and preview rows), written with them
+MANIFESTS_DIR = os.path.join(ARTIFACTS_DIR, "manifests")
+os.makedirs(MANIFESTS_DIR, exist_ok=True)
+
+# Distinct counts of columns over DISTINCT_EXACT_ROWS are estimated from about DISTINCT_SKETCH_SIZE
+# of their smallest distinct hashes, unless their first DISTINCT_PROBE_ROWS rows hold few distinct
+# values. Text columns holding more than DISTINCT_HASH_MAX_BYTES are counted exactly instead,
+# which Arrow does faster than hashing long values in pandas
+DISTINCT_EXACT_ROWS = 16_384
+DISTINCT_SKETCH_SIZE = 4096
+DISTINCT_PROBE_ROWS = 16_384
+DISTINCT_HASH_MAX_BYTES = 32 * 1024 * 1024
 
-def write_df(df: pd.DataFrame, filename: Optional[str] = None) -> str:
+# Sorted row numbers of recently paged artifacts by (path, mtime, sort keys)
+_sort_indices: "OrderedDict[Tuple[Any, ...], Any]" = OrderedDict()
+_sort_indices_lock = threading.Lock()
+
+
+def write_df(df: pd.DataFrame, filename: Optional[str] = None, namespace: Optional[str] = None) -> str:
     """
-    Write a DataFrame to a CSV file in the src/csv_data/outputs directory.
-    Will overwrite the file if it already exists.
+    Write a DataFrame to a CSV, Parquet or Feather file in the src/csv_data/outputs directory.
+    The format is that of a .parquet or .feather filename, and RESULT_OUTPUT_FORMAT otherwise;
+    Parquet and Feather keep the column dtypes. Files of a run are namespaced in a directory of
+    their own, so concurrent runs choosing the same filename do not overwrite each other. The
+    file is written under a temporary name first, so readers never see a partial file.
     
     Args:
         df: DataFrame to write
         filename: Optional filename (timestamp will be used if not provided)
+        namespace: Run directory to write to; defaults to the one named by RESULT_NAMESPACE_ENV,
+            which the code executor sets for the generated code
         
     Returns:
-        Path to the created CSV file
+        Path to the created file, whose extension is that of the format written
     """
     if filename is None:
         # Generate a filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"result_{timestamp}.csv"
-
-    # Ensure filename has .csv extension
-    if not filename.endswith('.csv'):
-        filename += '.csv'
+        filename = f"result_{timestamp}"
 
-    # Create full path - using the new CSV_DIR
-    filepath = os.path.join(CSV_DIR, filename)
+    filepath = get_output_path(filename, namespace or os.environ.get(RESULT_NAMESPACE_ENV))
+    output_format = get_output_format(filepath)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
 
-    # Write DataFrame to CSV, mode='w' ensures overwriting
     logger.info(f"Writing DataFrame with {len(df)} rows to {filepath}")
-    df.to_csv(filepath, index=False, mode='w')
+    with record_subprocess_stage("csv_write", format=output_format):
+        if output_format == "parquet":
+            import pyarrow.parquet as pq
+
+            pq.write_table(dataframe_to_arrow(df), temp_path, compression=RESULT_ARTIFACT_COMPRESSION)
+        elif output_format == "feather":
+            import pyarrow.feather as feather
+
+            feather.write_feather(dataframe_to_arrow(df), temp_path)
+        else:
+            df.to_csv(temp_path, index=False, mode='w')
+        os.replace(temp_path, filepath)
 
     return filepath
 
 
-def read_csv_data(filepath: str) -> Dict[str, Any]:
+def new_result_namespace() -> str:
+    """Unique name of a run directory for the CSV outputs of one answer"""
+    return f"run_{uuid.uuid4().hex}"
+
+
+def read_output_file(filepath: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a file written by write_df into a DataFrame, in the format of its extension.
+    Parquet and Feather files are memory-mapped and only the requested columns are decoded;
+    CSV files skip parsing the other columns.
+    
+    Args:
+        filepath: Path to the file
+        columns: Columns to read (all columns if not provided)
+        
+    Returns:
+        DataFrame with the file's dtypes, for Parquet and Feather exactly those written
     """
-    Read a CSV file and return its contents in a format suitable for API responses.
+    output_format = get_output_format(filepath)
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(filepath, columns=columns, memory_map=True).to_pandas()
+    if output_format == "feather":
+        import pyarrow.feather as feather
+
+        return feather.read_table(filepath, columns=columns, memory_map=True).to_pandas()
+    return pd.read_csv(filepath, usecols=columns)
+
+
+def read_output_data(filepath: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Read a file written by write_df and return its contents in a format suitable for API responses.
     
     Args:
-        filepath: Path to the CSV file
+        filepath: Path to the CSV, Parquet or Feather file
+        columns: Columns to return (all columns if not provided)
         
     Returns:
         Dictionary with columns, data, and row_count
     """
     if not os.path.exists(filepath):
-        logger.error(f"CSV file not found: {filepath}")
+        logger.error(f"Output file not found: {filepath}")
         return {"error": f"File not found: {filepath}"}
 
     try:
-        df = pd.read_csv(filepath)
+        return dataframe_to_result(read_output_file(filepath, columns))
+    except Exception as e:
+        logger.error(f"Error reading output file: {str(e)}")
+        return {"error": f"Error reading output file: {str(e)}"}
 
-        # Convert DataFrame to a format suitable for API response
-        columns = df.columns.tolist()
-        data = df.to_dict(orient="records")
 
-        return {
-            "columns": columns,
-            "data": data,
-            "row_count": len(data)
-        }
-    except Exception as e:
-        logger.error(f"Error reading CSV: {str(e)}")
-        return {"error": f"Error reading CSV: {str(e)}"}
+def dataframe_to_result(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Convert a DataFrame to the same format as read_output_data without a file round trip.
+    Dates are rendered as ISO strings, missing values as None and other non-JSON
+    values (e.g. Decimal) as numbers or strings. Duplicate column names are suffixed
+    (".1", ".2") the way pandas reads them back from CSV.
+    
+    Args:
+        df: DataFrame to convert
+        
+    Returns:
+        Dictionary with columns, data, and row_count
+    """
+    columns = unique_columns(df.columns)
+    df = df.set_axis(columns, axis=1)
+    data = json.loads(df.to_json(orient="records", date_format="iso", default_handler=str))
+
+    return {
+        "columns": columns,
+        "data": data,
+        "row_count": len(data)
+    }
+
+
+def unique_columns(columns: Iterable[Any]) -> List[str]:
+    """
+    Column names as strings, with duplicates suffixed (".1", ".2") the way pandas reads them back from CSV
+    
+    Args:
+        columns: Column names of a DataFrame
+        
+    Returns:
+        List of unique column names
+    """
+    unique, seen = [], {}
+    for column in map(str, columns):
+        count = seen.get(column, 0)
+        seen[column] = count + 1
+        unique.append(f"{column}.{count}" if count else column)
+    return unique
+
+
+def dataframe_to_arrow(df: pd.DataFrame) -> "pa.Table":
+    """
+    Convert a DataFrame to an Arrow table for a Parquet artifact.
+    Object columns mixing types that Arrow cannot store in one column
+    (e.g. numbers and strings) are stored as text instead.
+    
+    Args:
+        df: DataFrame to convert
+        
+    Returns:
+        Arrow table with unique column names and no index
+    """
+    import pyarrow as pa
+
+    df = df.set_axis(unique_columns(df.columns), axis=1)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+
+    text_columns = {}
+    for column in df.select_dtypes(include="object").columns:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            text_columns[column] = "string"
+    return pa.Table.from_pandas(df.astype(text_columns), preserve_index=False)
+
+
+def estimate_distinct(column: "pa.ChunkedArray") -> Tuple[int, bool]:
+    """
+    Count the distinct non-null values of a column, estimating it for columns over DISTINCT_EXACT_ROWS.
+    Numbers, dates, booleans and short text are hashed in one pass over their values and the
+    distinct hashes below a threshold are counted (a k-minimum-values sketch, within a few percent);
+    categories are counted exactly from their codes, long text and other types exactly by Arrow.
+    
+    Args:
+        column: Arrow column
+        
+    Returns:
+        The count and whether it is an estimate
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = pc.drop_null(column)
+    if pa.types.is_dictionary(values.type):
+        values = values.unify_dictionaries()
+        return pc.count_distinct(pa.chunked_array([chunk.indices for chunk in values.chunks],
+                                                  type=values.type.index_type)).as_py(), False
+
+    value_type = values.type
+    rows = len(values)
+    # Few distinct values among the first rows suggests a low-cardinality column, which Arrow counts fast
+    if rows <= DISTINCT_EXACT_ROWS or \
+            pc.count_distinct(values.slice(0, DISTINCT_PROBE_ROWS)).as_py() < DISTINCT_SKETCH_SIZE // 16:
+        return pc.count_distinct(values).as_py(), False
+
+    hashable = pa.types.is_integer(value_type) or pa.types.is_floating(value_type) \
+        or pa.types.is_temporal(value_type) or pa.types.is_boolean(value_type) \
+        or ((pa.types.is_string(value_type) or pa.types.is_large_string(value_type) or pa.types.is_binary(value_type)
+             or pa.types.is_large_binary(value_type)) and values.nbytes <= DISTINCT_HASH_MAX_BYTES)
+    if not hashable:
+        return pc.count_distinct(values).as_py(), False
+    # Text is hashed per value rather than per byte, so the cost follows the total size, not the longest value
+    hashes = pd.util.hash_array(np.concatenate([chunk.to_numpy(zero_copy_only=False) for chunk in values.chunks]),
+                                categorize=False)
+
+    fraction = DISTINCT_SKETCH_SIZE / rows
+    while fraction < 1:
+        kept = len(np.unique(hashes[hashes < np.uint64(fraction * 2 ** 64)]))
+        if kept >= DISTINCT_SKETCH_SIZE:
+            return int(kept / fraction), True
+        fraction *= 8
+    # Few distinct values: counting them exactly is as fast
+    return pc.count_distinct(values).as_py(), False
+
+
+def column_statistics(field: "pa.Field", column: "pa.ChunkedArray") -> Dict[str, Any]:
+    """Name, type, null count, minimum, maximum and distinct count of an Arrow column"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    statistics = {"name": field.name, "type": str(field.type), "nulls": column.null_count,
+                  "min": None, "max": None}
+    try:
+        values = column.cast(field.type.value_type) if pa.types.is_dictionary(field.type) else column
+        min_max = pc.min_max(values)
+        for key in ("min", "max"):
+            value = min_max[key].as_py()
+            # Infinite floats are not valid JSON
+            statistics[key] = str(value) if isinstance(value, float) and not math.isfinite(value) else value
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError, pa.ArrowInvalid):
+        # No ordering for the type (e.g. nested values)
+        pass
+
+    try:
+        statistics["distinct"], statistics["distinct_estimated"] = estimate_distinct(column)
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError, pa.ArrowInvalid, TypeError):
+        statistics["distinct"], statistics["distinct_estimated"] = None, False
+    return statistics
+
+
+def json_value(value: Any) -> Any:
+    """Render a statistic that JSON cannot hold (dates, decimals, bytes) as an ISO string or text"""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def build_manifest(table: "pa.Table", preview_rows: int = RESULT_PREVIEW_ROWS) -> Dict[str, Any]:
+    """
+    Summarize a result from its Arrow table with vectorized kernels, without converting it back to rows.
+    
+    Args:
+        table: Arrow table of the result, see dataframe_to_arrow
+        preview_rows: Number of first rows to include
+        
+    Returns:
+        Dictionary with row_count, the Arrow schema, per-column statistics (nulls, min, max, distinct
+        and whether distinct is estimated) and the first rows as preview (columns and data)
+    """
+    preview = dataframe_to_result(table.slice(0, max(0, preview_rows)).to_pandas())
+    manifest = {
+        "row_count": table.num_rows,
+        "schema": [{"name": field.name, "type": str(field.type)} for field in table.schema],
+        "columns": [column_statistics(field, column) for field, column in zip(table.schema, table.columns)],
+        "preview": {"columns": preview["columns"], "data": preview["data"]}
+    }
+    return json.loads(json.dumps(manifest, default=json_value))
+
+
+def write_manifest(manifest: Dict[str, Any], filepath: str) -> None:
+    """Write a manifest as JSON under a temporary name first, so readers never see a partial manifest"""
+    temp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, filepath)
+
+
+def read_manifest(filepath: str) -> Dict[str, Any]:
+    """Read a manifest written by write_manifest; raises FileNotFoundError if there is none"""
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def get_manifest_path(filename: str) -> str:
+    """
+    Get the full path of an artifact's manifest in the manifests directory
+    
+    Args:
+        filename: Artifact filename
+        
+    Returns:
+        Full path to the manifest, which may not have been written yet
+    """
+    return os.path.join(MANIFESTS_DIR, f"{os.path.splitext(os.path.basename(filename))[0]}.json")
+
+
+def get_artifact_manifest(filename: str) -> Dict[str, Any]:
+    """
+    Get the manifest of a result artifact. Artifacts written before manifests existed are
+    summarized once from the artifact and their manifest is stored.
+    
+    Args:
+        filename: Artifact filename
+        
+    Returns:
+        The manifest, see build_manifest
+        
+    Raises:
+        FileNotFoundError: If neither the manifest nor the artifact exists
+    """
+    manifest_path = get_manifest_path(filename)
+    try:
+        return read_manifest(manifest_path)
+    except FileNotFoundError:
+        pass
+
+    import pyarrow.parquet as pq
+
+    manifest = build_manifest(pq.read_table(get_artifact_path(filename), memory_map=True))
+    write_manifest(manifest, manifest_path)
+    return manifest
+
+
+def get_artifact_path(filename: str) -> str:
+    """
+    Get the full path for a result artifact in the artifacts directory
+    
+    Args:
+        filename: The artifact filename
+        
+    Returns:
+        Full path to the file
+    """
+    return os.path.join(ARTIFACTS_DIR, os.path.basename(filename))
+
+
+def file_sha256(filepath: str) -> str:
+    """Hex SHA-256 digest of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_result_artifact(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Write a DataFrame to a compressed Parquet artifact in the artifacts directory.
+    Artifacts are named by the SHA-256 of their content: the file is written under a temporary
+    name and renamed to "<sha256>.parquet", or dropped when an identical artifact already exists,
+    so identical results are stored once and readers never see a partial artifact. The manifest
+    of a new artifact is written before it is renamed into place.
+    
+    Args:
+        df: DataFrame to write
+        
+    Returns:
+        Dictionary with the file name, format, compression, size in bytes, content hash,
+        whether an existing artifact was reused, the Arrow schema as a list of column
+        names and types, and the artifact's manifest
+    """
+    import pyarrow.parquet as pq
+
+    table = dataframe_to_arrow(df)
+    temp_path = get_artifact_path(f"write.{os.getpid()}.{threading.get_ident()}.{uuid.uuid4().hex}.tmp")
+
+    # Small row groups let a page of rows be read without decoding the whole file
+    pq.write_table(table, temp_path, compression=RESULT_ARTIFACT_COMPRESSION,
+                   row_group_size=max(1, RESULT_ARTIFACT_ROW_GROUP_SIZE))
+    sha256 = file_sha256(temp_path)
+    filepath = get_artifact_path(f"{sha256}.parquet")
+
+    manifest_path = get_manifest_path(filepath)
+    deduplicated = os.path.exists(filepath)
+    manifest = None
+    if deduplicated:
+        os.remove(temp_path)
+        try:
+            # A reused artifact counts as new for the retention grace period through its manifest,
+            # leaving the artifact's mtime to tell whether its exports are up to date
+            os.utime(manifest_path)
+            manifest = read_manifest(manifest_path)
+        except FileNotFoundError:
+            pass
+        logger.info(f"Result artifact with {table.num_rows} rows already stored as {filepath}")
+    if manifest is None:
+        manifest = build_manifest(table)
+        write_manifest(manifest, manifest_path)
+    if not deduplicated:
+        os.replace(temp_path, filepath)
+        logger.info(f"Wrote result artifact with {table.num_rows} rows to {filepath}")
+
+    return {
+        "file": os.path.basename(filepath),
+        "format": "parquet",
+        "compression": RESULT_ARTIFACT_COMPRESSION,
+        "size_bytes": os.path.getsize(filepath),
+        "sha256": sha256,
+        "deduplicated": deduplicated,
+        "schema": [{"name": field.name, "type": str(field.type)} for field in table.schema],
+        "manifest": manifest
+    }
+
+
+def parse_sort(sort: Optional[str]) -> List[Tuple[str, str]]:
+    """
+    Parse a sort specification such as "region,-total" into Arrow sort keys.
+    A leading "-" sorts the column in descending order.
+    
+    Args:
+        sort: Comma-separated column names, or None
+        
+    Returns:
+        List of (column, "ascending" | "descending") tuples
+    """
+    sort_keys = []
+    for name in (sort or "").split(","):
+        name = name.strip()
+        if name.startswith("-"):
+            sort_keys.append((name[1:], "descending"))
+        elif name:
+            sort_keys.append((name.lstrip("+"), "ascending"))
+    return sort_keys
+
+
+def get_sort_indices(filepath: str, parquet_file: Any, sort_keys: List[Tuple[str, str]]) -> Any:
+    """
+    Row numbers of an artifact in sorted order, computed from the sort columns only.
+    The most recently used orderings are cached, so paging through a sorted result
+    sorts it once.
+    
+    Args:
+        filepath: Path to the artifact
+        parquet_file: The artifact opened as a pyarrow ParquetFile
+        sort_keys: Arrow sort keys, see parse_sort
+        
+    Returns:
+        Arrow array of row numbers
+    """
+    import pyarrow.compute as pc
+
+    key = (filepath, os.path.getmtime(filepath), tuple(sort_keys))
+    with _sort_indices_lock:
+        if key in _sort_indices:
+            _sort_indices.move_to_end(key)
+            return _sort_indices[key]
+
+    table = parquet_file.read(columns=list(dict.fromkeys(name for name, _ in sort_keys)))
+    indices = pc.sort_indices(table, sort_keys=sort_keys, null_placement="at_end")
+
+    with _sort_indices_lock:
+        _sort_indices[key] = indices
+        while len(_sort_indices) > max(0, RESULT_SORT_CACHE_SIZE):
+            _sort_indices.popitem(last=False)
+    return indices
+
+
+def read_artifact_rows(filename: str, offset: int = 0, limit: int = 100, columns: Optional[List[str]] = None,
+                       sort: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read a slice of rows from a result artifact, optionally sorted and projected.
+    The artifact is memory-mapped and only the requested columns of the row groups
+    holding the slice are decoded; sorting reads the sort columns alone.
+    
+    Args:
+        filename: Artifact filename
+        offset: Index of the first row
+        limit: Maximum number of rows
+        columns: Columns to return (all columns if not provided)
+        sort: Sort specification, see parse_sort
+        
+    Returns:
+        Dictionary with columns, data (the rows of the slice), and row_count (of the whole artifact)
+        
+    Raises:
+        ValueError: If a requested or sort column does not exist
+    """
+    import numpy as np
+    import pyarrow.parquet as pq
+
+    filepath = get_artifact_path(filename)
+    parquet_file = pq.ParquetFile(filepath, memory_map=True)
+    metadata = parquet_file.metadata
+    row_count = metadata.num_rows
+
+    available = parquet_file.schema_arrow.names
+    sort_keys = parse_sort(sort)
+    for name in list(columns or []) + [name for name, _ in sort_keys]:
+        if name not in available:
+            raise ValueError(f"Unknown column '{name}'")
+    columns = list(dict.fromkeys(columns)) if columns else available
+
+    # Row numbers of the slice, in the order they are returned
+    end = min(row_count, offset + limit)
+    if sort_keys:
+        rows = get_sort_indices(filepath, parquet_file, sort_keys).slice(offset, max(0, end - offset)).to_numpy()
+    else:
+        rows = np.arange(offset, max(offset, end))
+
+    # Read only the row groups holding those rows and pick the rows from them
+    group_starts = np.cumsum([0] + [metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)])
+    groups = np.searchsorted(group_starts, rows, side="right") - 1
+    needed = sorted(set(groups.tolist()))
+    table = parquet_file.read_row_groups(needed, columns=columns)
+
+    read_starts = dict(zip(needed, np.cumsum([0] + [metadata.row_group(index).num_rows for index in needed])))
+    positions = np.array([read_starts[group] + row - group_starts[group] for row, group in zip(rows, groups)],
+                         dtype=np.int64)
+    table = table.take(positions)
+
+    result = dataframe_to_result(table.to_pandas())
+    result["row_count"] = row_count
+    return result
+
+
+def get_export_path(filename: str, export_format: str) -> str:
+    """
+    Get the full path of an artifact's export in the exports directory
+    
+    Args:
+        filename: Artifact filename
+        export_format: Export format, e.g. "csv"
+        
+    Returns:
+        Full path to the export, which may not have been written yet
+    """
+    return os.path.join(EXPORTS_DIR, f"{os.path.splitext(os.path.basename(filename))[0]}.{export_format}")
+
+
+def get_result_export(filename: str, export_format: str) -> str:
+    """
+    Get the path of a result artifact in a download format, writing the export on first use.
+    Parquet is the artifact itself; CSV and JSON Lines exports are written next to it
+    batch by batch, so memory use does not grow with the result size.
+    
+    Args:
+        filename: Artifact filename
+        export_format: One of EXPORT_FORMATS
+        
+    Returns:
+        Full path to the file in the requested format
+        
+    Raises:
+        ValueError: If the format is not supported
+        FileNotFoundError: If the artifact does not exist
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{export_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+    artifact_path = get_artifact_path(filename)
+    if not os.path.exists(artifact_path):
+        raise FileNotFoundError(artifact_path)
+    if export_format == "parquet":
+        return artifact_path
+
+    export_path = get_export_path(filename, export_format)
+    if os.path.exists(export_path) and os.path.getmtime(export_path) >= os.path.getmtime(artifact_path):
+        return export_path
+
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(artifact_path, memory_map=True)
+    temp_path = f"{export_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    logger.info(f"Writing {export_format} export of {parquet_file.metadata.num_rows} rows to {export_path}")
+
+    with open(temp_path, "w", newline="") as f:
+        if export_format == "csv" and parquet_file.metadata.num_rows == 0:
+            pd.DataFrame(columns=parquet_file.schema_arrow.names).to_csv(f, index=False)
+        for index, batch in enumerate(parquet_file.iter_batches(batch_size=max(1, RESULT_ARTIFACT_ROW_GROUP_SIZE))):
+            df = batch.to_pandas()
+            if export_format == "csv":
+                df.to_csv(f, index=False, header=index == 0)
+            else:
+                lines = df.to_json(orient="records", lines=True, date_format="iso", default_handler=str)
+                f.write(lines if not lines or lines.endswith("\n") else lines + "\n")
+    os.replace(temp_path, export_path)
+
+    return export_path
+
+
+def get_output_format(filename: str) -> str:
+    """
+    Format a write_df output is written in: that of a .parquet or .feather name, otherwise
+    RESULT_OUTPUT_FORMAT (CSV when the setting is not a supported format)
+    """
+    output_format = OUTPUT_FORMATS.get(os.path.splitext(filename)[1].lower())
+    if output_format in ("parquet", "feather"):
+        return output_format
+    return RESULT_OUTPUT_FORMAT if RESULT_OUTPUT_FORMAT in OUTPUT_FORMATS.values() else "csv"
 
 
-def get_csv_path(filename: str) -> str:
+def get_output_path(filename: str, namespace: Optional[str] = None) -> str:
     """
-    Get the full path for a CSV file in the outputs directory
+    Get the full path for a write_df output in the outputs directory
     
     Args:
-        filename: The CSV filename
+        filename: The output filename; its extension is replaced by that of the format written
+        namespace: Run directory the file was written to (the outputs directory itself if not provided)
         
     Returns:
         Full path to the file
     """
-    # Ensure filename has .csv extension
-    if not filename.endswith('.csv'):
-        filename += '.csv'
+    # Names chosen by generated code must not leave the run directory
+    filename = os.path.basename(filename)
+    stem, extension = os.path.splitext(filename)
+    if extension.lower() not in OUTPUT_FORMATS:
+        stem = filename
 
-    return os.path.join(CSV_DIR, filename)
+    directory = os.path.join(CSV_DIR, os.path.basename(namespace)) if namespace else CSV_DIR
+    return os.path.join(directory, f"{stem}.{get_output_format(filename)}")
@@ -46,6 +46,8 @@ if src_dir not in sys.path:
         # Set up environment variables
         env = os.environ.copy()
         env["PYTHONPATH"] = src_dir + ":" + env.get("PYTHONPATH", "")
+        # Same marker the code executor sets (src.core.config.EXECUTOR_PROCESS_ENV)
+        env["AGSTACK_EXECUTOR_PROCESS"] = "1"
         
         # Execute the code in a subprocess
         logger.info("Executing generated code...")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Literal
 
 from pydantic import BaseModel
 
@@ -13,12 +13,15 @@ class ChatMessageBase(BaseModel):
 class ChatMessageSend(ChatMessageBase):
     """Simplified schema for sending messages (frontend to backend)"""
     # Only requires content and role, chat_id comes from URL path
+    # Optional answer pipeline override ("auto", "sql" or "python"), defaults to PIPELINE_MODE
+    pipeline_mode: Optional[Literal["auto", "sql", "python"]] = None
 
 
 class ChatMessageCreate(ChatMessageBase):
     """Schema for creating a new chat message (internal use)"""
     chat_id: int
     connection_ids: List[int]
+    pipeline_mode: Optional[Literal["auto", "sql", "python"]] = None
 
 
 class ChatMessageResponse(ChatMessageBase):
@@ -30,6 +33,9 @@ class ChatMessageResponse(ChatMessageBase):
     status: str
     generated_code: Optional[str] = None
     result_content: Optional[Dict[str, Any]] = None
+    from_cache: Optional[bool] = False
+    stage_timings: Optional[Dict[str, Any]] = None
+    token_usage: Optional[Dict[str, Any]] = None
     agentops_session_url: Optional[str] = None
 
     class Config:
@@ -21,11 +21,19 @@ class DatabaseConnectionCreate(DatabaseConnectionBase):
 class DatabaseConnectionResponse(DatabaseConnectionBase):
     """Schema for API responses with connection information (no password)"""
     id: Optional[int] = None
+    question_cache_enabled: Optional[bool] = True
+    question_cache_ttl_seconds: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class QuestionCacheSettings(BaseModel):
+    """Schema for updating a connection's question cache controls"""
+    enabled: bool = True
+    ttl_seconds: Optional[int] = None
+
+
 class ConnectionResultResponse(BaseModel):
     """Standard response format for connection operations"""
     success: bool
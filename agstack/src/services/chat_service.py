@@ -1,27 +1,87 @@
 import json
 import logging
-from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
-
-import agentops
-from sqlalchemy import func, asc
-from sqlalchemy.orm import Session
-
-from src.crew import AgstackCrew
-from src.models.chat import Chat
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Callable, Optional, Tuple, Type, TYPE_CHECKING
+
+import pandas as pd
+from sqlalchemy import and_, asc, desc, or_, select
+from sqlalchemy.orm import Session, selectinload
+
+from src.core.config import CHAT_MAX_PARALLEL_CONNECTIONS, PIPELINE_MODE, RESULT_PREVIEW_ROWS, SQL_CANDIDATES
+from src.models.chat import Chat, chat_connections
 from src.models.chat_message import ChatMessage
 from src.models.database_connection import DatabaseConnection
-from src.modules.file_utils import read_csv_data, get_csv_path
+from src.modules.db_utils import execute_query, explain_query
+from src.modules.file_utils import (
+    build_manifest, dataframe_to_arrow, dataframe_to_result, get_artifact_manifest, get_output_format, get_output_path,
+    new_result_namespace, parse_sort, read_artifact_rows, read_output_file, write_df, write_result_artifact
+)
 from src.schemas.chat import ChatCreate
 from src.schemas.chat_message import ChatMessageCreate
 from src.services.db_utils import (
-    add_and_refresh, commit_changes, get_chat_by_id, update_message_status, update_message_with_result
+    add_and_refresh, allocate_message_indexes, commit_changes, get_chat_by_id, rollback_changes, touch_chat,
+    track_commits
+)
+from src.services.question_cache_service import QuestionCacheService
+from src.services.schema_cache_service import SchemaCacheService
+from src.services.table_retrieval_service import TableRetrievalService
+from src.tools import execute_code_tool
+from src.utils.pagination import decode_cursor, encode_cursor
+from src.utils.schema_formatter import serialize_schema
+from src.utils.sql_validator import validate_select_sql
+from src.utils.stage_timer import StageTimer
+
+if TYPE_CHECKING:
+    from src.crew import AgstackCrew
+
+# Questions that need pandas post-processing beyond what a single SQL query returns;
+# in "auto" mode they go through the Python pipeline
+POST_PROCESSING_PATTERN = re.compile(
+    r"\b(pivot|correlat|regression|forecast|predict|moving average|rolling|resampl|interpolat|plot|chart|"
+    r"graph|visuali[sz]|histogram|cluster|outlier|anomal|z-?score|seasonal|python|pandas)",
+    re.IGNORECASE
 )
 
 
+# AgentOps is initialized with the first crew run rather than when the API starts
+_agentops_lock = threading.Lock()
+_agentops_initialized = False
+
+
+def start_agentops_session(tags: List[str]):
+    """
+    Start an AgentOps session for a crew run, initializing AgentOps on first use.
+
+    Returns:
+        The session, or None when AgentOps has no API key (e.g. offline replay runs)
+    """
+    global _agentops_initialized
+    import agentops
+
+    with _agentops_lock:
+        if not _agentops_initialized:
+            agentops.init(auto_start_session=False)
+            _agentops_initialized = True
+    return agentops.start_session(tags=tags)
+
+
+def load_crew_class() -> Type["AgstackCrew"]:
+    """Import the crew on first use; crewai and litellm take seconds to import"""
+    from src.crew import AgstackCrew
+    return AgstackCrew
+
+
 class ChatService:
     def __init__(self):
-        pass
+        self.question_cache_service = QuestionCacheService()
+        self.schema_cache_service = SchemaCacheService()
+        self.table_retrieval_service = TableRetrievalService()
+        self.sql_candidates = SQL_CANDIDATES
 
     def get_chat(self, db: Session, chat_id: int) -> Optional[Chat]:
         """Get a chat by ID"""
@@ -29,11 +89,7 @@ class ChatService:
 
     def get_chat_with_connections(self, db: Session, chat_id: int) -> Optional[Chat]:
         """Get a chat by ID with its connections populated"""
-        chat = db.query(Chat).filter(Chat.id == chat_id).first()
-        if chat:
-            # Ensure connections are loaded
-            _ = chat.connections
-        return chat
+        return db.query(Chat).options(selectinload(Chat.connections)).filter(Chat.id == chat_id).first()
 
     def get_all_chats(self, db: Session) -> List[Chat]:
         """Get all chats"""
@@ -41,11 +97,41 @@ class ChatService:
 
     def get_all_chats_with_connections(self, db: Session) -> List[Chat]:
         """Get all chats with their connections"""
-        chats = db.query(Chat).order_by(Chat.updated_at.desc()).all()
-        # Ensure connections are loaded for each chat
-        for chat in chats:
-            _ = chat.connections
-        return chats
+        # Connections of all chats are loaded in one extra query instead of one per chat
+        return db.query(Chat).options(selectinload(Chat.connections)).order_by(Chat.updated_at.desc()).all()
+
+    def list_chats(self, db: Session, limit: int, cursor: Optional[str] = None,
+                   connection_ids: Optional[List[int]] = None) -> Tuple[List[Chat], Optional[str]]:
+        """
+        Get a page of chats with their connections, most recently updated first.
+
+        Pages are addressed by a keyset cursor on (updated_at, id) rather than an offset, so
+        every page costs the same two queries (chats, then their connections) however deep it
+        is. With connection_ids only chats using any of those connections are listed.
+        Returns the chats and the cursor of the next page (None on the last page).
+        Raises ValueError for a malformed cursor.
+        """
+        query = db.query(Chat).options(selectinload(Chat.connections))
+
+        if connection_ids:
+            query = query.filter(Chat.id.in_(
+                select(chat_connections.c.chat_id).where(chat_connections.c.connection_id.in_(connection_ids))
+            ))
+
+        if cursor:
+            updated_at, chat_id = decode_cursor(cursor)
+            query = query.filter(or_(
+                Chat.updated_at < updated_at,
+                and_(Chat.updated_at == updated_at, Chat.id < chat_id)
+            ))
+
+        # One extra row tells whether there is a next page without a COUNT query
+        chats = query.order_by(desc(Chat.updated_at), desc(Chat.id)).limit(limit + 1).all()
+        if len(chats) <= limit:
+            return chats, None
+
+        chats = chats[:limit]
+        return chats, encode_cursor(chats[-1].updated_at, chats[-1].id)
 
     def create_chat(self, db: Session, chat_data: ChatCreate) -> Chat:
         """Create a new chat"""
@@ -66,22 +152,26 @@ class ChatService:
 
     def create_message(self, db: Session, message_data: ChatMessageCreate) -> ChatMessage:
         """Create a new chat message"""
-        # Get current max message index for this chat
-        max_index = db.query(
-            func.max(ChatMessage.message_index)
-        ).filter(
-            ChatMessage.chat_id == message_data.chat_id
-        ).scalar() or -1
-
-        # Create new message with incremented index
+        message_index = self.allocate_message_indexes(db, message_data.chat_id)
+
+        # Create new message with the reserved index
         message = ChatMessage(
             chat_id=message_data.chat_id,
             content=message_data.content,
             role=message_data.role,
             status="pending",
-            message_index=max_index + 1
+            message_index=message_index
         )
-        return add_and_refresh(db, message)
+        db.add(message)
+        commit_changes(db)
+        return message
+
+    def allocate_message_indexes(self, db: Session, chat_id: int, count: int = 1) -> int:
+        """Reserve count consecutive message indexes of a chat, returning the first one"""
+        message_index = allocate_message_indexes(db, chat_id, count)
+        if message_index is None:
+            raise ValueError(f"Chat with ID {chat_id} not found")
+        return message_index
 
     def get_chat_messages(self, db: Session, chat_id: int) -> List[ChatMessage]:
         """Get all messages for a chat in order"""
@@ -89,156 +179,347 @@ class ChatService:
             ChatMessage.chat_id == chat_id
         ).order_by(asc(ChatMessage.message_index)).all()
 
+    def submit_message(self, db: Session, message_data: ChatMessageCreate,
+                       worker_id: Optional[str] = None) -> Tuple[ChatMessage, ChatMessage]:
+        """
+        Persist the user message and its pending assistant reply in one transaction, owned by
+        worker_id when a background worker will answer them (see fail_interrupted_messages)
+        """
+        # Both indexes are reserved at once so the reply always directly follows the question
+        message_index = self.allocate_message_indexes(db, message_data.chat_id, 2)
+        heartbeat_at = datetime.utcnow() if worker_id else None
+
+        user_message = ChatMessage(
+            chat_id=message_data.chat_id,
+            content=message_data.content,
+            role=message_data.role,
+            status="pending",
+            message_index=message_index,
+            worker_id=worker_id,
+            heartbeat_at=heartbeat_at
+        )
+
+        # Create assistant's response message
+        assistant_message = ChatMessage(
+            chat_id=message_data.chat_id,
+            content="",  # Will be populated after processing
+            role="assistant",
+            status="pending",
+            message_index=message_index + 1,
+            worker_id=worker_id,
+            heartbeat_at=heartbeat_at
+        )
+        db.add_all([user_message, assistant_message])
+        commit_changes(db)
+        return user_message, assistant_message
+
     def process_message(self, db: Session, message_data: ChatMessageCreate) -> ChatMessage:
         """
         Process a chat message from start to finish synchronously.
         
-        1. Create message record
-        2. Get metadata for connections
-        3. Process with AI
-        4. Update with results
-        5. Return final message
+        1. Create message records
+        2. Answer the message, see answer_message
+        3. Return final message
+
+        The API answers messages in the background through MessageQueueService instead.
+        """
+        stage_timer = StageTimer()
+        user_message, assistant_message = self.submit_message(db, message_data)
+        return self.answer_message(db, message_data, user_message, assistant_message, stage_timer)
+
+    def answer_message(self, db: Session, message_data: ChatMessageCreate, user_message: ChatMessage,
+                       assistant_message: ChatMessage, stage_timer: Optional[StageTimer] = None) -> ChatMessage:
+        """
+        Answer a submitted message.
+
+        1. Get metadata for connections
+        2. Process with AI
+        3. Update with results
+        4. Return the assistant message
+
+        Stage timings and per-agent token usage are stored on the assistant message.
+        Each connection is answered through the SQL or the Python pipeline, see choose_pipeline.
+
+        Bookkeeping takes two short transactions on the message objects passed in: one marks
+        the messages as processing before the crews run, the other stores the answer, the
+        question cache changes and the chat's updated_at together.
         """
-        # Create the user message
-        user_message = self.create_message(db, message_data)
+        stage_timer = stage_timer or StageTimer()
+        stop_tracking_commits = track_commits(db, stage_timer)
 
         try:
-            # Update status to processing
-            update_message_status(db, user_message.id, "processing")
-
-            # Create assistant's response message
-            assistant_message = ChatMessage(
-                chat_id=message_data.chat_id,
-                content="",  # Will be populated after processing
-                role="assistant",
-                status="processing",
-                message_index=user_message.message_index + 1
-            )
-            assistant_message = add_and_refresh(db, assistant_message)
+            # Update status to processing, committed with the reads below before the crews run
+            user_message.status = "processing"
+            assistant_message.status = "processing"
+            stage_timer.emit("status", status="processing")
 
             # Get metadata for connections
-            available_tables = self.get_connection_metadata(db, message_data.connection_ids)
+            with stage_timer.stage("metadata_load"):
+                available_tables = self.get_connection_metadata(db, message_data.connection_ids)
 
-            # Use the first connection for now (can be enhanced to handle multiple)
-            connection_name = None
-            if available_tables:
-                connection_name = list(available_tables.keys())[0]
+            # Infer which connections can answer the question from their tables
+            with stage_timer.stage("table_retrieval"):
+                connection_names = self.table_retrieval_service.select_connections(message_data.content,
+                                                                                   available_tables)
+            stage_timer.emit("connections_selected", connections=connection_names)
 
-            if not connection_name:
+            if not connection_names:
                 # No valid connection or tables
-                update_message_with_result(db=db, message_id=assistant_message.id, status="failed",
-                                           result_content={"error": "No valid connection or tables found"})
+                assistant_message.status = "failed"
+                assistant_message.result_content = {"error": "No valid connection or tables found"}
                 return assistant_message
 
-            # Run the crew with the metadata
-            csv_file_name, generated_code = self.run_crew_with_metadata(
-                user_question=message_data.content,
-                connection_name=connection_name,
-                available_tables=available_tables[connection_name]
-            )
+            # Look up code generated for the same question earlier; the session stays on this thread
+            cache_entries = {}
+            with stage_timer.stage("cache_lookup"):
+                for connection_name in connection_names:
+                    cache_entry = self.question_cache_service.lookup(db, connection_name, message_data.content)
+                    if cache_entry:
+                        cache_entries[connection_name] = cache_entry
+            cached_code = {
+                connection_name: (entry.generated_code, entry.csv_file_name, entry.pipeline)
+                for connection_name, entry in cache_entries.items()
+            }
+
+            # End the transaction so it is not left open while the crews run
+            commit_changes(db)
 
-            # Process results
-            if csv_file_name and generated_code:
-                # Parse CSV content
-                csv_content = self.parse_csv_result(csv_file_name)
+            # Generate and execute code for every connection concurrently
+            pipeline = self.choose_pipeline(message_data.content, message_data.pipeline_mode)
+            answers = self.answer_connections(message_data.content, connection_names, available_tables, cached_code,
+                                              stage_timer=stage_timer, pipeline=pipeline)
+
+            # Process results; question cache changes are committed with the answer
+            results = {}
+            for connection_name in connection_names:
+                answer = answers[connection_name]
+
+                cache_entry = cache_entries.get(connection_name)
+                if cache_entry and answer["from_cache"]:
+                    self.question_cache_service.record_hit(db, cache_entry, commit=False)
+                elif cache_entry:
+                    self.question_cache_service.evict(db, cache_entry, commit=False)
+
+                if not (answer["csv_file_name"] and answer["generated_code"]):
+                    results[connection_name] = {"error": answer.get("error") or "Crew execution failed"}
+                    continue
+
+                if answer.get("frame") is not None:
+                    # The SQL pipeline already holds the rows in memory
+                    results[connection_name] = self.frame_result(answer["frame"])
+                else:
+                    # Read the output file written by the generated code
+                    with stage_timer.stage("csv_read", connection=connection_name,
+                                           format=get_output_format(answer["csv_file_name"])):
+                        results[connection_name] = self.parse_output_result(answer["csv_file_name"],
+                                                                            answer.get("result_namespace"))
+                stage_timer.emit("rows_fetched", connection=connection_name,
+                                 row_count=results[connection_name].get("row_count", 0))
+
+                if not answer["from_cache"] and "error" not in results[connection_name]:
+                    self.question_cache_service.store(db, connection_name, message_data.content,
+                                                      answer["generated_code"], answer["csv_file_name"],
+                                                      message_id=assistant_message.id, commit=False,
+                                                      pipeline=answer["pipeline"])
+
+            successful = [name for name in connection_names if "error" not in results[name]]
+            if successful:
+                frame, connections = self.merge_results(connection_names, results)
+                with stage_timer.stage("artifact_write"):
+                    result_content, result_artifact = self.store_result(frame, connections)
+                generated_code = self.merge_generated_code(
+                    {name: answers[name]["generated_code"] for name in successful}
+                )
+                from_cache = all(answers[name]["from_cache"] for name in successful)
 
                 # Set the assistant message content
                 assistant_message.content = (
                     f"I've analyzed your query and here's what I found:\n\n"
-                    f"The query returned {csv_content.get('row_count', 0)} results."
+                    f"The query returned {result_content.get('row_count', 0)} results."
                 )
+                if len(connection_names) > 1:
+                    assistant_message.content += (
+                        f" ({len(successful)} of {len(connection_names)} connections answered.)"
+                    )
+                if from_cache:
+                    assistant_message.content += (
+                        "\n\n(Answered by re-running the query generated for a previous question.)"
+                    )
+                assistant_message.from_cache = from_cache
 
                 # Update message with results
-                update_message_with_result(db=db, message_id=assistant_message.id, status="completed",
-                                           generated_code=generated_code, result_content=csv_content)
+                assistant_message.status = "completed"
+                assistant_message.generated_code = generated_code
+                assistant_message.result_content = result_content
+                assistant_message.result_artifact = result_artifact
             else:
                 # Failed execution
                 error_message = "I couldn't process your query. Please try rephrasing or check the database connection."
                 assistant_message.content = error_message
-
-                update_message_with_result(db=db, message_id=assistant_message.id, status="failed",
-                                           result_content={"error": "Crew execution failed", "details": error_message})
+                assistant_message.status = "failed"
+                assistant_message.result_content = {"error": "Crew execution failed", "details": error_message,
+                                                    "connections": results}
 
             # Update the user message status to completed
-            update_message_status(db, user_message.id, "completed")
+            user_message.status = "completed"
 
-            # Update chat's updated_at timestamp
-            chat = get_chat_by_id(db, message_data.chat_id)
-            if chat:
-                chat.updated_at = datetime.utcnow()
-                commit_changes(db)
+            # Update chat's updated_at timestamp without loading the chat
+            touch_chat(db, message_data.chat_id)
 
             # Return the assistant message
             return assistant_message
 
         except Exception as e:
-            # If anything fails, update the assistant message and return it
-            if 'assistant_message' in locals():
-                error_message = f"An error occurred: {str(e)}"
-                assistant_message.content = error_message
-
-                update_message_with_result(db=db, message_id=assistant_message.id, status="failed",
-                                           result_content={"error": f"Error processing message: {str(e)}"})
-                return assistant_message
-            else:
-                # If assistant message wasn't created yet, update user message and return it
-                update_message_status(db, user_message.id, "failed")
-
-                return user_message
+            # If anything fails, update the messages and return the assistant message
+            rollback_changes(db)
+            error_message = f"An error occurred: {str(e)}"
+            assistant_message.content = error_message
+
+            user_message.status = "failed"
+            assistant_message.status = "failed"
+            assistant_message.result_content = {"error": f"Error processing message: {str(e)}"}
+            return assistant_message
         finally:
+            assistant_message.stage_timings = stage_timer.timings()
+            assistant_message.token_usage = stage_timer.token_usage()
+
             # Commit the changes to the database
             commit_changes(db)
+            stop_tracking_commits()
+
+    def get_message_rows(self, message: ChatMessage, offset: int, limit: int, columns: Optional[List[str]] = None,
+                         sort: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a slice of a message's result rows from its artifact, optionally sorted and projected.
+        Messages answered before results were stored as artifacts are sliced from their inline rows.
+        Raises ValueError for unknown columns.
+        """
+        if message.result_artifact:
+            result = read_artifact_rows(message.result_artifact, offset, limit, columns=columns, sort=sort)
+        else:
+            result_content = message.result_content or {}
+            frame = pd.DataFrame(result_content.get("data") or [], columns=result_content.get("columns") or None)
+            sort_keys = parse_sort(sort)
+            for name in list(columns or []) + [name for name, _ in sort_keys]:
+                if name not in frame.columns:
+                    raise ValueError(f"Unknown column '{name}'")
+            if sort_keys:
+                frame = frame.sort_values([name for name, _ in sort_keys],
+                                          ascending=[order == "ascending" for _, order in sort_keys],
+                                          na_position="last", kind="stable")
+            if columns:
+                frame = frame[list(dict.fromkeys(columns))]
+            result = dataframe_to_result(frame.iloc[offset:offset + limit])
+            result["row_count"] = len(frame)
+
+        result["offset"] = offset
+        return result
+
+    def get_message_summary(self, message: ChatMessage) -> Dict[str, Any]:
+        """
+        Get the row count, schema, column statistics and preview of a message's result from the
+        manifest written with its artifact, without reading the rows. Messages answered before
+        results were stored as artifacts are summarized from their inline rows.
+        Raises FileNotFoundError when the full result is no longer available (e.g. compacted).
+        """
+        if message.result_artifact:
+            return get_artifact_manifest(message.result_artifact)
+
+        result_content = message.result_content or {}
+        if "data" not in result_content or result_content.get("compacted"):
+            raise FileNotFoundError(f"Message {message.id} has no stored result")
+        frame = pd.DataFrame(result_content["data"], columns=result_content.get("columns") or None)
+        return build_manifest(dataframe_to_arrow(frame))
+
+    def heartbeat_messages(self, db: Session, worker_id: str) -> int:
+        """Report the pending and processing messages of a worker alive; returns how many there are"""
+        updated = db.query(ChatMessage).filter(
+            ChatMessage.worker_id == worker_id,
+            ChatMessage.status.in_(["pending", "processing"])
+        ).update({ChatMessage.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+        commit_changes(db)
+        return updated
+
+    def fail_interrupted_messages(self, db: Session, stale_seconds: float, worker_id: Optional[str] = None) -> int:
+        """
+        Mark messages whose server process stopped answering them as failed.
+
+        Queued messages live in the worker pool of the process that accepted them, which refreshes
+        their heartbeat while it is running. Pending or processing messages of other workers whose
+        heartbeat is older than stale_seconds will never be answered. Messages without a worker
+        (answered synchronously, see process_message) are left alone. Returns how many messages
+        were marked.
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        query = db.query(ChatMessage).filter(
+            ChatMessage.status.in_(["pending", "processing"]),
+            ChatMessage.worker_id.isnot(None),
+            ChatMessage.heartbeat_at < stale_before
+        )
+        if worker_id:
+            query = query.filter(ChatMessage.worker_id != worker_id)
+        messages = query.all()
+        for message in messages:
+            message.status = "failed"
+            if message.role == "assistant":
+                message.content = "The server restarted before this message was answered. Please send it again."
+                message.result_content = {"error": "Interrupted by a server restart"}
+        commit_changes(db)
+        return len(messages)
 
     def get_connection_metadata(self, db: Session, connection_ids: List[int]) -> Dict[str, Dict[str, Any]]:
-        """Get metadata for connections"""
-        connections = db.query(DatabaseConnection).filter(
-            DatabaseConnection.id.in_(connection_ids)
-        ).all()
-
-        metadata = {}
-
-        for connection in connections:
-            # Get tables for this connection
-            table_metadata = {}
-            for table in connection.table_details:
-                columns_metadata = []
-                for column in table.columns:
-                    # Parse sample values from JSON string
-                    sample_values = json.loads(column.sample_values) if column.sample_values else []
-
-                    columns_metadata.append({
-                        "column_name": column.column_name,
-                        "data_type": column.data_type,
-                        "sample_values": sample_values
-                    })
-
-                table_metadata[table.table_name] = {
-                    "columns": columns_metadata,
-                    "schema_name": connection.schema_name,
-                }
-
-            metadata[connection.connection_name] = table_metadata
-
-        return metadata
-
-    def run_crew_with_metadata(self, user_question: str, connection_name: str, available_tables: Dict[str, Any]) -> \
-            Tuple[str, str]:
-        """Run the AgstackCrew with the provided metadata"""
+        """Get metadata for connections from their precomputed schema payloads"""
+        return self.schema_cache_service.get_connection_metadata(db, connection_ids)
+
+    def choose_pipeline(self, user_question: str, pipeline_mode: Optional[str] = None) -> str:
+        """
+        Choose how a question is answered: "sql" or "python".
+
+        The SQL pipeline asks the agent for a single query and runs it in-process, skipping code
+        generation, the subprocess and the CSV round trip. In "auto" mode the Python pipeline is
+        only used for questions that need pandas post-processing.
+        """
+        mode = (pipeline_mode or PIPELINE_MODE or "auto").lower()
+        if mode in ("sql", "python"):
+            return mode
+        return "python" if POST_PROCESSING_PATTERN.search(user_question) else "sql"
+
+    def crew_inputs(self, user_question: str, connection_name: str, available_tables: Dict[str, Any]) -> Dict[str, str]:
+        """Build the crew inputs, serializing the schema compactly within the prompt token budget"""
+        schema_prompt, schema_tokens = serialize_schema(available_tables)
+        logging.info(f"Schema prompt for connection '{connection_name}': {schema_tokens} tokens, "
+                     f"{len(available_tables)} tables")
+
+        # Convert complex types to strings for interpolation
+        return {
+            "user_question": user_question,
+            "connection_name": connection_name,
+            "available_tables_json": schema_prompt
+        }
+
+    def run_crew_with_metadata(self, user_question: str, connection_name: str, available_tables: Dict[str, Any],
+                               stage_timer: Optional[StageTimer] = None,
+                               result_namespace: Optional[str] = None) -> Tuple[str, str]:
+        """Run the AgstackCrew with the provided metadata, its code writing to the result_namespace run directory"""
         # Initialize AgentOps session for this request
-        session = agentops.start_session(tags=[f"crew:{user_question}"])
+        session = start_agentops_session([f"crew:{user_question}"])
 
         try:
-            # Convert complex types to strings for interpolation
-            interpolated_inputs = {
-                "user_question": user_question,
-                "connection_name": connection_name,
-                "available_tables_json": json.dumps(available_tables, indent=2)
-            }
+            interpolated_inputs = self.crew_inputs(user_question, connection_name, available_tables)
 
             # Create and run the crew
-            instance = AgstackCrew().crew()
+            crew_base = load_crew_class()()
+            instance = crew_base.crew()
+            crew_base.code_executor_tool().result_namespace = result_namespace
+            if stage_timer:
+                instance.task_callback = self.task_progress(stage_timer, connection_name)
+                crew_base.code_executor_tool().progress = self.code_progress(stage_timer, connection_name)
             result = instance.kickoff(inputs=interpolated_inputs)
 
+            if stage_timer:
+                self.record_crew_metrics(stage_timer, connection_name, instance,
+                                         crew_base.code_executor_tool().attempts)
+
             json_output = {}
             try:
                 formatted_json_str = result.tasks_output[1].raw.replace("```json", "").replace("```", "").strip()
@@ -257,10 +538,405 @@ class ChatService:
             logging.error(error_message)
             raise e
         finally:
-            session.end_session()
+            # No session is started when AgentOps has no API key (e.g. offline replay runs)
+            if session:
+                session.end_session()
+
+    def run_sql_crew_with_metadata(self, user_question: str, connection_name: str, available_tables: Dict[str, Any],
+                                   stage_timer: Optional[StageTimer] = None) -> Optional[str]:
+        """Run the SQL pipeline's crew with the provided metadata, returning the generated SQL"""
+        session = start_agentops_session([f"crew:{user_question}"])
+
+        try:
+            interpolated_inputs = self.crew_inputs(user_question, connection_name, available_tables)
+
+            instance = load_crew_class()().sql_crew()
+            if stage_timer:
+                instance.task_callback = self.task_progress(stage_timer, connection_name)
+            result = instance.kickoff(inputs=interpolated_inputs)
+
+            if stage_timer:
+                infer_task, sql_task = instance.tasks[0], instance.tasks[1]
+                for stage, crew_task in (("table_inference", infer_task), ("sql_generation", sql_task)):
+                    if crew_task.start_time and crew_task.end_time:
+                        stage_timer.add(stage, (crew_task.end_time - crew_task.start_time).total_seconds(),
+                                        connection=connection_name)
+                self.record_agent_usage(stage_timer, connection_name, instance)
+
+            return self.parse_sql_output(result.tasks_output[1].raw)
+        finally:
+            if session:
+                session.end_session()
+
+    def run_sql_candidates(self, user_question: str, connection_name: str, available_tables: Dict[str, Any],
+                           stage_timer: Optional[StageTimer] = None) -> Optional[str]:
+        """
+        Generate sql_candidates queries concurrently and return the first one that passes EXPLAIN.
+
+        Tables are inferred once and shared by all candidates. Once a candidate is accepted the
+        queued ones are cancelled and those still waiting on the model are discarded without
+        being checked, so the extra cost is at most (sql_candidates - 1) SQL generations.
+        """
+        session = start_agentops_session([f"crew:{user_question}"])
+        accepted = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.sql_candidates)
+
+        try:
+            interpolated_inputs = self.crew_inputs(user_question, connection_name, available_tables)
+
+            instance = load_crew_class()().table_inference_crew()
+            if stage_timer:
+                instance.task_callback = self.task_progress(stage_timer, connection_name)
+            result = instance.kickoff(inputs=interpolated_inputs)
+            if stage_timer:
+                infer_task = instance.tasks[0]
+                if infer_task.start_time and infer_task.end_time:
+                    stage_timer.add("table_inference", (infer_task.end_time - infer_task.start_time).total_seconds(),
+                                    connection=connection_name)
+                self.record_agent_usage(stage_timer, connection_name, instance)
+
+            candidate_inputs = {**interpolated_inputs, "selected_tables": result.raw,
+                                "candidate_count": self.sql_candidates}
+            futures = {
+                executor.submit(self.generate_sql_candidate, candidate_inputs, number, connection_name, accepted,
+                                stage_timer): number
+                for number in range(1, self.sql_candidates + 1)
+            }
+
+            for future in as_completed(futures):
+                number = futures[future]
+                try:
+                    sql = future.result()
+                except Exception as e:
+                    logging.warning(f"SQL candidate {number} rejected on connection '{connection_name}': {str(e)}")
+                    continue
+
+                accepted.set()
+                logging.info(f"Using SQL candidate {number} of {self.sql_candidates} on connection '{connection_name}'")
+                if stage_timer:
+                    stage_timer.add("sql_candidate_accepted", 0.0, connection=connection_name, candidate=number)
+                return sql
+
+            return None
+        finally:
+            accepted.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            if session:
+                session.end_session()
+
+    def generate_sql_candidate(self, inputs: Dict[str, Any], number: int, connection_name: str,
+                               accepted: threading.Event, stage_timer: Optional[StageTimer] = None) -> Optional[str]:
+        """Generate one candidate query and check it with EXPLAIN, unless another was accepted meanwhile"""
+        stage_timer = stage_timer or StageTimer()
+
+        started = time.perf_counter()
+        instance = load_crew_class()().sql_candidate_crew()
+        result = instance.kickoff(inputs={**inputs, "candidate_number": number})
+        stage_timer.add("sql_generation", time.perf_counter() - started, connection=connection_name, candidate=number)
+        self.record_agent_usage(stage_timer, connection_name, instance, candidate=number)
+
+        if accepted.is_set():
+            return None
+
+        sql = validate_select_sql(self.parse_sql_output(result.tasks_output[0].raw) or "")
+        with stage_timer.stage("sql_explain", connection=connection_name, candidate=number):
+            explain_query(sql, connection_name)
+        return sql
+
+    def parse_sql_output(self, raw: str) -> Optional[str]:
+        """Get the SQL from the JSON output of a SQL task"""
+        try:
+            # Only strip the fences around the JSON, the SQL inside may have its own
+            formatted_json_str = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip())
+            return json.loads(formatted_json_str).get("sql")
+        except Exception as e:
+            logging.error(f"Error parsing JSON output: {str(e)}")
+            return None
+
+    def run_sql(self, sql: str, user_question: str, connection_name: str,
+                stage_timer: Optional[StageTimer] = None,
+                result_namespace: Optional[str] = None) -> Tuple[pd.DataFrame, str]:
+        """
+        Validate and run a SELECT in-process on the pooled connection, returning the rows
+        and the name of the CSV file they were also written to in the result_namespace run directory
+        """
+        sql = validate_select_sql(sql)
+        stage_timer = stage_timer or StageTimer()
+
+        stage_timer.emit("executing", connection=connection_name, pipeline="sql")
+        with stage_timer.stage("external_query", connection=connection_name, pipeline="sql"):
+            df = execute_query(sql, connection_name, read_only=True)
+
+        # Keep an output file for the question cache, but build the result from the rows in memory
+        csv_file_name = self.sql_csv_file_name(user_question, connection_name)
+        with stage_timer.stage("csv_write", connection=connection_name, pipeline="sql",
+                               format=get_output_format(csv_file_name)):
+            write_df(df, csv_file_name, namespace=result_namespace)
+
+        return df, csv_file_name
+
+    def sql_csv_file_name(self, user_question: str, connection_name: str) -> str:
+        """Meaningful CSV file name for a SQL pipeline result, distinct per connection"""
+        slug = re.sub(r"[^a-z0-9]+", "_", user_question.lower()).strip("_")[:60] or "result"
+        connection_slug = re.sub(r"[^a-z0-9]+", "_", connection_name.lower()).strip("_")
+        return f"{slug}_{connection_slug}.csv"
+
+    def answer_connections(self, user_question: str, connection_names: List[str],
+                           available_tables: Dict[str, Dict[str, Any]],
+                           cached_code: Dict[str, Tuple[str, str, str]],
+                           stage_timer: Optional[StageTimer] = None,
+                           pipeline: str = "python") -> Dict[str, Dict[str, Any]]:
+        """
+        Answer the question on each connection concurrently.
+
+        Total latency is that of the slowest connection rather than the sum. A failure on
+        one connection is reported in its answer and does not affect the others.
+        """
+        answers = {}
+        max_workers = max(1, min(len(connection_names), CHAT_MAX_PARALLEL_CONNECTIONS))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.answer_connection, user_question, connection_name,
+                                available_tables[connection_name], cached_code.get(connection_name),
+                                stage_timer, pipeline): connection_name
+                for connection_name in connection_names
+            }
+
+            for future in as_completed(futures):
+                connection_name = futures[future]
+                try:
+                    answers[connection_name] = future.result()
+                except Exception as e:
+                    logging.error(f"Error answering on connection '{connection_name}': {str(e)}")
+                    answers[connection_name] = {"csv_file_name": None, "generated_code": None,
+                                                "from_cache": False, "pipeline": pipeline, "error": str(e)}
+
+        return answers
+
+    def answer_connection(self, user_question: str, connection_name: str, connection_tables: Dict[str, Any],
+                          cached_code: Optional[Tuple[str, str, str]] = None,
+                          stage_timer: Optional[StageTimer] = None,
+                          pipeline: str = "python") -> Dict[str, Any]:
+        """
+        Answer the question on one connection, reusing cached code when it still runs.
+
+        When the SQL pipeline fails (no valid query, or the query errors) the question is
+        answered through the Python pipeline instead. CSV outputs go to a run directory of
+        their own, returned as result_namespace, so concurrent answers never share a file.
+        The answer's pipeline is the one its generated code runs on, stored with it in the question cache.
+        """
+        result_namespace = new_result_namespace()
+        if cached_code:
+            generated_code, csv_file_name, cached_pipeline = cached_code
+            if cached_pipeline == "sql":
+                try:
+                    frame, csv_file_name = self.run_sql(generated_code, user_question, connection_name, stage_timer,
+                                                        result_namespace)
+                    return {"csv_file_name": csv_file_name, "generated_code": generated_code, "from_cache": True,
+                            "pipeline": "sql", "frame": frame, "result_namespace": result_namespace}
+                except Exception as e:
+                    logging.warning(f"Cached SQL failed, generating a new answer: {str(e)}")
+            elif self.run_cached_code(generated_code, connection_name, stage_timer, result_namespace):
+                return {"csv_file_name": csv_file_name, "generated_code": generated_code, "from_cache": True,
+                        "pipeline": "python", "result_namespace": result_namespace}
+
+        # Shrink large schemas to the tables most relevant to the question
+        selected_tables = self.table_retrieval_service.select_tables(user_question, connection_tables)
+
+        if pipeline == "sql":
+            if self.sql_candidates > 1:
+                sql = self.run_sql_candidates(user_question, connection_name, selected_tables, stage_timer)
+            else:
+                sql = self.run_sql_crew_with_metadata(user_question, connection_name, selected_tables, stage_timer)
+            try:
+                frame, csv_file_name = self.run_sql(sql or "", user_question, connection_name, stage_timer,
+                                                    result_namespace)
+                return {"csv_file_name": csv_file_name, "generated_code": validate_select_sql(sql),
+                        "from_cache": False, "pipeline": "sql", "frame": frame, "result_namespace": result_namespace}
+            except Exception as e:
+                logging.warning(f"SQL pipeline failed on connection '{connection_name}', "
+                                f"falling back to the Python pipeline: {str(e)}")
+
+        # Run the crew with the metadata
+        csv_file_name, generated_code = self.run_crew_with_metadata(
+            user_question=user_question,
+            connection_name=connection_name,
+            available_tables=selected_tables,
+            stage_timer=stage_timer,
+            result_namespace=result_namespace
+        )
+        return {"csv_file_name": csv_file_name, "generated_code": generated_code, "from_cache": False,
+                "pipeline": "python", "result_namespace": result_namespace}
+
+    def run_cached_code(self, generated_code: str, connection_name: Optional[str] = None,
+                        stage_timer: Optional[StageTimer] = None, result_namespace: Optional[str] = None) -> bool:
+        """Re-execute cached generated code, returning whether it succeeded"""
+        logging.info("Question cache hit, re-executing stored code")
+        if stage_timer:
+            stage_timer.emit("executing", connection=connection_name, from_cache=True)
+        stage_timings = []
+        result = execute_code_tool(generated_code, stage_timings=stage_timings, result_namespace=result_namespace)
+
+        if stage_timer:
+            for stage in stage_timings:
+                stage_timer.add(stage.pop("stage"), stage.pop("seconds"), connection=connection_name,
+                                from_cache=True, **stage)
+
+        if not result.get("success"):
+            logging.warning(f"Cached code failed, falling back to the crew: {result.get('error')}")
+            return False
+        return True
+
+    def task_progress(self, stage_timer: StageTimer, connection_name: str) -> Callable[[Any], None]:
+        """Crew task callback reporting finished tasks as progress events"""
+        def on_task_completed(output: Any) -> None:
+            event = "tables_inferred" if output.name == "infer_tables_task" else "task_completed"
+            stage_timer.emit(event, connection=connection_name, task=output.name)
+        return on_task_completed
+
+    def code_progress(self, stage_timer: StageTimer, connection_name: str) -> Callable[..., None]:
+        """Code executor callback reporting execution attempts as progress events"""
+        def on_code_event(event: str, **data) -> None:
+            stage_timer.emit(event, connection=connection_name, **data)
+        return on_code_event
+
+    def record_crew_metrics(self, stage_timer: StageTimer, connection_name: str, instance: Any,
+                            attempts: List[Dict[str, Any]]) -> None:
+        """
+        Record stage timings and per-agent token usage of a finished crew run.
+
+        Code generation time for an attempt is the time from the start of the code task (or
+        the end of the previous execution) until the generated code was executed.
+        """
+        infer_task, code_task = instance.tasks[0], instance.tasks[1]
+        if infer_task.start_time and infer_task.end_time:
+            stage_timer.add("table_inference", (infer_task.end_time - infer_task.start_time).total_seconds(),
+                            connection=connection_name)
+
+        previous = code_task.start_time.timestamp() if code_task.start_time else None
+        for attempt, entry in enumerate(attempts, start=1):
+            if previous is not None:
+                stage_timer.add("code_generation", entry["started"] - previous, connection=connection_name,
+                                attempt=attempt)
+            for stage in entry["stages"]:
+                stage_timer.add(stage.pop("stage"), stage.pop("seconds"), connection=connection_name,
+                                attempt=attempt, **stage)
+            previous = entry["ended"]
+
+        if previous is not None and code_task.end_time:
+            stage_timer.add("final_answer", code_task.end_time.timestamp() - previous, connection=connection_name)
+
+        self.record_agent_usage(stage_timer, connection_name, instance)
+
+    def record_agent_usage(self, stage_timer: StageTimer, connection_name: str, instance: Any, **labels) -> None:
+        """Record the token usage of every agent of a finished crew run"""
+        for crew_agent in instance.agents:
+            token_process = getattr(crew_agent, "_token_process", None)
+            if token_process is None:
+                continue
+            summary = token_process.get_summary()
+            stage_timer.add_usage(crew_agent.role.strip(), summary.prompt_tokens, summary.completion_tokens,
+                                  summary.successful_requests, connection=connection_name, **labels)
+
+    def merge_results(self, connection_names: List[str],
+                      results: Dict[str, Dict[str, Any]]) -> Tuple[pd.DataFrame, Optional[Dict[str, Any]]]:
+        """
+        Merge per-connection results into the rows of one answer.
 
-    def parse_csv_result(self, csv_file_name: str) -> Dict[str, Any]:
-        """Parse CSV file content into a structured format for API response"""
-        # Use the improved read_csv_data function from file_utils
-        csv_path = get_csv_path(csv_file_name)
-        return read_csv_data(csv_path)
+        A single connection's rows are returned unchanged. Results with identical columns are
+        concatenated with a leading "connection" column; otherwise the most relevant successful
+        result is shown and the others are summarized with a preview under "connections".
+        Returns the rows and the per-connection summary (None for a single connection).
+        """
+        successful = [name for name in connection_names if "error" not in results[name]]
+        if len(connection_names) == 1:
+            return results[successful[0]]["frame"], None
+
+        primary = results[successful[0]]
+        if all(results[name]["columns"] == primary["columns"] for name in successful):
+            included = successful
+            frames = []
+            for name in successful:
+                frame = results[name]["frame"].copy()
+                frame.insert(0, "connection", name, allow_duplicates=True)
+                frames.append(frame)
+            frame = pd.concat(frames, ignore_index=True)
+        else:
+            included = successful[:1]
+            frame = primary["frame"]
+
+        # Results already shown at the top level are only summarized
+        connections = {}
+        for name in connection_names:
+            if "error" in results[name]:
+                connections[name] = results[name]
+            elif name in included:
+                connections[name] = {"columns": results[name]["columns"], "row_count": results[name]["row_count"]}
+            else:
+                connections[name] = self.preview_result(results[name]["frame"])
+
+        return frame, connections
+
+    def store_result(self, frame: pd.DataFrame,
+                     connections: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Store all rows of an answer in a content-addressed Parquet artifact, shared with earlier
+        identical answers, and build the message's result_content from the artifact's manifest:
+        columns, schema, row count and the first RESULT_PREVIEW_ROWS rows.
+
+        Returns the result_content and the artifact file name. If the artifact cannot be
+        written all rows are kept inline instead.
+        """
+        try:
+            artifact = write_result_artifact(frame)
+        except Exception as e:
+            logging.error(f"Error writing result artifact, storing rows inline: {str(e)}")
+            result_content, artifact_file = dataframe_to_result(frame), None
+        else:
+            manifest = artifact.pop("manifest")
+            result_content = {
+                "columns": manifest["preview"]["columns"],
+                "data": manifest["preview"]["data"],
+                "row_count": manifest["row_count"],
+                "truncated": manifest["row_count"] > len(manifest["preview"]["data"])
+            }
+            result_content["schema"] = artifact.pop("schema")
+            result_content["artifact"] = artifact
+            artifact_file = artifact["file"]
+
+        if connections is not None:
+            result_content["connections"] = connections
+        return result_content, artifact_file
+
+    def preview_result(self, frame: pd.DataFrame) -> Dict[str, Any]:
+        """Columns, row count and the first RESULT_PREVIEW_ROWS rows of a result"""
+        preview = dataframe_to_result(frame.head(max(0, RESULT_PREVIEW_ROWS)))
+        preview["row_count"] = len(frame)
+        preview["truncated"] = len(frame) > len(preview["data"])
+        return preview
+
+    def frame_result(self, frame: pd.DataFrame) -> Dict[str, Any]:
+        """Per-connection result holding the rows of a connection's answer"""
+        return {"frame": frame, "columns": [str(column) for column in frame.columns], "row_count": len(frame)}
+
+    def merge_generated_code(self, generated_code: Dict[str, str]) -> str:
+        """Combine the generated code of each connection, labelled by connection"""
+        if len(generated_code) == 1:
+            return next(iter(generated_code.values()))
+        return "\n\n".join(f"# Connection: {name}\n{code}" for name, code in generated_code.items())
+
+    def parse_output_result(self, file_name: str, result_namespace: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Read the output file (CSV, Parquet or Feather) written by the generated code in its run
+        directory into a per-connection result
+        """
+        output_path = get_output_path(file_name, result_namespace)
+        if not os.path.exists(output_path):
+            logging.error(f"Output file not found: {output_path}")
+            return {"error": f"File not found: {output_path}"}
+
+        try:
+            return self.frame_result(read_output_file(output_path))
+        except Exception as e:
+            logging.error(f"Error reading output file: {str(e)}")
+            return {"error": f"Error reading output file: {str(e)}"}
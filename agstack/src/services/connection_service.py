@@ -6,14 +6,19 @@ from sqlalchemy.orm import Session
 from src.models.column_details import ColumnDetails
 from src.models.database_connection import DatabaseConnection
 from src.models.table_details import TableDetails
-from src.schemas.database_connection import DatabaseConnectionCreate
+from src.modules.db_utils import close_connection_pool
+from src.schemas.database_connection import DatabaseConnectionCreate, QuestionCacheSettings
 from src.services.database_service import DatabaseService
+from src.services.question_cache_service import QuestionCacheService
+from src.services.schema_cache_service import SchemaCacheService
 from src.services.db_utils import add_and_refresh, commit_changes, rollback_changes, CustomJSONEncoder
 
 
 class ConnectionService:
     def __init__(self):
         self.db_service = DatabaseService()
+        self.question_cache_service = QuestionCacheService()
+        self.schema_cache_service = SchemaCacheService()
 
     def check_existing_connection(self, db: Session, connection_name: str) -> Optional[DatabaseConnection]:
         """Check if a connection with the given name already exists"""
@@ -141,6 +146,9 @@ class ConnectionService:
             if not success:
                 return False, f"Error processing table '{table_name}': {error}", []
 
+        # Precompute the schema payload used when answering chat messages
+        self.schema_cache_service.refresh(db, db_connection)
+
         return True, "Connection successful and data saved", tables
 
     def get_all_connections(self, db: Session) -> List[DatabaseConnection]:
@@ -163,10 +171,12 @@ class ConnectionService:
 
             # Delete tables
             db.query(TableDetails).filter(TableDetails.connection_id == connection_id).delete()
+            self.schema_cache_service.invalidate(db, connection_id)
 
             # Delete connection
             db.delete(connection)
             commit_changes(db)
+            close_connection_pool(connection.connection_name)
 
             return True, f"Connection '{connection.connection_name}' successfully deleted"
         except Exception as e:
@@ -208,3 +218,37 @@ class ConnectionService:
             return column_names
         except Exception:
             return []
+
+    def update_question_cache_settings(self, db: Session, connection_id: int,
+                                       settings: QuestionCacheSettings) -> Tuple[bool, str]:
+        """Enable or disable the question cache for a connection and set its TTL"""
+        try:
+            connection = db.query(DatabaseConnection).filter(DatabaseConnection.id == connection_id).first()
+            if not connection:
+                return False, f"Connection with ID {connection_id} not found"
+
+            connection.question_cache_enabled = settings.enabled
+            connection.question_cache_ttl_seconds = settings.ttl_seconds
+            commit_changes(db)
+
+            # Cached entries of a disabled connection are of no further use
+            if not settings.enabled:
+                self.question_cache_service.clear(db, connection_id)
+
+            return True, f"Question cache settings updated for '{connection.connection_name}'"
+        except Exception as e:
+            rollback_changes(db)
+            return False, f"Error updating question cache settings: {str(e)}"
+
+    def clear_question_cache(self, db: Session, connection_id: int) -> Tuple[bool, str]:
+        """Remove all cached questions for a connection"""
+        try:
+            connection = db.query(DatabaseConnection).filter(DatabaseConnection.id == connection_id).first()
+            if not connection:
+                return False, f"Connection with ID {connection_id} not found"
+
+            removed = self.question_cache_service.clear(db, connection_id)
+            return True, f"Removed {removed} cached questions for '{connection.connection_name}'"
+        except Exception as e:
+            rollback_changes(db)
+            return False, f"Error clearing question cache: {str(e)}"
@@ -1,7 +1,9 @@
 import json
+import time
 from datetime import date, datetime
-from typing import TypeVar, Any, Dict, Optional
+from typing import TypeVar, Any, Callable, Dict, List, Optional
 
+from sqlalchemy import event, update
 from sqlalchemy.orm import Session
 
 from src.models.chat import Chat
@@ -50,6 +52,30 @@ def delete_object(db: Session, obj: Any) -> None:
     db.commit()
 
 
+def track_commits(db: Session, stage_timer: Any) -> Callable[[], None]:
+    """
+    Record the duration of every commit on the session as a "db_commit" stage.
+    Returns a function that stops tracking.
+    """
+    started = {}
+
+    def before_commit(session):
+        started["at"] = time.perf_counter()
+
+    def after_commit(session):
+        if "at" in started:
+            stage_timer.add("db_commit", time.perf_counter() - started.pop("at"))
+
+    event.listen(db, "before_commit", before_commit)
+    event.listen(db, "after_commit", after_commit)
+
+    def stop_tracking():
+        event.remove(db, "before_commit", before_commit)
+        event.remove(db, "after_commit", after_commit)
+
+    return stop_tracking
+
+
 def get_chat_by_id(db: Session, chat_id: int) -> Optional[Chat]:
     """
     Get a chat by ID
@@ -64,6 +90,38 @@ def get_message_by_id(db: Session, message_id: int) -> Optional[ChatMessage]:
     return db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
 
 
+def allocate_message_indexes(db: Session, chat_id: int, count: int = 1) -> Optional[int]:
+    """
+    Reserve count consecutive message indexes of a chat and return the first one.
+    A single UPDATE ... RETURNING on the chat's counter, so concurrent sends to the same
+    chat wait on its row lock instead of reading the same MAX(message_index).
+    Returns None if the chat does not exist.
+    """
+    next_index = db.execute(
+        update(Chat)
+        .where(Chat.id == chat_id)
+        .values(next_message_index=Chat.next_message_index + count)
+        .returning(Chat.next_message_index)
+    ).scalar()
+    return None if next_index is None else next_index - count
+
+
+def get_messages_by_ids(db: Session, message_ids: List[int]) -> Dict[int, ChatMessage]:
+    """
+    Get several messages by ID in one query
+    """
+    messages = db.query(ChatMessage).filter(ChatMessage.id.in_(message_ids)).all()
+    return {message.id: message for message in messages}
+
+
+def touch_chat(db: Session, chat_id: int) -> None:
+    """
+    Set a chat's updated_at to now with a single UPDATE, without loading the chat
+    """
+    db.query(Chat).filter(Chat.id == chat_id).update({Chat.updated_at: datetime.utcnow()},
+                                                     synchronize_session=False)
+
+
 def update_message_status(db: Session, message_id: int, status: str) -> Optional[ChatMessage]:
     """
     Update a message's status
@@ -76,7 +134,8 @@ def update_message_status(db: Session, message_id: int, status: str) -> Optional
 
 
 def update_message_with_result(db: Session, message_id: int, status: str, generated_code: Optional[str] = None,
-                               result_content: Optional[Dict[str, Any]] = None) -> Optional[ChatMessage]:
+                               result_content: Optional[Dict[str, Any]] = None,
+                               result_artifact: Optional[str] = None) -> Optional[ChatMessage]:
     """
     Update a message with results
     """
@@ -87,5 +146,7 @@ def update_message_with_result(db: Session, message_id: int, status: str, genera
             message.generated_code = generated_code
         if result_content is not None:
             message.result_content = result_content
+        if result_artifact is not None:
+            message.result_artifact = result_artifact
         commit_changes(db)
     return message
@@ -0,0 +1,149 @@
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy.orm import Session
+
+from src.core.config import CHAT_WORKERS, MESSAGE_HEARTBEAT_SECONDS, MESSAGE_STALE_SECONDS
+from src.core.database import SessionLocal
+from src.models.chat_message import ChatMessage
+from src.schemas.chat_message import ChatMessageCreate
+from src.services.chat_service import ChatService
+from src.services.db_utils import get_messages_by_ids
+from src.utils.event_stream import EventStream
+from src.utils.stage_timer import StageTimer
+
+
+class MessageQueueService:
+    """
+    Service for answering chat messages in the background on a pool of worker threads.
+
+    Sending a message only persists it with a pending assistant reply; the reply's status
+    moves to processing and then completed or failed as a worker answers it. Progress of a
+    queued message is published on an EventStream until it is answered.
+
+    Queued messages are owned by this process's worker_id. Once started, a heartbeat thread keeps
+    them alive and fails the messages of processes that stopped heartbeating, so replicas and
+    restarts never fail messages that are still being answered.
+    """
+
+    def __init__(self, chat_service: ChatService, max_workers: int = CHAT_WORKERS,
+                 heartbeat_seconds: float = MESSAGE_HEARTBEAT_SECONDS, stale_seconds: float = MESSAGE_STALE_SECONDS):
+        self.chat_service = chat_service
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="chat-worker")
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        # Progress of queued assistant messages by ID, closed once the message is answered
+        self._streams: Dict[int, EventStream] = {}
+        self._stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def submit(self, db: Session, message_data: ChatMessageCreate) -> ChatMessage:
+        """Persist a message and queue it, returning the pending assistant message"""
+        # Started before anything is persisted so total_seconds includes the time spent queued
+        stage_timer = StageTimer()
+        with stage_timer.stage("submit"):
+            user_message, assistant_message = self.chat_service.submit_message(db, message_data, self.worker_id)
+
+        stream = EventStream()
+        stage_timer.listeners.append(stream.publish)
+        stream.publish("status", {"status": assistant_message.status})
+        with self._lock:
+            self._streams[assistant_message.id] = stream
+
+        self.executor.submit(self.run, message_data, user_message.id, assistant_message.id, stage_timer,
+                             time.perf_counter())
+        logging.info(f"Queued message {user_message.id} of chat {message_data.chat_id}")
+        return assistant_message
+
+    def run(self, message_data: ChatMessageCreate, user_message_id: int, assistant_message_id: int,
+            stage_timer: StageTimer, queued_at: float) -> None:
+        """Answer a queued message on a worker thread with its own session"""
+        stage_timer.add("queue_wait", time.perf_counter() - queued_at)
+
+        db = SessionLocal()
+        try:
+            messages = get_messages_by_ids(db, [user_message_id, assistant_message_id])
+            user_message, assistant_message = messages.get(user_message_id), messages.get(assistant_message_id)
+            if not (user_message and assistant_message):
+                logging.warning(f"Queued message {user_message_id} no longer exists, skipping")
+                return
+
+            assistant_message = self.chat_service.answer_message(db, message_data, user_message, assistant_message,
+                                                                 stage_timer)
+            stage_timer.emit("status", status=assistant_message.status)
+        except Exception as e:
+            logging.error(f"Error answering queued message {user_message_id}: {str(e)}")
+            stage_timer.emit("status", status="failed")
+        finally:
+            db.close()
+            with self._lock:
+                stream = self._streams.pop(assistant_message_id, None)
+            if stream:
+                stream.close()
+
+    def get_stream(self, message_id: int) -> Optional[EventStream]:
+        """Progress events of an assistant message, if it is waiting for or being answered by a worker"""
+        with self._lock:
+            return self._streams.get(message_id)
+
+    def is_queued(self, message_id: int) -> bool:
+        """Whether the assistant message is waiting for or being answered by a worker"""
+        return self.get_stream(message_id) is not None
+
+    async def wait_async(self, message_id: int, timeout: float) -> bool:
+        """
+        Wait until a queued assistant message is answered or the timeout expires, without
+        blocking a thread. Returns False on timeout; messages that are not queued return True.
+        """
+        stream = self.get_stream(message_id)
+        if stream is None:
+            return True
+        return await stream.wait_closed_async(timeout)
+
+    def start(self) -> None:
+        """Start the heartbeat thread; does nothing when the heartbeat interval is 0"""
+        if self.heartbeat_seconds <= 0 or self._heartbeat_thread is not None:
+            return
+        self._stop.clear()
+        self._heartbeat_thread = threading.Thread(target=self.run_heartbeat, name="chat-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def run_heartbeat(self) -> None:
+        """Heartbeat until stopped"""
+        while True:
+            self.heartbeat_once()
+            if self._stop.wait(self.heartbeat_seconds):
+                return
+
+    def heartbeat_once(self) -> int:
+        """
+        Refresh the heartbeat of this process's messages and fail the stale messages of other
+        processes, with its own session. Returns how many messages were failed; errors are logged
+        and the next heartbeat retries
+        """
+        db = SessionLocal()
+        try:
+            self.chat_service.heartbeat_messages(db, self.worker_id)
+            failed = self.chat_service.fail_interrupted_messages(db, self.stale_seconds, self.worker_id)
+            if failed:
+                logging.warning(f"Marked {failed} interrupted messages as failed")
+            return failed
+        except Exception as e:
+            logging.error(f"Message heartbeat failed: {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+    def shutdown(self) -> None:
+        """Stop accepting messages, drop the ones not yet started and stop the heartbeat"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._stop.set()
+        self._heartbeat_thread = None
@@ -0,0 +1,178 @@
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.core.config import (
+    QUESTION_CACHE_ENABLED, QUESTION_CACHE_MAX_CANDIDATES, QUESTION_CACHE_SIMILARITY, QUESTION_CACHE_TTL_SECONDS
+)
+from src.models.connection_schema import ConnectionSchema
+from src.models.database_connection import DatabaseConnection
+from src.models.question_cache import QuestionCacheEntry
+from src.services.db_utils import commit_changes
+
+# Terms of a cache key: words, numbers with their decimals,
+# and comparison operators, which change the answer however similar the rest of the question is
+QUESTION_TERM = re.compile(r"[<>!=]=|<>|[<>=]|\d+(?:\.\d+)?|\w+")
+COMPARISON_OPERATORS = {"<", ">", "=", "<=", ">=", "!=", "<>", "=="}
+NEGATIONS = {"not", "no", "none", "never", "without", "except", "excluding", "nor"}
+
+
+class QuestionCacheService:
+    """
+    Service for reusing generated code when a question is asked again on the same connection
+    """
+
+    def __init__(self, enabled: bool = QUESTION_CACHE_ENABLED, ttl_seconds: int = QUESTION_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = QUESTION_CACHE_SIMILARITY,
+                 max_candidates: int = QUESTION_CACHE_MAX_CANDIDATES):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_candidates = max_candidates
+
+    def normalize_question(self, question: str) -> str:
+        """
+        Normalize a question so differences in case, spacing and punctuation share a cache key;
+        "n't" is spelled out, so "don't" and "do not" share one too.
+
+        Every word is kept, unlike the table retrieval tokenizer, which drops stop words: intent
+        words ("how many" vs "list"), negations and comparison operators change the answer.
+        """
+        question = question.lower().replace("\u2019", "'").replace("n't", " not")
+        return " ".join(QUESTION_TERM.findall(question))
+
+    def similarity(self, first: str, second: str) -> float:
+        """
+        Token overlap (Jaccard) between two normalized questions.
+
+        Questions that mention different numbers ("top 10" vs "top 20", "2023" vs "2024"),
+        comparison operators or negations never match, however similar the rest of the wording is.
+        """
+        first_terms, second_terms = set(first.split()), set(second.split())
+        if not first_terms or not second_terms:
+            return 0.0
+
+        numbers = re.compile(r"^\d+(?:\.\d+)?$")
+        if {t for t in first_terms if numbers.match(t)} != {t for t in second_terms if numbers.match(t)}:
+            return 0.0
+        if first_terms & COMPARISON_OPERATORS != second_terms & COMPARISON_OPERATORS:
+            return 0.0
+        if first_terms & NEGATIONS != second_terms & NEGATIONS:
+            return 0.0
+
+        return len(first_terms & second_terms) / len(first_terms | second_terms)
+
+    def get_connection(self, db: Session, connection_name: str) -> Tuple[Optional[DatabaseConnection], Optional[int]]:
+        """Get a connection and the version of its schema payload"""
+        row = db.query(DatabaseConnection, ConnectionSchema.version).outerjoin(
+            ConnectionSchema, ConnectionSchema.connection_id == DatabaseConnection.id
+        ).filter(
+            DatabaseConnection.connection_name == connection_name
+        ).first()
+
+        if not row:
+            return None, None
+        return row[0], row[1]
+
+    def lookup(self, db: Session, connection_name: str, question: str) -> Optional[QuestionCacheEntry]:
+        """
+        Find a fresh cache entry for the question on a connection.
+
+        Entries are skipped when caching is disabled for the connection, when they are older
+        than the connection's TTL, or when the connection's schema was rebuilt since.
+        """
+        if not self.enabled:
+            return None
+
+        connection, schema_version = self.get_connection(db, connection_name)
+        if not connection or connection.question_cache_enabled is False:
+            return None
+
+        query = db.query(QuestionCacheEntry).filter(QuestionCacheEntry.connection_id == connection.id)
+
+        ttl_seconds = connection.question_cache_ttl_seconds
+        if ttl_seconds is None:
+            ttl_seconds = self.ttl_seconds
+        if ttl_seconds > 0:
+            query = query.filter(QuestionCacheEntry.created_at >= datetime.utcnow() - timedelta(seconds=ttl_seconds))
+
+        if schema_version is not None:
+            query = query.filter(QuestionCacheEntry.schema_version == schema_version)
+
+        normalized = self.normalize_question(question)
+        entry = query.filter(QuestionCacheEntry.normalized_question == normalized).first()
+        if entry or self.similarity_threshold <= 0:
+            return entry
+
+        # Fall back to the most similar recent question on this connection
+        candidates = query.order_by(QuestionCacheEntry.created_at.desc()).limit(self.max_candidates).all()
+        best_entry, best_score = None, 0.0
+        for candidate in candidates:
+            score = self.similarity(normalized, candidate.normalized_question)
+            if score > best_score:
+                best_entry, best_score = candidate, score
+
+        if best_entry and best_score >= self.similarity_threshold:
+            logging.info(f"Question cache similarity match ({best_score:.2f}): '{best_entry.question}'")
+            return best_entry
+        return None
+
+    def record_hit(self, db: Session, entry: QuestionCacheEntry, commit: bool = True) -> None:
+        """Record that a cache entry was reused; with commit=False the caller commits"""
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_hit_at = datetime.utcnow()
+        if commit:
+            commit_changes(db)
+
+    def store(self, db: Session, connection_name: str, question: str, generated_code: str, csv_file_name: str,
+              message_id: Optional[int] = None, commit: bool = True,
+              pipeline: str = "python") -> Optional[QuestionCacheEntry]:
+        """
+        Store (or replace) the generated code for a question on a connection, with the pipeline
+        ("sql" or "python") that runs it; with commit=False the caller commits
+        """
+        if not self.enabled:
+            return None
+
+        connection, schema_version = self.get_connection(db, connection_name)
+        if not connection or connection.question_cache_enabled is False:
+            return None
+
+        normalized = self.normalize_question(question)
+        entry = db.query(QuestionCacheEntry).filter(
+            QuestionCacheEntry.connection_id == connection.id,
+            QuestionCacheEntry.normalized_question == normalized
+        ).first()
+
+        if not entry:
+            entry = QuestionCacheEntry(connection_id=connection.id, normalized_question=normalized)
+            db.add(entry)
+
+        entry.question = question
+        entry.generated_code = generated_code
+        entry.csv_file_name = csv_file_name
+        entry.pipeline = pipeline
+        entry.message_id = message_id
+        entry.schema_version = schema_version
+        entry.hit_count = 0
+        entry.created_at = datetime.utcnow()
+        entry.last_hit_at = None
+
+        if commit:
+            commit_changes(db)
+        return entry
+
+    def evict(self, db: Session, entry: QuestionCacheEntry, commit: bool = True) -> None:
+        """Remove a cache entry whose code no longer runs; with commit=False the caller commits"""
+        db.delete(entry)
+        if commit:
+            commit_changes(db)
+
+    def clear(self, db: Session, connection_id: int) -> int:
+        """Remove all cache entries for a connection, returning how many were removed"""
+        removed = db.query(QuestionCacheEntry).filter(QuestionCacheEntry.connection_id == connection_id).delete()
+        commit_changes(db)
+        return removed
@@ -0,0 +1,419 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.core.config import (
+    RESULT_PREVIEW_ROWS, RETENTION_ARCHIVE_DIR, RETENTION_CSV_MAX_AGE_HOURS, RETENTION_EXPORT_MAX_AGE_HOURS,
+    RETENTION_MAX_BYTES, RETENTION_RESULT_MAX_AGE_DAYS, RETENTION_RESULTS_PER_CHAT, RETENTION_SWEEP_INTERVAL_SECONDS
+)
+from src.core.database import SessionLocal
+from src.models.chat_message import ChatMessage
+from src.modules.file_utils import ARTIFACTS_DIR, CSV_DIR, EXPORTS_DIR, EXPORT_FORMATS, MANIFESTS_DIR, \
+    get_artifact_path, get_export_path, get_manifest_path
+from src.services.db_utils import commit_changes, get_messages_by_ids
+
+# Files younger than this are never removed, so results being written or just answered are safe
+FILE_GRACE_SECONDS = 600
+
+# Messages compacted per transaction
+COMPACT_BATCH_SIZE = 200
+
+
+def list_files(directory: str) -> List[Tuple[str, int, float]]:
+    """(path, size in bytes, modification time) of the regular files directly in a directory"""
+    files = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return files
+
+    for entry in entries:
+        try:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        except FileNotFoundError:
+            # Removed while scanning, e.g. a temporary file that was just renamed
+            continue
+    return files
+
+
+def list_run_dirs(directory: str) -> List[Tuple[str, int, float]]:
+    """(path, total size in bytes, latest modification time) of the run directories in a directory"""
+    run_dirs = []
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return run_dirs
+
+    for entry in entries:
+        try:
+            mtime = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        files = list_files(entry.path)
+        run_dirs.append((entry.path, sum(size for _, size, _ in files),
+                         max([mtime] + [file_mtime for _, _, file_mtime in files])))
+    return run_dirs
+
+
+class RetentionService:
+    """
+    Service for keeping result files and stored result rows within the retention policies.
+
+    A sweep removes expired CSV outputs and exports, artifacts (and their manifests) no message refers to anymore,
+    and compacts results that fall out of the age, per-chat or total size policies: the
+    message keeps its inline preview while the artifact with all rows is archived or deleted,
+    unless a message that is kept shares the artifact.
+    """
+
+    def __init__(self, csv_max_age_hours: float = RETENTION_CSV_MAX_AGE_HOURS,
+                 export_max_age_hours: float = RETENTION_EXPORT_MAX_AGE_HOURS,
+                 result_max_age_days: float = RETENTION_RESULT_MAX_AGE_DAYS,
+                 results_per_chat: int = RETENTION_RESULTS_PER_CHAT, max_bytes: int = RETENTION_MAX_BYTES,
+                 archive_dir: Optional[str] = RETENTION_ARCHIVE_DIR or None):
+        self.csv_max_age_hours = csv_max_age_hours
+        self.export_max_age_hours = export_max_age_hours
+        self.result_max_age_days = result_max_age_days
+        self.results_per_chat = results_per_chat
+        self.max_bytes = max_bytes
+        self.archive_dir = archive_dir
+        self._lock = threading.Lock()
+
+    def sweep(self, db: Session, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Apply the retention policies once.
+
+        Args:
+            db: Database session
+            dry_run: Only report what would be removed and compacted
+
+        Returns:
+            Report with the files removed per kind, the results compacted, the bytes reclaimed
+            on disk and in result_content, and the bytes moved to the archive
+        """
+        with self._lock:
+            report = {
+                "dry_run": dry_run,
+                "csv_files_removed": 0,
+                "exports_removed": 0,
+                "manifests_removed": 0,
+                "orphaned_artifacts_removed": 0,
+                "results_compacted": 0,
+                "artifacts_removed": 0,
+                "artifacts_archived": 0,
+                "reclaimed_bytes": 0,
+                "reclaimed_result_content_bytes": 0,
+                "archived_bytes": 0
+            }
+            started = time.perf_counter()
+            now = time.time()
+
+            results = self.get_uncompacted_results(db)
+            referenced = {result["artifact"] for result in results if result["artifact"]}
+
+            # Intermediate files: CSV outputs of generated code (in run directories) and downloaded exports
+            csv_files = list_files(CSV_DIR) + list_run_dirs(CSV_DIR)
+            export_files = list_files(EXPORTS_DIR)
+            manifest_files = list_files(MANIFESTS_DIR)
+            artifact_files = list_files(ARTIFACTS_DIR)
+            expired = self.expired_files(csv_files, now, self.csv_max_age_hours)
+            expired |= self.expired_files(export_files, now, self.export_max_age_hours)
+            expired |= {path for path, _, mtime in export_files + manifest_files
+                        if now - mtime > FILE_GRACE_SECONDS and self.artifact_of(path) not in referenced}
+            # Reusing an artifact touches its manifest, which starts its grace period over
+            manifest_mtimes = {self.artifact_of(path): mtime for path, _, mtime in manifest_files}
+            expired |= {path for path, _, mtime in artifact_files
+                        if os.path.basename(path) not in referenced
+                        and now - max(mtime, manifest_mtimes.get(os.path.basename(path), 0)) > FILE_GRACE_SECONDS}
+
+            for files, key in ((csv_files, "csv_files_removed"), (export_files, "exports_removed"),
+                               (manifest_files, "manifests_removed"), (artifact_files, "orphaned_artifacts_removed")):
+                for path, size, _ in files:
+                    if path in expired:
+                        self.remove_file(path, size, key, report, dry_run)
+
+            # Results falling out of the age and per-chat policies, then oldest first over the size budget
+            expired_ids = self.expired_results(results)
+            if self.max_bytes > 0:
+                remaining = [file for file in csv_files + export_files + manifest_files + artifact_files
+                             if file[0] not in expired]
+                expired_ids |= self.results_over_budget(results, expired_ids, remaining, now, report, dry_run,
+                                                        expired)
+
+            # Identical results share an artifact, which stays while any message keeping its rows refers to it
+            kept = {result["artifact"] for result in results if result["artifact"] and result["id"] not in expired_ids}
+            self.compact_results(db, sorted(expired_ids), report, dry_run, removed=expired, kept=kept)
+
+            report["seconds"] = round(time.perf_counter() - started, 3)
+            logging.info(f"Retention sweep{' (dry run)' if dry_run else ''}: "
+                         f"reclaimed {report['reclaimed_bytes']} bytes on disk and "
+                         f"{report['reclaimed_result_content_bytes']} bytes of result rows, "
+                         f"compacted {report['results_compacted']} results")
+            return report
+
+    def get_uncompacted_results(self, db: Session) -> List[Dict[str, Any]]:
+        """ID, chat, creation time and artifact of every assistant message still holding its full result"""
+        rows = db.query(
+            ChatMessage.id, ChatMessage.chat_id, ChatMessage.created_at, ChatMessage.result_artifact
+        ).filter(
+            ChatMessage.role == "assistant",
+            ChatMessage.result_content.isnot(None),
+            ChatMessage.result_compacted_at.is_(None)
+        ).all()
+        return [{"id": row.id, "chat_id": row.chat_id, "created_at": row.created_at or datetime.min,
+                 "artifact": row.result_artifact} for row in rows]
+
+    def expired_results(self, results: List[Dict[str, Any]]) -> set:
+        """IDs of the results older than the max age or beyond the newest results_per_chat of their chat"""
+        expired = set()
+        if self.result_max_age_days > 0:
+            cutoff = datetime.utcnow() - timedelta(days=self.result_max_age_days)
+            expired |= {result["id"] for result in results if result["created_at"] < cutoff}
+
+        if self.results_per_chat > 0:
+            kept: Dict[int, int] = {}
+            for result in sorted(results, key=lambda result: (result["created_at"], result["id"]), reverse=True):
+                kept[result["chat_id"]] = kept.get(result["chat_id"], 0) + 1
+                if kept[result["chat_id"]] > self.results_per_chat:
+                    expired.add(result["id"])
+        return expired
+
+    def expired_files(self, files: List[Tuple[str, int, float]], now: float, max_age_hours: float) -> set:
+        """Paths of files older than the max age, and temporary files left behind by interrupted writes"""
+        expired = set()
+        for path, _, mtime in files:
+            age = now - mtime
+            if age <= FILE_GRACE_SECONDS:
+                continue
+            if path.endswith(".tmp") or (max_age_hours > 0 and age > max_age_hours * 3600):
+                expired.add(path)
+        return expired
+
+    def artifact_of(self, path: str) -> str:
+        """Artifact file an export was written from, or a manifest describes"""
+        return f"{os.path.splitext(os.path.basename(path))[0]}.parquet"
+
+    def artifact_mtime(self, artifact: str) -> float:
+        """When an artifact was last written or reused: the latest mtime of the artifact and its manifest"""
+        mtime = 0.0
+        for path in (get_artifact_path(artifact), get_manifest_path(artifact)):
+            try:
+                mtime = max(mtime, os.path.getmtime(path))
+            except FileNotFoundError:
+                pass
+        return mtime
+
+    def results_over_budget(self, results: List[Dict[str, Any]], expired_ids: set,
+                            files: List[Tuple[str, int, float]], now: float, report: Dict[str, Any],
+                            dry_run: bool, removed: set) -> set:
+        """
+        Bring the result files under max_bytes: CSV outputs and exports are removed first, oldest
+        first, then the IDs of the oldest results whose artifacts (with their manifests) still need
+        to go are returned.
+
+        Args:
+            results: Results that still hold their full rows
+            expired_ids: Results already compacted by the other policies
+            files: (path, size, modification time) of the result files left after expiry
+            now: Time of the sweep
+            report: Sweep report counting the removed files
+            dry_run: Only count the files that would be removed
+            removed: Paths removed so far in the sweep, extended with the files removed here
+
+        Returns:
+            IDs of the results to compact
+        """
+        expired_artifacts = {result["artifact"] for result in results if result["id"] in expired_ids}
+        # Bytes each artifact takes with its exports and manifest; those of expired results go with them
+        result_bytes: Dict[str, int] = {}
+        # Results referring to each artifact; its bytes are only freed when the last one is compacted
+        references: Dict[str, int] = {}
+        for result in results:
+            if result["artifact"] and result["id"] not in expired_ids:
+                references[result["artifact"]] = references.get(result["artifact"], 0) + 1
+        used = 0
+        for path, size, _ in files:
+            artifact = None
+            if os.path.dirname(path) == ARTIFACTS_DIR:
+                artifact = os.path.basename(path)
+            elif os.path.dirname(path) in (EXPORTS_DIR, MANIFESTS_DIR):
+                artifact = self.artifact_of(path)
+            if artifact:
+                result_bytes[artifact] = result_bytes.get(artifact, 0) + size
+            if artifact not in expired_artifacts or artifact in references:
+                used += size
+
+        for path, size, mtime in sorted(files, key=lambda file: file[2]):
+            if used <= self.max_bytes:
+                break
+            if os.path.dirname(path) in (ARTIFACTS_DIR, MANIFESTS_DIR) or now - mtime <= FILE_GRACE_SECONDS:
+                continue
+            if os.path.dirname(path) == EXPORTS_DIR:
+                artifact = self.artifact_of(path)
+                if artifact in expired_artifacts and artifact not in references:
+                    continue
+                result_bytes[artifact] = result_bytes.get(artifact, 0) - size
+            self.remove_file(path, size, "csv_files_removed" if path.startswith(CSV_DIR) else "exports_removed",
+                             report, dry_run)
+            removed.add(path)
+            used -= size
+
+        over_budget = set()
+        for result in sorted(results, key=lambda result: (result["created_at"], result["id"])):
+            if used <= self.max_bytes:
+                break
+            if result["id"] in expired_ids or not result["artifact"]:
+                continue
+            over_budget.add(result["id"])
+            references[result["artifact"]] -= 1
+            if not references[result["artifact"]]:
+                used -= result_bytes.get(result["artifact"], 0)
+        return over_budget
+
+    def remove_file(self, path: str, size: int, key: str, report: Dict[str, Any], dry_run: bool) -> None:
+        """Delete a file or run directory, counting it under key and its size as reclaimed"""
+        if not dry_run:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                return
+        report[key] += 1
+        report["reclaimed_bytes"] += size
+
+    def compact_result_content(self, result_content: Dict[str, Any]) -> Dict[str, Any]:
+        """The result_content of a message reduced to its preview, without the reference to the artifact"""
+        compacted = {key: value for key, value in result_content.items() if key != "artifact"}
+        data = compacted.get("data") or []
+        compacted["row_count"] = compacted.get("row_count", len(data))
+        if len(data) > RESULT_PREVIEW_ROWS:
+            compacted["data"] = data[:max(0, RESULT_PREVIEW_ROWS)]
+        compacted["truncated"] = compacted["row_count"] > len(compacted.get("data") or [])
+        compacted["compacted"] = True
+        return compacted
+
+    def compact_results(self, db: Session, message_ids: List[int], report: Dict[str, Any], dry_run: bool,
+                        removed: Optional[set] = None, kept: Optional[set] = None) -> None:
+        """
+        Reduce the results of the given messages to their preview, in batches.
+
+        Each batch is committed before its artifacts are removed, so a failure can only leave an
+        artifact no message refers to, which the next sweep removes. Artifacts in kept are still
+        referred to by other messages and stay. Messages without result rows (e.g. errors) are
+        only marked, so they are not considered again.
+        """
+        for start in range(0, len(message_ids), COMPACT_BATCH_SIZE):
+            messages = get_messages_by_ids(db, message_ids[start:start + COMPACT_BATCH_SIZE])
+            artifacts = []
+            for message in messages.values():
+                if message.result_content is None:
+                    continue
+                if "data" not in message.result_content and not message.result_artifact:
+                    if not dry_run:
+                        message.result_compacted_at = datetime.utcnow()
+                    continue
+                compacted = self.compact_result_content(message.result_content)
+                report["reclaimed_result_content_bytes"] += max(
+                    0, len(json.dumps(message.result_content, default=str)) - len(json.dumps(compacted, default=str))
+                )
+                report["results_compacted"] += 1
+                if message.result_artifact and message.result_artifact not in (kept or set()):
+                    artifacts.append(message.result_artifact)
+                if not dry_run:
+                    message.result_content = compacted
+                    message.result_artifact = None
+                    message.result_compacted_at = datetime.utcnow()
+
+            if not dry_run:
+                commit_changes(db)
+
+            for artifact in dict.fromkeys(artifacts):
+                self.retire_artifact(artifact, report, dry_run, removed or set())
+
+    def retire_artifact(self, artifact: str, report: Dict[str, Any], dry_run: bool, removed: set) -> None:
+        """
+        Move an artifact to the archive directory, or delete it when there is none, with its exports
+        and manifest.
+        Files in removed were already removed earlier in the sweep. An artifact written or reused
+        within the grace period may belong to an answer being stored and is left for a later sweep,
+        which removes it if no message refers to it then.
+        """
+        path = get_artifact_path(artifact)
+        if time.time() - self.artifact_mtime(artifact) <= FILE_GRACE_SECONDS:
+            return
+
+        for export_format in EXPORT_FORMATS:
+            export_path = get_export_path(artifact, export_format)
+            if export_format != "parquet" and export_path not in removed and os.path.exists(export_path):
+                self.remove_file(export_path, os.path.getsize(export_path), "exports_removed", report, dry_run)
+        manifest_path = get_manifest_path(artifact)
+        if manifest_path not in removed and os.path.exists(manifest_path):
+            self.remove_file(manifest_path, os.path.getsize(manifest_path), "manifests_removed", report, dry_run)
+
+        if path in removed or not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        if not self.archive_dir:
+            self.remove_file(path, size, "artifacts_removed", report, dry_run)
+            return
+
+        if not dry_run:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            shutil.move(path, os.path.join(self.archive_dir, os.path.basename(path)))
+        report["artifacts_archived"] += 1
+        report["archived_bytes"] += size
+        report["reclaimed_bytes"] += size
+
+
+class RetentionSweeper:
+    """
+    Runs a retention sweep on a background thread when started and then every interval seconds
+    """
+
+    def __init__(self, retention_service: RetentionService,
+                 interval_seconds: float = RETENTION_SWEEP_INTERVAL_SECONDS):
+        self.retention_service = retention_service
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start sweeping; does nothing when the interval is 0"""
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="retention-sweeper", daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        """Sweep until stopped"""
+        while True:
+            self.sweep_once()
+            if self._stop.wait(self.interval_seconds):
+                return
+
+    def sweep_once(self) -> Optional[Dict[str, Any]]:
+        """Run one sweep with its own session; errors are logged and the next sweep retries"""
+        db = SessionLocal()
+        try:
+            return self.retention_service.sweep(db)
+        except Exception as e:
+            logging.error(f"Retention sweep failed: {str(e)}")
+            return None
+        finally:
+            db.close()
+
+    def stop(self) -> None:
+        """Stop sweeping after the current sweep"""
+        self._stop.set()
+        self._thread = None
@@ -0,0 +1,100 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+from sqlalchemy.orm import Session, selectinload
+
+from src.models.connection_schema import ConnectionSchema
+from src.models.database_connection import DatabaseConnection
+from src.models.table_details import TableDetails
+# Import related models to ensure relationships are properly resolved
+from src.models.column_details import ColumnDetails
+from src.services.db_utils import commit_changes
+
+# Bump whenever the payload layout built below changes so stored payloads are rebuilt
+SCHEMA_PAYLOAD_FORMAT = 1
+
+
+class SchemaCacheService:
+    """
+    Service for the precomputed per-connection schema payload used in chat prompts
+    """
+
+    def build_payload(self, db: Session, connection: DatabaseConnection) -> Dict[str, Any]:
+        """Build the schema payload for a connection from its table and column details"""
+        tables = db.query(TableDetails).options(
+            selectinload(TableDetails.columns)
+        ).filter(
+            TableDetails.connection_id == connection.id
+        ).order_by(TableDetails.id).all()
+
+        payload = {}
+        for table in tables:
+            columns_metadata = []
+            for column in sorted(table.columns, key=lambda c: c.id):
+                # Parse sample values from JSON string
+                sample_values = json.loads(column.sample_values) if column.sample_values else []
+
+                columns_metadata.append({
+                    "column_name": column.column_name,
+                    "data_type": column.data_type,
+                    "sample_values": sample_values
+                })
+
+            payload[table.table_name] = {
+                "columns": columns_metadata,
+                "schema_name": connection.schema_name,
+            }
+
+        return payload
+
+    def refresh(self, db: Session, connection: DatabaseConnection) -> ConnectionSchema:
+        """Rebuild and store the schema payload for a connection, bumping its version"""
+        payload = self.build_payload(db, connection)
+
+        cached = db.query(ConnectionSchema).filter(ConnectionSchema.connection_id == connection.id).first()
+        if cached:
+            cached.version += 1
+            cached.format_version = SCHEMA_PAYLOAD_FORMAT
+            cached.payload = payload
+        else:
+            cached = ConnectionSchema(
+                connection_id=connection.id,
+                version=1,
+                format_version=SCHEMA_PAYLOAD_FORMAT,
+                payload=payload
+            )
+            db.add(cached)
+
+        commit_changes(db)
+        logging.info(f"Built schema payload v{cached.version} for connection '{connection.connection_name}' "
+                     f"({len(payload)} tables)")
+        return cached
+
+    def invalidate(self, db: Session, connection_id: int) -> None:
+        """
+        Drop the stored payload for a connection so it is rebuilt on next use. Runs in the caller's
+        transaction, so the payload goes together with the tables it was built from
+        """
+        db.query(ConnectionSchema).filter(ConnectionSchema.connection_id == connection_id).delete()
+
+    def get_connection_metadata(self, db: Session, connection_ids: List[int]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the schema payload for each connection, keyed by connection name.
+
+        Reads one stored payload per connection; payloads that are missing or were built
+        with an older format are rebuilt and stored.
+        """
+        rows = db.query(DatabaseConnection, ConnectionSchema).outerjoin(
+            ConnectionSchema, ConnectionSchema.connection_id == DatabaseConnection.id
+        ).filter(
+            DatabaseConnection.id.in_(connection_ids)
+        ).all()
+
+        metadata = {}
+        for connection, cached in rows:
+            if cached is None or cached.format_version != SCHEMA_PAYLOAD_FORMAT:
+                cached = self.refresh(db, connection)
+            metadata[connection.connection_name] = cached.payload
+
+        return metadata
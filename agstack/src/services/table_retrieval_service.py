@@ -0,0 +1,176 @@
+import logging
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from src.core.config import TABLE_INDEX_MIN_TABLES, TABLE_INDEX_TOP_K
+
+# Field weights: a hit on the table name says more than a hit on a sample value
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 2
+DATA_TYPE_WEIGHT = 1
+SAMPLE_VALUE_WEIGHT = 1
+
+# Long free-text sample values add noise rather than signal
+MAX_SAMPLE_VALUE_LENGTH = 64
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "each", "for", "from", "give", "has", "have", "how",
+    "in", "is", "it", "list", "me", "many", "much", "of", "on", "or", "per", "show", "that", "the", "their",
+    "there", "to", "was", "were", "what", "when", "where", "which", "who", "with", "all", "get", "find",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search terms.
+
+    Identifiers are split on underscores and camelCase boundaries, stop words are dropped
+    and a trailing plural "s" is removed so "orders" matches "order_id".
+    """
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", str(text))
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class TableIndex:
+    """
+    In-memory BM25 index over the tables of a single connection
+    """
+
+    def __init__(self, documents: Dict[str, Counter], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = {name: sum(terms.values()) for name, terms in documents.items()}
+        self.avg_doc_length = (sum(self.doc_lengths.values()) / len(documents)) if documents else 0.0
+
+        document_frequency = Counter()
+        for terms in documents.values():
+            document_frequency.update(terms.keys())
+
+        total = len(documents)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+
+    def score(self, question: str) -> List[Tuple[str, float]]:
+        """
+        Score every table against the question, best match first
+        """
+        query_terms = set(tokenize(question))
+        scores = []
+        for name, terms in self.documents.items():
+            length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[name] / (self.avg_doc_length or 1))
+            score = 0.0
+            for term in query_terms:
+                freq = terms.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + length_norm)
+            scores.append((name, score))
+
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+
+class TableRetrievalService:
+    """
+    Rank a connection's tables for a question locally, without an LLM call
+    """
+
+    def __init__(self, min_tables: int = TABLE_INDEX_MIN_TABLES, top_k: int = TABLE_INDEX_TOP_K):
+        self.min_tables = min_tables
+        self.top_k = top_k
+
+    def table_terms(self, table_name: str, table_metadata: Dict[str, Any]) -> Counter:
+        """Weighted search terms for one table"""
+        terms = Counter()
+        for token in tokenize(table_name):
+            terms[token] += TABLE_NAME_WEIGHT
+
+        for column in table_metadata.get("columns", []):
+            for token in tokenize(column.get("column_name", "")):
+                terms[token] += COLUMN_NAME_WEIGHT
+            for token in tokenize(column.get("data_type", "")):
+                terms[token] += DATA_TYPE_WEIGHT
+            for value in column.get("sample_values") or []:
+                if isinstance(value, str) and len(value) <= MAX_SAMPLE_VALUE_LENGTH:
+                    for token in tokenize(value):
+                        terms[token] += SAMPLE_VALUE_WEIGHT
+
+        return terms
+
+    def build_index(self, available_tables: Dict[str, Any]) -> TableIndex:
+        """
+        Build a BM25 index from the metadata returned by ChatService.get_connection_metadata
+        """
+        return TableIndex({
+            table_name: self.table_terms(table_name, table_metadata)
+            for table_name, table_metadata in available_tables.items()
+        })
+
+    def rank_tables(self, question: str, available_tables: Dict[str, Any]) -> List[Tuple[str, float]]:
+        """
+        Rank tables by relevance to the question, best match first
+        """
+        return self.build_index(available_tables).score(question)
+
+    def select_tables(self, question: str, available_tables: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Order a connection's metadata by relevance and shrink it to the top-k tables.
+
+        Small schemas (at most min_tables tables) are only reordered, and the full schema is
+        kept when no table matches any term of the question. The returned order is used as
+        the pruning priority when the schema is serialized for the prompt.
+        """
+        if self.min_tables <= 0:
+            return available_tables
+
+        ranked = self.rank_tables(question, available_tables)
+        if len(available_tables) <= self.min_tables:
+            return {name: available_tables[name] for name, _ in ranked}
+
+        selected = [name for name, score in ranked[:self.top_k] if score > 0]
+        if not selected:
+            logging.info("Table index found no matching tables, using the full schema")
+            return available_tables
+
+        logging.info(f"Table index selected {len(selected)} of {len(available_tables)} tables: {selected}")
+        return {name: available_tables[name] for name in selected}
+
+    def select_connections(self, question: str, metadata: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Infer which connections can answer the question.
+
+        All tables of all connections are scored in one index. Connections are ordered by
+        their best-matching table and connections without any matching table are dropped,
+        unless no connection matches at all. Connections without tables are never returned.
+        """
+        connection_names = [name for name, tables in metadata.items() if tables]
+        if len(connection_names) <= 1:
+            return connection_names
+
+        index = TableIndex({
+            (connection_name, table_name): self.table_terms(table_name, table_metadata)
+            for connection_name in connection_names
+            for table_name, table_metadata in metadata[connection_name].items()
+        })
+
+        best_scores = {}
+        for (connection_name, _), score in index.score(question):
+            best_scores.setdefault(connection_name, score)
+
+        matching = [name for name, score in best_scores.items() if score > 0]
+        if not matching:
+            return connection_names
+
+        logging.info(f"Table index selected connections {matching} of {connection_names}")
+        return matching
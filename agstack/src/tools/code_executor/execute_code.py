@@ -3,7 +3,12 @@ import os
 import subprocess
 import sys
 import tempfile
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional
+
+from src.core.config import EXECUTOR_PROCESS_ENV
+from src.modules.file_utils import RESULT_NAMESPACE_ENV
+from src.utils.stage_timer import STAGE_TIMINGS_FILE_ENV, read_subprocess_stages
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -11,7 +16,8 @@ logger = logging.getLogger(__name__)
 
 
 def execute_code_tool(code: str, prompt: Optional[str] = None, previous_error: Optional[str] = None,
-                      retry_count: int = 0) -> Dict[str, Any]:
+                      retry_count: int = 0, stage_timings: Optional[List[Dict[str, Any]]] = None,
+                      result_namespace: Optional[str] = None) -> Dict[str, Any]:
     """
     Execute the generated Python code and report results. Does not retry execution but provides information 
     for the LLM to generate new code if execution fails.
@@ -21,6 +27,9 @@ def execute_code_tool(code: str, prompt: Optional[str] = None, previous_error: O
         prompt: The original prompt used to generate the code
         previous_error: Error from previous execution attempt
         retry_count: Number of previous generation attempts (0 for first try)
+        stage_timings: Optional list that receives the subprocess execution time and the stages
+            timed inside the generated code (external query, CSV write); never shown to the LLM
+        result_namespace: Run directory the code's write_df calls write to, see file_utils.write_df
         
     Returns:
         Dict with execution result, containing:
@@ -61,13 +70,25 @@ if src_dir not in sys.path:
 
     logger.info(f"Generated code saved to temporary file: {temp_file}")
 
+    # File the generated code appends its own stage timings to
+    timings_file = None
+    if stage_timings is not None:
+        timings_fd, timings_file = tempfile.mkstemp(suffix='.jsonl')
+        os.close(timings_fd)
+
     try:
         # Set up environment variables
         env = os.environ.copy()
         env["PYTHONPATH"] = src_dir + ":" + env.get("PYTHONPATH", "")
+        env[EXECUTOR_PROCESS_ENV] = "1"
+        if result_namespace:
+            env[RESULT_NAMESPACE_ENV] = result_namespace
+        if timings_file:
+            env[STAGE_TIMINGS_FILE_ENV] = timings_file
 
         # Execute the code in a subprocess
         logger.info("Executing generated code...")
+        started = time.perf_counter()
         result = subprocess.run(
             [sys.executable, temp_file],
             capture_output=True,
@@ -75,6 +96,10 @@ if src_dir not in sys.path:
             env=env
         )
 
+        if timings_file:
+            stage_timings.append({"stage": "code_execution", "seconds": round(time.perf_counter() - started, 4)})
+            stage_timings.extend(read_subprocess_stages(timings_file))
+
         # Process was completed (even if it returned a non-zero code)
         stdout = result.stdout
         stderr = result.stderr
@@ -136,6 +161,8 @@ if src_dir not in sys.path:
                 "max_retries_reached": True
             }
     finally:
-        # Clean up the temporary file
+        # Clean up the temporary files
         if os.path.exists(temp_file):
             os.unlink(temp_file)
+        if timings_file and os.path.exists(timings_file):
+            os.unlink(timings_file)
@@ -0,0 +1,85 @@
+"""
+Utility class for handing progress events of a message from a worker thread to stream subscribers.
+"""
+import asyncio
+import threading
+from typing import Any, Dict, List, Tuple
+
+
+class EventStream:
+    """
+    Append-only, thread-safe list of events that subscribers read from their own cursor.
+
+    Every subscriber sees all events published since the stream was created, so a client
+    that connects late still receives the stages that already happened. Subscribers wait on
+    their event loop, so waiting does not hold a thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self.events: List[Dict[str, Any]] = []
+        self.closed = False
+
+    def _notify(self) -> None:
+        """Wake up all subscribers; called with the lock held"""
+        for loop, waiter in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # The subscriber's event loop is already closed
+                pass
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """Append an event and wake up waiting subscribers"""
+        with self._lock:
+            if self.closed:
+                return
+            self.events.append({"event": event, "data": data})
+            self._notify()
+
+    def close(self) -> None:
+        """Mark the stream as finished; no more events are published"""
+        with self._lock:
+            self.closed = True
+            self._notify()
+
+    async def read_async(self, cursor: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Get the events after cursor, waiting up to timeout seconds for new ones.
+
+        Args:
+            cursor: Number of events the subscriber has already read
+            timeout: Seconds to wait when there are no new events
+
+        Returns:
+            The new events and whether the stream is closed
+        """
+        waiter = asyncio.Event()
+        entry = (asyncio.get_running_loop(), waiter)
+        with self._lock:
+            if cursor < len(self.events) or self.closed:
+                return self.events[cursor:], self.closed
+            self._async_waiters.append(entry)
+
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._async_waiters.remove(entry)
+
+        with self._lock:
+            return self.events[cursor:], self.closed
+
+    async def wait_closed_async(self, timeout: float) -> bool:
+        """Wait until the stream is closed or the timeout expires, returning whether it is closed"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        cursor = 0
+        while True:
+            events, closed = await self.read_async(cursor, max(0.0, deadline - loop.time()))
+            cursor += len(events)
+            if closed or loop.time() >= deadline:
+                return closed
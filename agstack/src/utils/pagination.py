@@ -0,0 +1,43 @@
+"""
+Utility functions for opaque keyset pagination cursors.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(updated_at: datetime, row_id: int) -> str:
+    """
+    Encode the sort key of the last row of a page as an opaque cursor.
+
+    Args:
+        updated_at: Timestamp the listing is ordered by
+        row_id: ID of the row, breaking ties between equal timestamps
+
+    Returns:
+        URL-safe cursor string
+    """
+    payload = json.dumps([updated_at.isoformat(), row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor created by encode_cursor.
+
+    Args:
+        cursor: Cursor string from a previous page
+
+    Returns:
+        The timestamp and ID of the last row of that page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
@@ -0,0 +1,82 @@
+"""
+Utility class for counting connection pool activity of a SQLAlchemy engine.
+"""
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class PoolMetrics:
+    """
+    Thread-safe counters of the connections an engine opens, checks out and returns.
+
+    Checkouts that find no idle connection open a new one ("connects"), so a connects count
+    close to the checkouts count means the pool is too small or not pooling at all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero the counters; connections currently checked out stay counted as in use"""
+        with self._lock:
+            in_use = getattr(self, "in_use", 0)
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.in_use = in_use
+            self.peak_in_use = in_use
+            self.held_seconds = 0.0
+            self.max_held_seconds = 0.0
+
+    def attach(self, engine: Engine) -> "PoolMetrics":
+        """Listen to the pool events of the engine"""
+        event.listen(engine, "connect", self.on_connect)
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+        event.listen(engine, "invalidate", self.on_invalidate)
+        return self
+
+    def on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        with self._lock:
+            self.checkins += 1
+            self.in_use = max(0, self.in_use - 1)
+            if checked_out_at is not None:
+                held = time.perf_counter() - checked_out_at
+                self.held_seconds += held
+                self.max_held_seconds = max(self.max_held_seconds, held)
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current counters, with the average and longest time a connection was held"""
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "avg_held_ms": round(self.held_seconds / self.checkins * 1000, 2) if self.checkins else 0.0,
+                "max_held_ms": round(self.max_held_seconds * 1000, 2)
+            }
@@ -0,0 +1,168 @@
+"""
+Utility functions for serializing connection metadata into a compact, token-budgeted prompt.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+from src.core.config import SCHEMA_MAX_SAMPLES, SCHEMA_SAMPLE_MAX_BYTES, SCHEMA_TOKEN_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Loaded by get_encoding on first use, since importing tiktoken and its encoding takes a while
+_ENCODING = None
+_ENCODING_LOADED = False
+
+
+def get_encoding():
+    """Get the tiktoken encoding, or None when tiktoken is not installed"""
+    global _ENCODING, _ENCODING_LOADED
+    if not _ENCODING_LOADED:
+        try:
+            import tiktoken
+
+            _ENCODING = tiktoken.get_encoding("o200k_base")
+        except Exception:  # tiktoken is optional, fall back to a character estimate
+            _ENCODING = None
+        _ENCODING_LOADED = True
+    return _ENCODING
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count prompt tokens for text.
+
+    Uses tiktoken when it is installed, otherwise estimates four characters per token.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Number of tokens
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_value(value: Any, max_bytes: int) -> str:
+    """
+    Render a sample value and cut it to at most max_bytes of UTF-8.
+
+    Args:
+        value: Sample value from the column metadata
+        max_bytes (int): Maximum encoded length of the rendered value
+
+    Returns:
+        str: Rendered (and possibly truncated) value
+    """
+    rendered = value if isinstance(value, str) else json.dumps(value, default=str)
+    encoded = rendered.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return rendered
+    return encoded[:max_bytes].decode("utf-8", errors="ignore") + "..."
+
+
+def format_table(table_name: str, table_metadata: Dict[str, Any], max_samples: int, max_sample_bytes: int) -> str:
+    """
+    Render one table as a DDL-like block, for example:
+
+        TABLE public.sales (
+          sale_id integer -- e.g. 101, 102
+          amount numeric
+        )
+
+    Args:
+        table_name (str): Name of the table
+        table_metadata (dict): Table metadata with "columns" and "schema_name"
+        max_samples (int): Number of sample values to keep per column
+        max_sample_bytes (int): Maximum UTF-8 length of each sample value
+
+    Returns:
+        str: The rendered table
+    """
+    schema_name = table_metadata.get("schema_name")
+    qualified_name = f"{schema_name}.{table_name}" if schema_name else table_name
+
+    lines = [f"TABLE {qualified_name} ("]
+    for column in table_metadata.get("columns", []):
+        line = f"  {column.get('column_name')} {column.get('data_type')}"
+
+        samples = []
+        for value in (column.get("sample_values") or [])[:max_samples]:
+            if value is None:
+                continue
+            rendered = truncate_value(value, max_sample_bytes)
+            if rendered not in samples:
+                samples.append(rendered)
+        if samples:
+            line += " -- e.g. " + ", ".join(samples)
+
+        lines.append(line)
+    lines.append(")")
+
+    return "\n".join(lines)
+
+
+def serialize_schema(
+        available_tables: Dict[str, Any],
+        token_budget: int = SCHEMA_TOKEN_BUDGET,
+        max_samples: int = SCHEMA_MAX_SAMPLES,
+        max_sample_bytes: int = SCHEMA_SAMPLE_MAX_BYTES,
+) -> Tuple[str, int]:
+    """
+    Serialize a connection's tables into a compact prompt that fits the token budget.
+
+    Tables are treated as ordered by priority (most relevant first). When the schema does
+    not fit, sample values are removed from the lowest-priority tables first, then whole
+    tables are dropped from the bottom of the list. The highest-priority table is always kept.
+
+    Args:
+        available_tables (dict): Table metadata keyed by table name, in priority order
+        token_budget (int): Maximum number of tokens for the serialized schema (0 means unlimited)
+        max_samples (int): Number of sample values to keep per column
+        max_sample_bytes (int): Maximum UTF-8 length of each sample value
+
+    Returns:
+        tuple: The serialized schema and its token count
+    """
+    table_names = list(available_tables.keys())
+    sample_levels = sorted({max_samples, min(max_samples, 1), 0}, reverse=True)
+
+    # Render each table at each sample level once, then prune on token counts alone
+    rendered: Dict[str, List[Tuple[str, int]]] = {}
+    for table_name in table_names:
+        rendered[table_name] = []
+        for samples in sample_levels:
+            block = format_table(table_name, available_tables[table_name], samples, max_sample_bytes)
+            rendered[table_name].append((block, count_tokens(block) + 1))
+
+    levels = {table_name: 0 for table_name in table_names}
+    kept = list(table_names)
+    total = sum(rendered[name][0][1] for name in kept)
+
+    if token_budget > 0:
+        # 1. Drop sample values, lowest-priority tables first
+        for table_name in reversed(kept):
+            if total <= token_budget:
+                break
+            while total > token_budget and levels[table_name] < len(sample_levels) - 1:
+                total -= rendered[table_name][levels[table_name]][1]
+                levels[table_name] += 1
+                total += rendered[table_name][levels[table_name]][1]
+
+        # 2. Drop whole tables from the bottom of the priority list
+        while total > token_budget and len(kept) > 1:
+            table_name = kept.pop()
+            total -= rendered[table_name][levels[table_name]][1]
+
+        if total > token_budget:
+            logger.warning(f"Schema for table '{kept[0]}' alone exceeds the token budget of {token_budget}")
+
+    dropped = len(table_names) - len(kept)
+    schema_text = "\n".join(rendered[name][levels[name]][0] for name in kept)
+    if dropped:
+        schema_text += f"\n-- {dropped} lower-priority tables omitted"
+
+    return schema_text, count_tokens(schema_text)
@@ -0,0 +1,66 @@
+"""
+Utility functions for validating SQL returned by the SQL agent before it is run in-process.
+"""
+import re
+
+# Keywords that write data, change the schema or take locks inside an otherwise valid SELECT
+# (data-modifying CTEs, SELECT ... INTO, FOR UPDATE). The query also runs in a read-only
+# transaction, so this only rejects such SQL early with a readable error
+FORBIDDEN_KEYWORDS = (
+    "insert", "update", "delete", "merge", "drop", "alter", "create", "truncate", "grant", "revoke", "copy",
+    "into", "lock"
+)
+
+_STRINGS_AND_COMMENTS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_FENCE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+
+
+def clean_sql(sql: str) -> str:
+    """
+    Strip markdown code fences, surrounding whitespace and trailing semicolons from SQL.
+
+    Args:
+        sql: SQL as returned by the agent
+
+    Returns:
+        The bare SQL statement
+    """
+    sql = _FENCE.sub("", sql.strip()).strip()
+    return sql.rstrip(";").strip()
+
+
+def _strip_literals(sql: str) -> str:
+    """Blank out string literals, quoted identifiers and comments so keywords in them are ignored"""
+    return _STRINGS_AND_COMMENTS.sub(" ", sql)
+
+
+def validate_select_sql(sql: str) -> str:
+    """
+    Check that SQL is a single read-only SELECT (or WITH ... SELECT) statement.
+
+    Args:
+        sql: SQL as returned by the agent
+
+    Returns:
+        The cleaned SQL statement
+
+    Raises:
+        ValueError: If the SQL is empty, has several statements or is not read-only
+    """
+    sql = clean_sql(sql or "")
+    if not sql:
+        raise ValueError("The SQL query is empty")
+
+    bare = _strip_literals(sql).lower()
+    if ";" in bare:
+        raise ValueError("Only a single SQL statement is allowed")
+
+    words = re.findall(r"[a-z_]+", bare)
+    if not words or words[0] not in ("select", "with"):
+        raise ValueError("Only SELECT queries are allowed")
+
+    forbidden = sorted(set(words) & set(FORBIDDEN_KEYWORDS))
+    if forbidden:
+        raise ValueError(f"The SQL query uses statements that are not allowed: {', '.join(forbidden).upper()}")
+
+    return sql
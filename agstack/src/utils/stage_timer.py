@@ -0,0 +1,133 @@
+"""
+Utility classes for recording per-stage latency and token usage of a chat message.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Environment variable naming the file generated code appends its own stage timings to
+STAGE_TIMINGS_FILE_ENV = "AGSTACK_STAGE_TIMINGS_FILE"
+
+
+class StageTimer:
+    """
+    Thread-safe collector of stage timings and per-agent token usage for one message.
+
+    Listeners are called with (event, data) for every recorded stage ("stage" events) and
+    for progress events reported through emit, e.g. to stream them to a client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.agents: List[Dict[str, Any]] = []
+        self.listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+    def add(self, stage: str, seconds: float, **labels) -> None:
+        """Record a stage that took the given number of seconds"""
+        entry = {"stage": stage, "seconds": round(seconds, 4), **labels}
+        with self._lock:
+            self.stages.append(entry)
+        self.emit("stage", **entry)
+
+    def emit(self, event: str, **data) -> None:
+        """Report a progress event to the listeners"""
+        for listener in list(self.listeners):
+            try:
+                listener(event, data)
+            except Exception as e:
+                logger.warning(f"Stage listener failed on '{event}': {str(e)}")
+
+    @contextmanager
+    def stage(self, stage: str, **labels):
+        """Time the enclosed block as a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started, **labels)
+
+    def add_usage(self, agent: str, prompt_tokens: int, completion_tokens: int, successful_requests: int,
+                  **labels) -> None:
+        """Record the tokens used by one agent"""
+        with self._lock:
+            self.agents.append({
+                "agent": agent,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "successful_requests": successful_requests,
+                **labels
+            })
+
+    def timings(self) -> Dict[str, Any]:
+        """Stage timings with per-stage totals, suitable for the stage_timings column"""
+        with self._lock:
+            stages = list(self.stages)
+
+        totals: Dict[str, float] = {}
+        for entry in stages:
+            totals[entry["stage"]] = round(totals.get(entry["stage"], 0.0) + entry["seconds"], 4)
+
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "totals": totals,
+            "stages": stages
+        }
+
+    def token_usage(self) -> Dict[str, Any]:
+        """Token usage per agent with overall totals, suitable for the token_usage column"""
+        with self._lock:
+            agents = list(self.agents)
+
+        prompt_tokens = sum(entry["prompt_tokens"] for entry in agents)
+        completion_tokens = sum(entry["completion_tokens"] for entry in agents)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "agents": agents
+        }
+
+
+@contextmanager
+def record_subprocess_stage(stage: str, **labels):
+    """
+    Time a stage inside generated code.
+
+    The timing is appended to the file named by AGSTACK_STAGE_TIMINGS_FILE, which the code
+    executor sets for the subprocess; outside the executor nothing is recorded.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        path = os.environ.get(STAGE_TIMINGS_FILE_ENV)
+        if path:
+            entry = {"stage": stage, "seconds": round(time.perf_counter() - started, 4), **labels}
+            try:
+                with open(path, "a") as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not record stage timing: {str(e)}")
+
+
+def read_subprocess_stages(path: str) -> List[Dict[str, Any]]:
+    """Read the stage timings written by generated code"""
+    if not os.path.exists(path):
+        return []
+
+    stages = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                stages.append(json.loads(line))
+    return stages
@@ -0,0 +1,19 @@
+"""
+Tests run against a throwaway SQLite metadata database, configured before the app is imported
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='agstack-tests-'), 'metadata.db')}"
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+
+import pytest
+
+from src.core.db_init import initialize_database
+
+
+@pytest.fixture(scope="session", autouse=True)
+def metadata_database():
+    """Create the tables and apply the migrations once per test run"""
+    initialize_database()
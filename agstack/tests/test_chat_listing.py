@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from fastapi_server import app
+from src.core.database import SessionLocal, engine
+from src.models.chat import Chat
+from src.models.database_connection import DatabaseConnection
+
+
+@contextmanager
+def count_queries() -> Iterator[List[str]]:
+    """Statements run on the metadata database while the block runs"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def add_chats(count: int, connections: List[DatabaseConnection], db) -> None:
+    for number in range(count):
+        chat = Chat(title=f"Chat {number}")
+        chat.connections.extend(connections[:number % len(connections) + 1])
+        db.add(chat)
+    db.commit()
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def connections():
+    db = SessionLocal()
+    try:
+        db.query(Chat).delete()
+        db.query(DatabaseConnection).delete()
+        connections = [DatabaseConnection(connection_name=f"listing_{number}", host="localhost", port=5432,
+                                          username="user", password="password", database_name="db")
+                       for number in range(3)]
+        db.add_all(connections)
+        db.commit()
+        yield db, connections
+    finally:
+        db.close()
+
+
+def test_chat_list_queries_do_not_grow_with_chats(client, connections):
+    db, connections = connections
+    add_chats(1, connections, db)
+    client.get("/api/chat/chats")  # Warm up the connection pool
+
+    with count_queries() as one_chat:
+        response = client.get("/api/chat/chats")
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    add_chats(40, connections, db)
+    with count_queries() as many_chats:
+        response = client.get("/api/chat/chats", params={"limit": 50})
+    assert response.status_code == 200
+    chats = response.json()
+    assert len(chats) == 41
+    assert all(chat["connections"] for chat in chats)
+
+    assert len(many_chats) == len(one_chat)
+
+
+def test_chat_list_pages_cost_the_same_queries(client, connections):
+    db, connections = connections
+    add_chats(25, connections, db)
+
+    with count_queries() as first_page:
+        response = client.get("/api/chat/chats", params={"limit": 10})
+    cursor = response.headers["X-Next-Cursor"]
+    seen = {chat["id"] for chat in response.json()}
+
+    with count_queries() as next_page:
+        response = client.get("/api/chat/chats", params={"limit": 10, "cursor": cursor})
+    assert response.status_code == 200
+    assert not seen & {chat["id"] for chat in response.json()}
+
+    assert len(next_page) == len(first_page)
@@ -0,0 +1,125 @@
+import json
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from src.modules import db_utils
+from src.modules.db_utils import explain_query
+from src.services import chat_service as chat_service_module
+from src.services.chat_service import ChatService
+
+TABLES = {
+    "orders": {
+        "columns": [{"column_name": "id", "data_type": "integer", "sample_values": [1, 2]},
+                    {"column_name": "total", "data_type": "numeric", "sample_values": [9.5, 12]}],
+        "schema_name": "public",
+    }
+}
+VALID_SQL = "SELECT id, total FROM orders"
+INVALID_SQL = "SELECT missing_column FROM orders"
+
+
+class ExternalDatabase:
+    """Stands in for execute_query: EXPLAIN fails for unknown columns, queries return rows"""
+
+    def __init__(self):
+        self.explained: List[str] = []
+        self.executed: List[str] = []
+
+    def execute_query(self, query: str, connection_name: str, read_only: bool = False) -> pd.DataFrame:
+        assert read_only
+        if query.startswith("EXPLAIN "):
+            self.explained.append(query[len("EXPLAIN "):])
+            if "missing_column" in query:
+                raise Exception('column "missing_column" does not exist')
+            return pd.DataFrame({"QUERY PLAN": ["Seq Scan on orders", "  Filter: (total > 0)"]})
+        self.executed.append(query)
+        return pd.DataFrame({"id": [1, 2], "total": [9.5, 12.0]})
+
+
+def fake_crew_class(candidate_sql: Dict[int, str], delays: Dict[int, float]):
+    """Crew whose table inference returns the only table and whose candidates are candidate_sql"""
+
+    def kickoff_candidate(inputs):
+        number = inputs["candidate_number"]
+        time.sleep(delays.get(number, 0))
+        return SimpleNamespace(tasks_output=[SimpleNamespace(raw=json.dumps({"sql": candidate_sql[number]}))])
+
+    def table_inference_crew():
+        return SimpleNamespace(agents=[], tasks=[SimpleNamespace(start_time=None, end_time=None)],
+                               kickoff=lambda inputs: SimpleNamespace(raw="orders"))
+
+    def sql_candidate_crew():
+        return SimpleNamespace(agents=[], kickoff=kickoff_candidate)
+
+    return lambda: SimpleNamespace(table_inference_crew=table_inference_crew, sql_candidate_crew=sql_candidate_crew)
+
+
+@pytest.fixture
+def database():
+    database = ExternalDatabase()
+    with mock.patch.object(db_utils, "execute_query", database.execute_query), \
+            mock.patch.object(chat_service_module, "execute_query", database.execute_query):
+        yield database
+
+
+@pytest.fixture
+def service():
+    service = ChatService()
+    service.sql_candidates = 2
+    with mock.patch.object(chat_service_module, "start_agentops_session", return_value=None), \
+            mock.patch.object(chat_service_module, "write_df", return_value="unused.csv"):
+        yield service
+
+
+def use_candidates(candidate_sql: Dict[int, str], delays: Dict[int, float] = None):
+    return mock.patch.object(chat_service_module, "load_crew_class",
+                             return_value=fake_crew_class(candidate_sql, delays or {}))
+
+
+def test_explain_query_returns_the_plan(database):
+    assert explain_query(VALID_SQL, "shop") == "Seq Scan on orders\n  Filter: (total > 0)"
+    assert database.explained == [VALID_SQL]
+    assert database.executed == []
+
+
+def test_explain_query_raises_for_invalid_sql(database):
+    with pytest.raises(Exception, match="missing_column"):
+        explain_query(INVALID_SQL, "shop")
+    assert database.executed == []
+
+
+def test_invalid_candidate_is_rejected_before_it_runs(database, service):
+    # The invalid candidate finishes first, so it is checked before the valid one is accepted
+    with use_candidates({1: INVALID_SQL, 2: VALID_SQL}, delays={2: 0.2}):
+        answer = service.answer_connection("Totals of orders", "shop", TABLES, pipeline="sql")
+
+    assert database.explained == [INVALID_SQL, VALID_SQL]
+    assert database.executed == [VALID_SQL]
+    assert answer["pipeline"] == "sql"
+    assert answer["generated_code"] == VALID_SQL
+    assert answer["frame"]["total"].tolist() == [9.5, 12.0]
+
+
+def test_no_valid_candidate_falls_back_without_running_sql(database, service):
+    with use_candidates({1: INVALID_SQL, 2: INVALID_SQL}), \
+            mock.patch.object(service, "run_crew_with_metadata", return_value=("output.csv", "print('pandas')")):
+        assert service.run_sql_candidates("Totals of orders", "shop", TABLES) is None
+        answer = service.answer_connection("Totals of orders", "shop", TABLES, pipeline="sql")
+
+    assert database.executed == []
+    assert answer["pipeline"] == "python"
+    assert answer["generated_code"] == "print('pandas')"
+
+
+def test_candidates_must_be_select_statements(database, service):
+    with use_candidates({1: "DELETE FROM orders", 2: VALID_SQL}, delays={2: 0.2}):
+        assert service.run_sql_candidates("Totals of orders", "shop", TABLES) == VALID_SQL
+
+    # The DELETE is refused by the validator without reaching the database, even through EXPLAIN
+    assert database.explained == [VALID_SQL]
+    assert database.executed == []